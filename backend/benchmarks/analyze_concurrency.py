@@ -0,0 +1,64 @@
+"""
+Measures how many concurrent /analyze-card requests one uvicorn worker can
+serve while every Gemini call takes --latency seconds (local stub server).
+
+Run from the backend folder:
+    python -m benchmarks.analyze_concurrency --concurrency 1 10 50
+"""
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from PIL import Image
+
+from benchmarks.gemini_stub import create_app, free_port, serve_in_thread
+
+def sample_card_bytes():
+    buf = io.BytesIO()
+    Image.new("RGB", (1000, 600), (240, 240, 240)).save(buf, "JPEG")
+    return buf.getvalue()
+
+async def fire(base_url, concurrency, image):
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        async def one(i):
+            start = time.perf_counter()
+            r = await client.post("/analyze-card", files={"front": (f"card{i}.jpg", image, "image/jpeg")})
+            r.raise_for_status()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one(i) for i in range(concurrency)))
+        return time.perf_counter() - start, sorted(latencies)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    serve_in_thread(create_app(args.latency), stub_port)
+    os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{stub_port}/v1beta"
+    os.environ["GOOGLE_API_KEY"] = "stub"
+
+    # The app writes uploads/ and the DB relative to the working directory
+    os.chdir(tempfile.mkdtemp())
+    import main as backend
+
+    app_port = free_port()
+    serve_in_thread(backend.app, app_port)
+    image = sample_card_bytes()
+
+    print(f"Gemini stub latency: {args.latency}s")
+    print(f"{'concurrent':>10} | {'wall':>7} | {'req/s':>6} | {'p50':>7} | {'max':>7}")
+    for n in args.concurrency:
+        wall, latencies = asyncio.run(fire(f"http://127.0.0.1:{app_port}", n, image))
+        print(f"{n:>10} | {wall:>6.2f}s | {n / wall:>6.1f} | {statistics.median(latencies):>6.2f}s | {latencies[-1]:>6.2f}s")
+
+if __name__ == "__main__":
+    main()
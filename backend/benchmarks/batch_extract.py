@@ -0,0 +1,97 @@
+"""
+Compares single-card extraction (one generateContent call per card) with
+batched extraction (extract_cards_batch) against the local Gemini stub.
+Both modes keep at most --concurrency calls in flight, as a per-key quota
+would, and report cards per minute and stub-billed tokens per card.
+
+Run from the backend folder:
+    python -m benchmarks.batch_extract --cards 64 --batch-sizes 1 4 8 16
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from PIL import Image
+
+from benchmarks.gemini_stub import create_app, free_port, serve_in_thread
+
+def write_cards(folder, count):
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"card{i}.jpg")
+        Image.new("RGB", (1000, 600), (240, 240 - i % 50, 240)).save(path, "JPEG", quality=82)
+        paths.append(path)
+    return paths
+
+async def run_single(gemini_service, paths, concurrency):
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(path):
+        async with gate:
+            return await gemini_service.extract_card_data(path)
+
+    return await asyncio.gather(*(one(p) for p in paths))
+
+async def run_batched(gemini_service, paths, concurrency, batch_size):
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(chunk):
+        async with gate:
+            return await gemini_service.extract_cards_batch(chunk, batch_size)
+
+    chunks = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+    results = []
+    for chunk_results in await asyncio.gather(*(one(c) for c in chunks)):
+        results.extend(chunk_results)
+    return results
+
+def measure(stub, gemini_service, label, make_run):
+    calls, prompt, output = stub.state.calls, stub.state.prompt_tokens, stub.state.output_tokens
+
+    async def timed():
+        start = time.perf_counter()
+        results = await make_run()
+        wall = time.perf_counter() - start
+        # The shared client is bound to this event loop
+        await gemini_service.close_client()
+        return results, wall
+
+    results, wall = asyncio.run(timed())
+    ok = sum(1 for r in results if r.get("name") not in ("AI Error", "File Error"))
+    n = len(results)
+    tokens = (stub.state.prompt_tokens - prompt) + (stub.state.output_tokens - output)
+    print(f"{label:>12} | {n / wall * 60:>9.0f} | {stub.state.calls - calls:>5} | {tokens / n:>10.0f} | {ok:>3}/{n}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=64)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--concurrency", type=int, default=4, help="generateContent calls in flight")
+    parser.add_argument("--latency", type=float, default=1.0, help="stub seconds per call")
+    parser.add_argument("--per-image-latency", type=float, default=0.1, help="stub seconds per image in a call")
+    parser.add_argument("--drop", action="store_true", help="stub leaves one card out of each batch reply")
+    args = parser.parse_args()
+
+    stub = create_app(args.latency, args.per_image_latency, drop_batch_item=args.drop)
+    stub_port = free_port()
+    serve_in_thread(stub, stub_port)
+    os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{stub_port}/v1beta"
+    os.environ["GOOGLE_API_KEY"] = "stub"
+
+    # The backend opens its DB relative to the working directory
+    os.chdir(tempfile.mkdtemp())
+    from services import gemini_service
+
+    paths = write_cards(os.getcwd(), args.cards)
+
+    print(f"{args.cards} cards, {args.concurrency} calls in flight, stub {args.latency}s + {args.per_image_latency}s/image")
+    print(f"{'mode':>12} | {'cards/min':>9} | {'calls':>5} | {'tokens/card':>10} | ok")
+    measure(stub, gemini_service, "single", lambda: run_single(gemini_service, paths, args.concurrency))
+    for size in args.batch_sizes:
+        measure(stub, gemini_service, f"batch {size}",
+                lambda: run_batched(gemini_service, paths, args.concurrency, size))
+
+if __name__ == "__main__":
+    main()
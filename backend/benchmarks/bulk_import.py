@@ -0,0 +1,116 @@
+"""
+Bulk import/export throughput. Loads --rows generated vendors into a fresh
+DB through POST /cards/bulk (JSON Lines and CSV, body streamed in 64KB
+chunks), re-imports them with upsert_on=website, and streams them back out
+of /cards/export. The old path (one save_card call per vendor) is timed on
+a smaller sample for comparison. Reports rows per second.
+
+Run from the backend folder:
+    python -m benchmarks.bulk_import --rows 100000
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.gemini_stub import free_port, serve_in_thread
+
+BODY_CHUNK_BYTES = 64 * 1024
+
+def make_vendors(count, words, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "name": f"{rng.choice(words).title()} {rng.choice(words).title()} Co. {i}",
+            "contact": f"+91-98{i:08d}",
+            "category": rng.choice(["Food & Beverage", "Electronics", "Home Decor", "Apparel"]),
+            "website": f"https://vendor{i}.example.com",
+            "products": ", ".join(f"{p.title()} ₹{rng.randint(100, 5000)}" for p in rng.sample(words, 3)),
+            "tagline": " ".join(rng.sample(words, 4)),
+        }
+        for i in range(count)
+    ]
+
+def to_jsonl(vendors):
+    return "".join(json.dumps(v) + "\n" for v in vendors).encode("utf-8")
+
+def to_csv(vendors):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(vendors[0]))
+    writer.writeheader()
+    writer.writerows(vendors)
+    return buffer.getvalue().encode("utf-8")
+
+def chunks(body):
+    for i in range(0, len(body), BODY_CHUNK_BYTES):
+        yield body[i:i + BODY_CHUNK_BYTES]
+
+def post_bulk(client, body, params):
+    start = time.perf_counter()
+    response = client.post("/cards/bulk", params=params, content=chunks(body))
+    response.raise_for_status()
+    wall = time.perf_counter() - start
+    summary = response.json()
+    return summary["inserted"] + summary["updated"], wall, summary
+
+def export(client, fmt):
+    start = time.perf_counter()
+    lines = 0
+    size = 0
+    with client.stream("GET", "/cards/export", params={"format": fmt}) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            lines += 1
+            size += len(line)
+    wall = time.perf_counter() - start
+    return lines - (fmt == "csv"), wall, size
+
+def report(label, rows, wall, extra=""):
+    print(f"{label:>24} | {rows:>8} | {wall:>7.2f}s | {rows / wall:>9.0f} {extra}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--baseline-rows", type=int, default=5000, help="vendors saved one save_card call at a time")
+    args = parser.parse_args()
+
+    # The backend opens its DB relative to the working directory
+    os.chdir(tempfile.mkdtemp())
+    import db
+    from main import app
+    from benchmarks.search import FILLER
+    from services.bulk_io import card_from_record
+
+    vendors = make_vendors(args.rows, FILLER)
+    jsonl = to_jsonl(vendors)
+    csv_body = to_csv(vendors)
+
+    print(f"{'path':>24} | {'rows':>8} | {'wall':>8} | {'rows/sec':>9}")
+    sample = [card_from_record(dict(v)) for v in vendors[:args.baseline_rows]]
+    start = time.perf_counter()
+    for card in sample:
+        db.save_card(card)
+    report("save_card per row", len(sample), time.perf_counter() - start)
+
+    port = free_port()
+    server = serve_in_thread(app, port)
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+        rows, wall, _ = post_bulk(client, jsonl, {"format": "jsonl"})
+        report("bulk jsonl insert", rows, wall, f"({len(jsonl) / 1e6:.0f} MB body)")
+        rows, wall, _ = post_bulk(client, csv_body, {"format": "csv"})
+        report("bulk csv insert", rows, wall, f"({len(csv_body) / 1e6:.0f} MB body)")
+        rows, wall, summary = post_bulk(client, jsonl, {"format": "jsonl", "upsert_on": "website"})
+        report("bulk jsonl upsert", rows, wall, f"({summary['updated']} updated, {summary['inserted']} inserted)")
+        for fmt in ("jsonl", "csv"):
+            rows, wall, size = export(client, fmt)
+            report(f"export {fmt}", rows, wall, f"({size / 1e6:.0f} MB)")
+    server.should_exit = True
+
+if __name__ == "__main__":
+    main()
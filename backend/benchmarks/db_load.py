@@ -0,0 +1,116 @@
+"""
+Concurrent save_card/search_cards load test, comparing the old
+connect-per-call rollback-journal setup against the pooled WAL layer.
+
+Run from the backend folder:
+    python -m benchmarks.db_load
+    python -m benchmarks.db_load --writers 8 --readers 8 --ops 300
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import db
+from benchmarks.search import WORDS, QUERIES, build_db
+
+class LegacyPool:
+    """Mimics the pre-pool behaviour: a fresh default-journal connection per call."""
+
+    def __init__(self, db_name):
+        self.db_name = db_name
+
+    @contextmanager
+    def connection(self):
+        conn = sqlite3.connect(self.db_name)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def close_all(self):
+        pass
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+def run_load(writers, readers, ops):
+    latencies = {"save": [], "search": []}
+    lock = threading.Lock()
+    errors = []
+
+    def writer(seed):
+        rng = random.Random(seed)
+        for i in range(ops):
+            start = time.perf_counter()
+            try:
+                db.save_card({
+                    "name": f"{rng.choice(WORDS).title()} Load Vendor {seed}-{i}",
+                    "category": "Load Test",
+                    "additional_info": {"products_sold": ", ".join(rng.sample(WORDS, 4))},
+                })
+            except Exception as e:
+                errors.append(e)
+                continue
+            with lock:
+                latencies["save"].append((time.perf_counter() - start) * 1000)
+
+    def reader(seed):
+        rng = random.Random(seed)
+        for _ in range(ops):
+            start = time.perf_counter()
+            try:
+                db.search_cards(rng.choice(QUERIES))
+            except Exception as e:
+                errors.append(e)
+                continue
+            with lock:
+                latencies["search"].append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(100 + i,)) for i in range(readers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, time.perf_counter() - start, errors
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=200, help="operations per thread")
+    args = parser.parse_args()
+
+    for label, pooled in (("before (connect per call)", False), ("after (pooled WAL)", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "load.db")
+            build_db(path, args.rows)
+            db.get_pool().close_all()
+            if not pooled:
+                # build_db ran through the pool, so put the file back in rollback-journal mode
+                conn = sqlite3.connect(path)
+                conn.execute("PRAGMA journal_mode=DELETE")
+                conn.close()
+                db._pool = LegacyPool(path)
+
+            latencies, elapsed, errors = run_load(args.writers, args.readers, args.ops)
+            db.get_pool().close_all()
+            db._pool = None
+
+        print(f"\n{label}: {elapsed:.2f}s wall, {len(errors)} errors")
+        for op, values in latencies.items():
+            if values:
+                print(f"  {op:<7} n={len(values):<5} p50={statistics.median(values):7.2f}ms p99={percentile(values, 0.99):7.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Local stand-in for the Gemini generateContent and streamGenerateContent
+(alt=sse) APIs.
+
+Point the backend at it with GEMINI_BASE_URL=http://127.0.0.1:8765/v1beta
+(any GOOGLE_API_KEY value works). Run standalone from the backend folder:
+    python -m benchmarks.gemini_stub --port 8765 --latency 0.8
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+import zlib
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CARD_RESPONSE = {
+    "name": "Zen Office Decor",
+    "phone": "+1-555-0100",
+    "email": "hello@zendecor.com",
+    "address": "12 Calm Street",
+    "website": "",
+    "category": "Office Decor",
+    "products": "Desk Plants, Minimalist Organizers",
+    "tagline": "Bring calm to your desk",
+    "social_media": "@zendecor",
+    "designation": "",
+}
+
+SEARCH_RESPONSE = {
+    "market_insights": {
+        "price_trend": "Rising",
+        "average_price": "$20 - $50",
+        "trending_keywords": ["Eco-friendly", "Desk"],
+        "summary": "Stub market summary.",
+    },
+    "products": [
+        {"title": f"Stub Product {i}", "price": f"${10 * i}", "description": "Stub", "link": "#"}
+        for i in range(1, 6)
+    ],
+    "vendors": [
+        {"name": f"Stub Vendor {i}", "specialty": "Stub", "website": "#", "products": [{"title": "Item", "price": "$5"}]}
+        for i in range(1, 6)
+    ],
+}
+
+# Gemini bills a fixed token count per image, text at roughly 4 chars a token
+IMAGE_TOKENS = 258
+# Streamed replies: text per chunk, and the share of the latency spent
+# before the first chunk (the rest is spread over the chunks)
+STREAM_CHUNK_CHARS = 64
+FIRST_CHUNK_SHARE = 0.2
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+def wrap_text(text, prompt_tokens=0):
+    output_tokens = estimate_tokens(text)
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}]}}],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        },
+    }
+
+def card_for(image_data, websites):
+    """The card reply for one image; with websites, each image maps to one vendor site."""
+    if not websites:
+        return CARD_RESPONSE
+    i = zlib.crc32(image_data.encode("ascii")) % len(websites)
+    return {**CARD_RESPONSE, "name": f"Sim Vendor {i}", "email": f"sales@vendor{i}.example", "website": websites[i]}
+
+def create_app(latency=0.5, per_image_latency=0.0, drop_batch_item=False,
+               rate_429=0.0, malformed_rate=0.0, jitter=0.0, websites=None, seed=None):
+    """
+    latency is paid once per call and per_image_latency once per image in it,
+    plus up to `jitter` seconds at random. With drop_batch_item, batch
+    replies leave out their last card so the caller's single-card re-run
+    path is exercised. rate_429 of calls are rejected as rate limited and
+    malformed_rate of replies carry truncated JSON. With websites, each card
+    image is answered as one of those vendors (stable per image).
+    A ":streamGenerateContent" target streams the same reply as SSE chunks.
+    """
+    app = FastAPI(title="Gemini Stub")
+    app.state.latency = latency
+    app.state.per_image_latency = per_image_latency
+    app.state.drop_batch_item = drop_batch_item
+    app.state.rate_429 = rate_429
+    app.state.malformed_rate = malformed_rate
+    app.state.jitter = jitter
+    app.state.websites = list(websites or [])
+    app.state.rng = random.Random(seed)
+    app.state.calls = 0
+    app.state.rejected_429 = 0
+    app.state.malformed = 0
+    app.state.prompt_tokens = 0
+    app.state.output_tokens = 0
+
+    @app.post("/v1beta/models/{target}")
+    async def generate_content(target: str, request: Request):
+        payload = await request.json()
+        app.state.calls += 1
+        parts = payload["contents"][0]["parts"]
+        images = [p["inline_data"]["data"] for p in parts if "inline_data" in p]
+        rng = app.state.rng
+        delay = app.state.latency + len(images) * app.state.per_image_latency + rng.uniform(0, app.state.jitter)
+        if rng.random() < app.state.rate_429:
+            app.state.rejected_429 += 1
+            await asyncio.sleep(min(delay, 0.05))
+            return JSONResponse(status_code=429, content={"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}})
+        streaming = target.endswith(":streamGenerateContent")
+        if not streaming:
+            await asyncio.sleep(delay)
+
+        if len(images) > 1:
+            cards = [{"index": i, **card_for(data, app.state.websites)} for i, data in enumerate(images)]
+            if app.state.drop_batch_item:
+                cards = cards[:-1]
+            text = json.dumps(cards)
+        else:
+            text = json.dumps(card_for(images[0], app.state.websites) if images else SEARCH_RESPONSE)
+        if rng.random() < app.state.malformed_rate:
+            app.state.malformed += 1
+            text = text[:len(text) // 2]
+
+        prompt_tokens = len(images) * IMAGE_TOKENS + sum(estimate_tokens(p["text"]) for p in parts if "text" in p)
+        response = wrap_text(text, prompt_tokens)
+        app.state.prompt_tokens += prompt_tokens
+        app.state.output_tokens += response["usageMetadata"]["candidatesTokenCount"]
+        if streaming:
+            return StreamingResponse(stream_chunks(text, prompt_tokens, delay), media_type="text/event-stream")
+        return response
+
+    async def stream_chunks(text, prompt_tokens, delay):
+        chunks = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)] or [""]
+        await asyncio.sleep(delay * FIRST_CHUNK_SHARE)
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(delay * (1 - FIRST_CHUNK_SHARE) / len(chunks))
+            # Like the real API, usageMetadata carries running totals
+            event = wrap_text(chunk, prompt_tokens)
+            event["usageMetadata"] = wrap_text(text[:(i + 1) * STREAM_CHUNK_CHARS], prompt_tokens)["usageMetadata"]
+            yield f"data: {json.dumps(event)}\r\n\r\n"
+
+    return app
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def serve_in_thread(app, port):
+    """Starts `app` under uvicorn on a daemon thread and waits until it is accepting."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per generateContent call")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency), host="127.0.0.1", port=args.port)
+
+if __name__ == "__main__":
+    main()
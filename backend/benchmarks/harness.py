@@ -0,0 +1,377 @@
+"""
+End-to-end benchmark harness. Starts the backend (a uvicorn subprocess with
+a fresh DB in a temp folder) against benchmarks.simulator, drives
+/analyze-card, the /status-stream SSE feed, /search-gifts and /cards at a
+fixed concurrency, and writes latency percentiles, throughput and the
+server's own span timings (/metrics) to a JSON report.
+
+Pass --baseline with an earlier report to compare: any scenario whose
+throughput drops, or whose p95/p99 latency grows, by more than --tolerance
+(or whose error rate rises by over a point) is listed and the exit status
+is 1. Keep the simulator settings equal between the two runs.
+
+Run from the backend folder:
+    python -m benchmarks.harness --requests 100 --concurrency 8 --output before.json
+    python -m benchmarks.harness --requests 100 --concurrency 8 --output after.json --baseline before.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+from PIL import Image, ImageDraw
+
+from benchmarks.gemini_stub import free_port
+from benchmarks.simulator import PRODUCTS, Simulator
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("analyze", "sse", "search", "cards")
+SEARCH_QUERIES = ["coffee hamper", "leather journal", "desk plants", "tech gifts under 2000",
+                  "eco friendly", "tea chest", "diwali corporate gifts", "candles"]
+CARDS_PAGES = 3
+PERCENTILES = (50, 90, 95, 99)
+
+def card_images(count, seed):
+    """Distinct card photos, so each /analyze-card call is a cache miss."""
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        img = Image.new("RGB", (1000, 600), tuple(rng.randint(200, 255) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(12):
+            x, y = rng.randint(0, 900), rng.randint(0, 500)
+            draw.rectangle((x, y, x + rng.randint(20, 100), y + rng.randint(10, 40)),
+                           fill=tuple(rng.randint(0, 120) for _ in range(3)))
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=85)
+        images.append(buf.getvalue())
+    return images
+
+def seed_vendors_jsonl(count, seed):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        lines.append(json.dumps({
+            "name": f"Seeded Vendor {i}",
+            "category": rng.choice(["Food & Beverage", "Electronics", "Home Decor", "Stationery"]),
+            "website": f"https://seeded{i}.example.com",
+            "products": ", ".join(f"{p} ₹{rng.randint(100, 5000)}" for p in rng.sample(PRODUCTS, 3)),
+        }))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+def distribution(values):
+    """Latency summary in ms from a list of seconds."""
+    values = sorted(v * 1000 for v in values)
+    if not values:
+        return {}
+    summary = {"mean": statistics.mean(values), "max": values[-1]}
+    summary.update({f"p{p}": percentile(values, p) for p in PERCENTILES})
+    return {k: round(v, 1) for k, v in summary.items()}
+
+class BackendProcess:
+    """The FastAPI app under uvicorn in a child process, working in its own temp folder."""
+
+    def __init__(self, env, workers=1):
+        self.workdir = tempfile.mkdtemp(prefix="archive-bench-")
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.log_path = os.path.join(self.workdir, "backend.log")
+        self._log = open(self.log_path, "w")
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+             "--host", "127.0.0.1", "--port", str(self.port), "--workers", str(workers), "--log-level", "warning"],
+            cwd=self.workdir, env={**os.environ, **env}, stdout=self._log, stderr=subprocess.STDOUT,
+        )
+
+    def wait_ready(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"Backend exited with {self.proc.returncode}; see {self.log_path}")
+            try:
+                if httpx.get(f"{self.base_url}/model-stats", timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"Backend not ready after {timeout}s; see {self.log_path}")
+
+    def stop(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self._log.close()
+
+async def run_load(call, requests, concurrency, warmup=0):
+    """
+    Runs call(i) for i in range(warmup + requests) with `concurrency` in
+    flight; the warmup calls are not measured. call returns a dict of extra
+    per-request measurements (seconds) or raises on failure.
+    """
+    for i in range(warmup):
+        try:
+            await call(i)
+        except Exception:
+            pass
+
+    latencies = []
+    extras = {}
+    errors = {}
+    next_index = iter(range(warmup, warmup + requests))
+
+    async def worker():
+        for i in next_index:
+            start = time.perf_counter()
+            try:
+                extra = await call(i) or {}
+            except Exception as e:
+                key = type(e).__name__ if not str(e) else str(e)[:120]
+                errors[key] = errors.get(key, 0) + 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            for name, value in extra.items():
+                extras.setdefault(name, []).append(value)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    result = {
+        "requests": requests,
+        "ok": len(latencies),
+        "error_rate": round(1 - len(latencies) / requests, 4) if requests else 0.0,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "wall_s": round(wall, 2),
+        "latency_ms": distribution(latencies),
+        "errors": errors,
+    }
+    for name, values in extras.items():
+        result[f"{name}_ms"] = distribution(values)
+    return result
+
+def check(response):
+    if response.status_code >= 400:
+        raise RuntimeError(f"HTTP {response.status_code} {response.request.url.path}")
+    return response
+
+def scenario_calls(client, images, outcomes, warmup):
+    """The per-request coroutine of each scenario."""
+    cursors = {}
+
+    async def analyze(i):
+        r = check(await client.post("/analyze-card", files={"front": (f"card{i}.jpg", images[i], "image/jpeg")}))
+        data = r.json()
+        if i >= warmup:
+            key = "ai_error" if data.get("name") == "AI Error" else f"scrape_{data.get('scrape_status')}"
+            outcomes[key] = outcomes.get(key, 0) + 1
+
+    async def sse(i):
+        """Follows one analysis on /status-stream until "Complete", as the dashboard does."""
+        request_id = str(uuid.uuid4())
+        opened = time.perf_counter()
+        first_event = asyncio.get_running_loop().create_future()
+        complete = asyncio.get_running_loop().create_future()
+
+        async def listen():
+            async with client.stream("GET", f"/status-stream/{request_id}") as stream:
+                async for line in stream.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    if not first_event.done():
+                        first_event.set_result(time.perf_counter() - opened)
+                    status = json.loads(line[5:]).get("status", "")
+                    if status == "Complete" or status.startswith("Error"):
+                        complete.set_result(time.perf_counter())
+                        return
+
+        listener = asyncio.ensure_future(listen())
+        try:
+            await asyncio.wait_for(asyncio.shield(first_event), 10)
+            check(await client.post(
+                "/analyze-card",
+                files={"front": (f"card{i}.jpg", images[i], "image/jpeg")},
+                data={"request_id": request_id},
+            ))
+            answered = time.perf_counter()
+            done_at = await asyncio.wait_for(asyncio.shield(complete), 10)
+            return {"first_event": first_event.result(), "complete_after_response": max(0.0, done_at - answered)}
+        finally:
+            listener.cancel()
+
+    async def search(i):
+        check(await client.post("/search-gifts", json={"query": SEARCH_QUERIES[i % len(SEARCH_QUERIES)]}))
+
+    async def cards(i):
+        """CARDS_PAGES keyset pages of the dashboard list, each worker walking further down."""
+        cursor = cursors.get(i % 64)
+        for _ in range(CARDS_PAGES):
+            r = check(await client.get("/cards", params={"limit": 50, **({"cursor": cursor} if cursor else {})}))
+            cursor = r.json()["next_cursor"]
+            if not cursor:
+                break
+        cursors[i % 64] = cursor
+
+    return {"analyze": analyze, "sse": sse, "search": search, "cards": cards}
+
+_SERIES_RE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+_LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+def parse_metrics(text):
+    """/metrics summaries as {"span{labels}": {"p50": ms, "p95": ms, "p99": ms, "count": n}}."""
+    series = {}
+    for line in text.splitlines():
+        match = _SERIES_RE.match(line)
+        if not match:
+            continue
+        metric, labels, value = match.groups()
+        labels = dict(_LABEL_RE.findall(labels))
+        quantile = labels.pop("quantile", None)
+        span = labels.pop("span", metric)
+        key = span + ("{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}" if labels else "")
+        entry = series.setdefault(key, {})
+        if quantile is not None:
+            entry[f"p{round(float(quantile) * 100)}"] = round(float(value) * 1000, 2)
+        elif metric.endswith("_count"):
+            entry["count"] = int(float(value))
+    return series
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+async def run(args, backend, images):
+    outcomes = {}
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency * 2 + 4)
+    async with httpx.AsyncClient(base_url=backend.base_url, timeout=120, limits=limits) as client:
+        if "cards" in args.scenarios and args.seed_cards:
+            check(await client.post("/cards/bulk", params={"format": "jsonl"},
+                                    content=seed_vendors_jsonl(args.seed_cards, args.seed)))
+
+        calls = scenario_calls(client, images, outcomes, args.warmup)
+        for name in args.scenarios:
+            print(f"Running {name}: {args.requests} requests, {args.concurrency} concurrent...")
+            call = calls[name]
+            if name == "sse":
+                # Its own images, so these analyses miss the cache too
+                offset = args.warmup + args.requests
+                call = (lambda c: lambda i: c(i + offset))(call)
+            results[name] = await run_load(call, args.requests, args.concurrency, args.warmup)
+        server_spans = parse_metrics((await client.get("/metrics")).text)
+    if "analyze" in results:
+        results["analyze"]["outcomes"] = outcomes
+    return results, server_spans
+
+def compare(report, baseline, tolerance):
+    """Rows of (scenario, metric, baseline, current, change, regressed)."""
+    rows = []
+    for name, current in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        # (metric, baseline, current, higher is better, gated); p50 is shown but not gated
+        checks = [("throughput_rps", base.get("throughput_rps"), current.get("throughput_rps"), True, True)]
+        for p in ("p50", "p95", "p99"):
+            checks.append((f"latency {p} ms", base.get("latency_ms", {}).get(p),
+                           current.get("latency_ms", {}).get(p), False, p != "p50"))
+        for metric, old, new, higher_is_better, gated in checks:
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            regressed = gated and (change < -tolerance if higher_is_better else change > tolerance)
+            rows.append((name, metric, old, new, change, regressed))
+        old_errors, new_errors = base.get("error_rate", 0.0), current.get("error_rate", 0.0)
+        rows.append((name, "error rate", old_errors, new_errors, new_errors - old_errors, new_errors - old_errors > 0.01))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=50, help="measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=3, help="unmeasured requests before each scenario")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--seed-cards", type=int, default=5000, help="vendors bulk-imported before the cards scenario")
+    parser.add_argument("--vendors", type=int, default=8, help="simulated vendor websites")
+    parser.add_argument("--gemini-latency", type=float, default=0.5)
+    parser.add_argument("--gemini-jitter", type=float, default=0.2)
+    parser.add_argument("--rate-429", type=float, default=0.05)
+    parser.add_argument("--malformed-rate", type=float, default=0.05)
+    parser.add_argument("--site-latency", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_report.json")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown before flagging")
+    args = parser.parse_args()
+
+    sim = Simulator(args.vendors, args.gemini_latency, args.gemini_jitter, args.rate_429,
+                    args.malformed_rate, args.site_latency, args.seed)
+    backend = BackendProcess(sim.env(), args.workers)
+    try:
+        backend.wait_ready()
+        images = card_images(2 * (args.warmup + args.requests), args.seed)
+        scenarios, server_spans = asyncio.run(run(args, backend, images))
+    finally:
+        backend.stop()
+        sim.stop()
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        },
+        "scenarios": scenarios,
+        "simulator": sim.stats(),
+        "server_spans": server_spans,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'scenario':>8} | {'ok':>9} | {'req/s':>7} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8}")
+    for name, r in scenarios.items():
+        lat = r["latency_ms"]
+        print(f"{name:>8} | {r['ok']:>4}/{r['requests']:<4} | {r['throughput_rps']:>7} | "
+              f"{lat.get('p50', '-'):>8} | {lat.get('p95', '-'):>8} | {lat.get('p99', '-'):>8}")
+    print(f"Simulator: {sim.stats()}")
+    print(f"Report written to {args.output} (backend log: {backend.log_path})")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("config", {}).get("requests") != args.requests:
+            print("Note: the baseline used a different --requests; percentiles may not be comparable.")
+        rows = compare(report, baseline, args.tolerance)
+        print(f"\nAgainst {args.baseline} (tolerance {args.tolerance:.0%}):")
+        for name, metric, old, new, change, regressed in rows:
+            shown = f"{change:+.1%}" if metric != "error rate" else f"{change:+.3f}"
+            print(f"{name:>8} | {metric:>16} | {old:>9} -> {new:>9} | {shown:>8}{'  REGRESSION' if regressed else ''}")
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Compares the BeautifulSoup vendor page parser with the lxml extractor on the
+saved pages in benchmarks/html_corpus (plus one generated heavy page):
+parse time and precision/recall against expected.json.
+
+Run from the backend folder:
+    python -m benchmarks.html_extract --repeat 20
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import tempfile
+import time
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "html_corpus")
+
+def heavy_page(products=300, script_kb=1024):
+    """A large storefront: a big inline script bundle, JSON-LD and a long product grid."""
+    items = [(f"Gift Product {i}", f"{10 + i}.00") for i in range(products)]
+    ld = {
+        "@context": "https://schema.org",
+        "@type": "ItemList",
+        "itemListElement": [
+            {"@type": "ListItem", "position": i + 1,
+             "item": {"@type": "Product", "name": name, "offers": {"price": price, "priceCurrency": "USD"}}}
+            for i, (name, price) in enumerate(items)
+        ],
+    }
+    bundle = "var t=" + json.dumps(["$%d" % i for i in range(script_kb * 1024 // 8)]) + ";"
+    cards = "".join(
+        f'<li class="grid__item"><div class="product-card"><h3 class="card__title">{name}</h3>'
+        f'<span class="price-item">${price}</span></div></li>'
+        for name, price in items
+    )
+    page = (
+        f"<html><head><script>{bundle}</script>"
+        f'<script type="application/ld+json">{json.dumps(ld)}</script></head>'
+        f'<body><ul class="product-grid">{cards}</ul></body></html>'
+    )
+    # Both parsers keep at most 10 items, in page order
+    return page, [[name, price] for name, price in items[:10]]
+
+def load_corpus():
+    with open(os.path.join(CORPUS_DIR, "expected.json"), encoding="utf-8") as f:
+        expected = json.load(f)
+    pages = []
+    for name, pairs in expected.items():
+        with open(os.path.join(CORPUS_DIR, name), encoding="utf-8") as f:
+            pages.append((name, f.read(), pairs))
+    return pages
+
+def price_value(price):
+    match = re.search(r"\d[\d,]*(?:\.\d+)?", str(price))
+    return round(float(match.group().replace(",", "")), 2) if match else None
+
+def score(result, expected):
+    """(true positives, extracted, expected) on (name, price) pairs."""
+    guide = result.get("pricing_guide")
+    extracted = guide if isinstance(guide, list) else []
+    got = {(p["item"].strip().lower(), price_value(p["price"])) for p in extracted if p.get("item") != "Generic Price"}
+    want = {(name.strip().lower(), price_value(price)) for name, price in expected}
+    return len(got & want), len(got), len(want)
+
+def time_parser(parse, page, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = parse(page)
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    # scraper_service opens the app DB relative to the working directory
+    os.chdir(tempfile.mkdtemp())
+    from services.page_extractor import extract_vendor_page
+    from services.scraper_service import parse_vendor_page_soup
+
+    pages = load_corpus()
+    pages.append(("generated heavy page",) + heavy_page())
+    parsers = [("bs4", parse_vendor_page_soup), ("lxml", extract_vendor_page)]
+    totals = {label: [0, 0, 0, 0.0] for label, _ in parsers}
+
+    print(f"{'page':>24} | {'parser':>6} | {'size':>8} | {'median ms':>9} | {'found':>5} | {'correct':>7} | {'expected':>8}")
+    for name, page, expected in pages:
+        for label, parse in parsers:
+            result, ms = time_parser(parse, page, args.repeat)
+            tp, got, want = score(result, expected)
+            t = totals[label]
+            t[0] += tp; t[1] += got; t[2] += want; t[3] += ms
+            print(f"{name:>24} | {label:>6} | {len(page) // 1024:>6}KB | {ms:>9.2f} | {got:>5} | {tp:>7} | {want:>8}")
+
+    print()
+    for label, (tp, got, want, ms) in totals.items():
+        precision = tp / got if got else 1.0
+        recall = tp / want if want else 1.0
+        print(f"{label:>6}: precision {precision:.0%}, recall {recall:.0%}, total median parse time {ms:.1f} ms")
+
+if __name__ == "__main__":
+    main()
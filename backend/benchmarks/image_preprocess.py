@@ -0,0 +1,74 @@
+"""
+Runs image_service.prepare_card_image over a directory of sample card
+photos and reports size reduction and processing time per image.
+
+Run from the backend folder:
+    python -m benchmarks.image_preprocess --dir path/to/samples
+Without --dir a few synthetic 12MP "phone photos" are generated.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+from services import image_service
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+
+def synthetic_samples(folder, count=4):
+    rng = random.Random(0)
+    paths = []
+    for i in range(count):
+        img = Image.new("RGB", (4032, 3024), (rng.randint(90, 140),) * 3)
+        draw = ImageDraw.Draw(img)
+        draw.rectangle((800, 700, 3200, 2300), fill=(245, 245, 240))
+        for line in range(12):
+            y = 900 + line * 110
+            draw.text((1000, y), f"Vendor {i} line {line} +1-555-01{line:02d}", fill=(20, 20, 20))
+        # Sensor-like noise so the JPEG size is realistic
+        noise = Image.effect_noise((4032, 3024), 18).convert("RGB")
+        img = Image.blend(img, noise, 0.08)
+        path = os.path.join(folder, f"sample_{i}.jpg")
+        img.save(path, "JPEG", quality=95)
+        paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dir", help="folder of sample card images")
+    parser.add_argument("--pairs", action="store_true", help="also merge consecutive images as front/back")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp()
+    if args.dir:
+        samples = sorted(os.path.join(args.dir, f) for f in os.listdir(args.dir) if f.lower().endswith(IMAGE_EXTS))
+    else:
+        samples = synthetic_samples(work)
+
+    jobs = [(p, None) for p in samples]
+    if args.pairs:
+        jobs += list(zip(samples[::2], samples[1::2]))
+
+    print(f"max_edge={image_service.MAX_EDGE} format={image_service.OUTPUT_FORMAT} "
+          f"quality={image_service.QUALITY} crop={image_service.CROP_TO_CARD}")
+    print(f"{'image':<28} | {'before':>9} | {'after':>9} | {'saved':>6} | {'ms':>7}")
+    timings, saved = [], []
+    for i, (front, back) in enumerate(jobs):
+        out = os.path.join(work, f"out_{i}.{image_service.OUTPUT_EXT}")
+        start = time.perf_counter()
+        stats = image_service.prepare_card_image(front, back, out)
+        ms = (time.perf_counter() - start) * 1000
+        timings.append(ms)
+        saved.append(stats["bytes_saved"] / stats["original_bytes"])
+        label = os.path.basename(front) + (" + back" if back else "")
+        print(f"{label[:28]:<28} | {stats['original_bytes'] / 1024:>7.0f}KB | {stats['processed_bytes'] / 1024:>7.0f}KB "
+              f"| {saved[-1]:>5.0%} | {ms:>7.1f}")
+
+    print(f"\nmedian time {statistics.median(timings):.1f}ms, median size reduction {statistics.median(saved):.0%}")
+
+if __name__ == "__main__":
+    main()
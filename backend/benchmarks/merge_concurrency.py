@@ -0,0 +1,102 @@
+"""
+Checks that /status-stream stays responsive while many front/back merges
+run. A probe opens a status stream every 50ms and times the first event
+while --merges concurrent /analyze-card uploads (12MP front + back) are
+processed. --inline runs the image work on the event loop, as before the
+worker pools, for comparison.
+
+Run from the backend folder:
+    python -m benchmarks.merge_concurrency --merges 20
+    python -m benchmarks.merge_concurrency --merges 20 --inline
+"""
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from PIL import Image
+
+from benchmarks.gemini_stub import create_app, free_port, serve_in_thread
+
+def phone_photo(seed):
+    img = Image.effect_noise((4032, 3024), 30 + seed).convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=92)
+    return buf.getvalue()
+
+async def probe_status_stream(client, stop, samples):
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        async with client.stream("GET", f"/status-stream/probe-{i}") as r:
+            async for _ in r.aiter_lines():
+                break
+        samples.append((time.perf_counter() - start) * 1000)
+        i += 1
+        await asyncio.sleep(0.05)
+
+async def run(base_url, merges):
+    fronts = [phone_photo(i) for i in range(merges)]
+    back = phone_photo(99)
+    samples = []
+    stop = asyncio.Event()
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as client:
+        probe = asyncio.create_task(probe_status_stream(client, stop, samples))
+        await asyncio.sleep(0.3)
+        baseline = len(samples)
+
+        start = time.perf_counter()
+        uploads = [
+            client.post("/analyze-card", files={
+                "front": (f"f{i}.jpg", fronts[i], "image/jpeg"),
+                "back": ("b.jpg", back, "image/jpeg"),
+            })
+            for i in range(merges)
+        ]
+        responses = await asyncio.gather(*uploads)
+        wall = time.perf_counter() - start
+        stop.set()
+        await probe
+
+    under_load = samples[baseline:]
+    return wall, under_load, [r.status_code for r in responses]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--merges", type=int, default=20)
+    parser.add_argument("--inline", action="store_true", help="run image work on the event loop (old behaviour)")
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    serve_in_thread(create_app(0.2), stub_port)
+    os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{stub_port}/v1beta"
+    os.environ["GOOGLE_API_KEY"] = "stub"
+    os.chdir(tempfile.mkdtemp())
+
+    import main as backend
+    from services import executors
+    if args.inline:
+        async def inline(fn, *a, **kw):
+            return fn(*a, **kw)
+        executors.run_cpu = inline
+        executors.run_io = inline
+
+    app_port = free_port()
+    serve_in_thread(backend.app, app_port)
+    wall, probes, statuses = asyncio.run(run(f"http://127.0.0.1:{app_port}", args.merges))
+
+    mode = "inline (event loop)" if args.inline else f"pools (cpu={executors.CPU_WORKERS}, io={executors.IO_WORKERS})"
+    print(f"{mode}: {args.merges} merges in {wall:.2f}s, statuses {sorted(set(statuses))}")
+    if probes:
+        probes.sort()
+        print(f"status-stream first event under load: n={len(probes)} p50={statistics.median(probes):.1f}ms "
+              f"p95={probes[int(len(probes) * 0.95) - 1]:.1f}ms max={probes[-1]:.1f}ms")
+    else:
+        print("status-stream never answered while merges were running")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Compares the FTS5 search_cards path against the old LIKE scan.
+
+Run from the backend folder:
+    python -m benchmarks.search
+    python -m benchmarks.search --sizes 1000 10000 --repeat 20
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import db
+
+WORDS = [
+    "bamboo", "leather", "notebook", "coffee", "hamper", "plants", "desk",
+    "organizer", "charger", "tumbler", "candle", "tea", "chocolate", "pen",
+    "journal", "wallet", "bottle", "speaker", "mug", "tote", "ceramic",
+    "handmade", "eco", "premium", "custom", "branded", "artisan", "gourmet",
+]
+# Filler vocabulary so each query term only matches a realistic slice of the catalog
+FILLER = ["".join(random.Random(i).choices("bcdfghklmnprstvz", k=3)) + "ique" for i in range(2000)]
+CATEGORIES = ["Food & Beverage", "Electronics", "Sustainable Goods", "Accessories", "Office Decor", "Stationery"]
+QUERIES = ["desk plants", "eco friendly bamboo", "leather journal", "gourmet coffee hamper", "wireless charger"]
+
+def fake_card(rng, i):
+    return (
+        f"{rng.choice(FILLER).title()} {rng.choice(WORDS).title()} Co. {i}",
+        f"vendor{i}@example.com",
+        rng.choice(CATEGORIES),
+        f"https://vendor{i}.example.com",
+        json.dumps({
+            "tagline": " ".join(rng.sample(FILLER, 4) + [rng.choice(WORDS)]),
+            "products_sold": ", ".join(rng.sample(FILLER, 5) + [rng.choice(WORDS)]),
+        }),
+        "None",
+    )
+
+def search_cards_like(query):
+    """The original unranked LIKE scan that db.search_cards replaced; the baseline here."""
+    keywords = db._search_keywords(query)
+    if not keywords:
+        return []
+
+    # Match ANY keyword in ANY field (broad search)
+    conditions = []
+    params = []
+    for word in keywords:
+        conditions.append('(lower(name) LIKE ? OR lower(category) LIKE ? OR lower(additional_info) LIKE ?)')
+        params.extend([f'%{word}%', f'%{word}%', f'%{word}%'])
+
+    with db.get_connection() as conn:
+        rows = conn.execute(f"SELECT * FROM cards WHERE {' OR '.join(conditions)}", params).fetchall()
+    return [db._row_to_card(row) for row in rows]
+
+def build_db(path, size):
+    db.DB_NAME = path
+    db.init_db()
+    rng = random.Random(size)
+    conn = db.sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO cards (name, contact, category, website, additional_info, image_path) VALUES (?, ?, ?, ?, ?, ?)",
+        (fake_card(rng, i) for i in range(size)),
+    )
+    conn.commit()
+    conn.close()
+
+def time_search(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        for q in QUERIES:
+            start = time.perf_counter()
+            fn(q)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} | {'LIKE p50':>9} {'LIKE p95':>9} | {'FTS p50':>9} {'FTS p95':>9} | speedup")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            build_db(os.path.join(tmp, "bench.db"), size)
+            like_p50, like_p95 = time_search(search_cards_like, args.repeat)
+            fts_p50, fts_p95 = time_search(db.search_cards, args.repeat)
+            db.get_pool().close_all()
+        print(f"{size:>8} | {like_p50:>7.2f}ms {like_p95:>7.2f}ms | {fts_p50:>7.2f}ms {fts_p95:>7.2f}ms | {like_p50 / fts_p50:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Time to first web result on /search-gifts/stream, now that the Gemini
+search is streamed and parsed incrementally, against the time to the whole
+reply (what every web section used to wait for). Each query is new, so
+every search is a cache miss. With --malformed-rate some replies break off
+halfway, and the sections they never reached come from the fallback data.
+
+Run from the backend folder:
+    python -m benchmarks.search_stream --latency 4 --searches 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.gemini_stub import create_app, free_port, serve_in_thread
+
+async def one_search(client, query):
+    """Seconds to the first web line, to the last web line, and the web items received."""
+    start = time.perf_counter()
+    first = last = None
+    items = {"web_products": 0, "web_vendors": 0}
+    async with client.stream("POST", "/search-gifts/stream", json={"query": query}) as r:
+        async for line in r.aiter_lines():
+            if not line.strip():
+                continue
+            section = json.loads(line)
+            if section["section"] in ("market_insights", "web_products", "web_vendors"):
+                now = time.perf_counter() - start
+                first = first if first is not None else now
+                last = now
+                if section["section"] in items:
+                    items[section["section"]] += len(section["items"])
+    return first, last, items
+
+async def run(base_url, searches, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        async def bounded(i):
+            async with limit:
+                return await one_search(client, f"stream benchmark gifts {i}")
+        return await asyncio.gather(*(bounded(i) for i in range(searches)))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=4.0, help="seconds for a whole Gemini reply")
+    parser.add_argument("--searches", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub = create_app(args.latency, malformed_rate=args.malformed_rate, seed=0)
+    stub_port = free_port()
+    serve_in_thread(stub, stub_port)
+    os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{stub_port}/v1beta"
+    os.environ["GOOGLE_API_KEY"] = "stub"
+
+    # The app writes uploads/ and the DB relative to the working directory
+    os.chdir(tempfile.mkdtemp())
+    import main as backend
+
+    app_port = free_port()
+    serve_in_thread(backend.app, app_port)
+    results = asyncio.run(run(f"http://127.0.0.1:{app_port}", args.searches, args.concurrency))
+
+    firsts = sorted(r[0] * 1000 for r in results)
+    lasts = sorted(r[1] * 1000 for r in results)
+    print(f"Gemini stub latency {args.latency}s, {args.searches} searches, {args.concurrency} at a time")
+    print(f"first web result: p50 {statistics.median(firsts):7.0f}ms  max {firsts[-1]:7.0f}ms")
+    print(f"whole web reply:  p50 {statistics.median(lasts):7.0f}ms  max {lasts[-1]:7.0f}ms")
+    print(f"web items per search: {[r[2]['web_products'] + r[2]['web_vendors'] for r in results]}")
+    print(f"malformed replies from the stub: {stub.state.malformed}")
+
+if __name__ == "__main__":
+    main()
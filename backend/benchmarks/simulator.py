@@ -0,0 +1,158 @@
+"""
+Local stand-ins for everything /analyze-card and /search-gifts talk to:
+the Gemini API (benchmarks.gemini_stub, with 429s and malformed replies)
+and a set of fake vendor websites for the scraper.
+
+Each vendor site answers on its own loopback address (127.0.0.2,
+127.0.0.3, ...) because the scraper caches and rate-limits per host.
+Linux and Windows route all of 127.0.0.0/8 to loopback; on macOS add the
+aliases first (sudo ifconfig lo0 alias 127.0.0.2 up, ...).
+
+Run standalone from the backend folder:
+    python -m benchmarks.simulator --vendors 8 --rate-429 0.05
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, Response
+
+from benchmarks.gemini_stub import create_app as create_gemini_app, free_port
+
+PRODUCTS = ["Desk Planter", "Leather Journal", "Coffee Hamper", "Wireless Charger", "Scented Candle",
+            "Bamboo Organizer", "Tea Chest", "Brass Pen", "Photo Frame", "Ceramic Mug", "Tote Bag", "Gift Card"]
+
+def site_hosts(count):
+    return [f"127.0.0.{i}" for i in range(2, 2 + count)]
+
+def vendor_page(index, rng, products=8):
+    """A storefront page with JSON-LD products and a matching product grid."""
+    items = [(name, rng.randint(199, 4999)) for name in rng.sample(PRODUCTS, products)]
+    ld = {
+        "@context": "https://schema.org",
+        "@type": "ItemList",
+        "itemListElement": [
+            {"@type": "Product", "name": name, "offers": {"price": str(price), "priceCurrency": "INR"}}
+            for name, price in items
+        ],
+    }
+    grid = "".join(
+        f'<div class="product-card"><h3 class="card__title">{name}</h3><span class="price">₹{price}</span></div>'
+        for name, price in items
+    )
+    # Some bulk, like a real storefront's scripts and markup
+    filler = "<p>" + " ".join(rng.choice(PRODUCTS) for _ in range(2000)) + "</p>"
+    return (
+        f"<html><head><title>Vendor {index}</title>"
+        f'<script type="application/ld+json">{json.dumps(ld)}</script></head>'
+        f"<body><h1>Vendor {index}</h1>{grid}{filler}</body></html>"
+    )
+
+def create_sites_app(hosts, latency=0.1, seed=0):
+    """One page per host; revalidation with If-None-Match is answered with 304."""
+    rng = random.Random(seed)
+    pages = {host: vendor_page(i, rng) for i, host in enumerate(hosts)}
+    etags = {host: '"%s"' % hashlib.sha1(page.encode()).hexdigest()[:16] for host, page in pages.items()}
+
+    app = FastAPI(title="Vendor Sites")
+    app.state.latency = latency
+    app.state.hits = 0
+    app.state.not_modified = 0
+
+    @app.get("/{path:path}")
+    async def page(path: str, request: Request):
+        app.state.hits += 1
+        host = (request.headers.get("host") or "").split(":")[0]
+        await asyncio.sleep(app.state.latency)
+        if host not in pages:
+            return Response(status_code=404)
+        if request.headers.get("if-none-match") == etags[host]:
+            app.state.not_modified += 1
+            return Response(status_code=304, headers={"ETag": etags[host]})
+        return HTMLResponse(pages[host], headers={"ETag": etags[host]})
+
+    return app
+
+def serve_on_hosts(app, hosts, port):
+    """Like gemini_stub.serve_in_thread, listening on port at every address in hosts."""
+    sockets = []
+    for host in hosts:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        sockets.append(sock)
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": sockets}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+class Simulator:
+    """Gemini stub plus vendor sites, each on a daemon thread of this process."""
+
+    def __init__(self, vendors=8, gemini_latency=0.5, gemini_jitter=0.0, rate_429=0.0,
+                 malformed_rate=0.0, site_latency=0.1, seed=0):
+        hosts = site_hosts(vendors)
+        site_port = free_port()
+        self.websites = [f"http://{host}:{site_port}/" for host in hosts]
+        self.sites = create_sites_app(hosts, site_latency, seed)
+        self.gemini = create_gemini_app(
+            gemini_latency, jitter=gemini_jitter, rate_429=rate_429,
+            malformed_rate=malformed_rate, websites=self.websites, seed=seed
+        )
+        self.gemini_port = free_port()
+        self._servers = [
+            serve_on_hosts(self.sites, hosts, site_port),
+            serve_on_hosts(self.gemini, ["127.0.0.1"], self.gemini_port),
+        ]
+
+    def env(self):
+        """Environment that points the backend at the simulator."""
+        return {"GEMINI_BASE_URL": f"http://127.0.0.1:{self.gemini_port}/v1beta", "GOOGLE_API_KEY": "simulator"}
+
+    def stats(self):
+        g = self.gemini.state
+        return {
+            "gemini_calls": g.calls,
+            "gemini_429": g.rejected_429,
+            "gemini_malformed": g.malformed,
+            "gemini_prompt_tokens": g.prompt_tokens,
+            "gemini_output_tokens": g.output_tokens,
+            "site_hits": self.sites.state.hits,
+            "site_not_modified": self.sites.state.not_modified,
+        }
+
+    def stop(self):
+        for server in self._servers:
+            server.should_exit = True
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vendors", type=int, default=8)
+    parser.add_argument("--gemini-latency", type=float, default=0.5)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--site-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    sim = Simulator(args.vendors, args.gemini_latency, rate_429=args.rate_429,
+                    malformed_rate=args.malformed_rate, site_latency=args.site_latency)
+    for key, value in sim.env().items():
+        print(f"{key}={value}")
+    print("Vendor sites:", " ".join(sim.websites))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        sim.stop()
+
+if __name__ == "__main__":
+    main()
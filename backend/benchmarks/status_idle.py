@@ -0,0 +1,63 @@
+"""
+CPU cost of idle /status-stream subscribers: the old 100ms polling loop
+against the pub/sub StatusBus. Subscribers are driven in-process (no HTTP)
+so only the streaming logic is measured.
+
+Run from the backend folder:
+    python -m benchmarks.status_idle --subscribers 1000 --seconds 5
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from services import status_service
+
+async def polling_stream(store, request_id):
+    """The pre-bus implementation, kept here for comparison."""
+    last_message = ""
+    for _ in range(600):
+        current_message = store.get(request_id, "Initializing...")
+        if current_message != last_message:
+            yield f"data: {json.dumps({'status': current_message})}\n\n"
+            last_message = current_message
+        if current_message == "Complete" or current_message.startswith("Error"):
+            break
+        await asyncio.sleep(0.1)
+
+async def drain(stream):
+    async for _ in stream:
+        pass
+
+async def measure(make_stream, subscribers, seconds):
+    tasks = [asyncio.create_task(drain(make_stream(f"req-{i}"))) for i in range(subscribers)]
+    await asyncio.sleep(0.5)  # let every subscriber settle into its idle wait
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    await asyncio.sleep(seconds)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return cpu, wall
+
+async def main(subscribers, seconds):
+    store = {}
+    cpu, wall = await measure(lambda rid: polling_stream(store, rid), subscribers, seconds)
+    print(f"polling (100ms):  {cpu:.3f}s CPU over {wall:.1f}s -> {100 * cpu / wall:5.1f}% of a core")
+
+    async def bus_stream(rid):
+        response = await status_service.status_stream(rid)
+        async for chunk in response.body_iterator:
+            yield chunk
+
+    cpu, wall = await measure(bus_stream, subscribers, seconds)
+    print(f"pub/sub StatusBus: {cpu:.3f}s CPU over {wall:.1f}s -> {100 * cpu / wall:5.1f}% of a core")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+    print(f"{args.subscribers} idle subscribers")
+    asyncio.run(main(args.subscribers, args.seconds))
@@ -0,0 +1,115 @@
+"""
+Local multi-worker check for the status backends. Starts
+`uvicorn main:app --workers N` against the Gemini stub, uploads cards, and
+follows each request from several /status-stream connections (spread
+across workers by the OS). Every stream has to reach "Complete".
+
+Run from the backend folder:
+    python -m benchmarks.status_multiworker                    # sqlite backend
+    python -m benchmarks.status_multiworker --backend memory   # shows the old failure
+Exits non-zero if any stream misses the terminal status.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+from PIL import Image
+
+from benchmarks.gemini_stub import create_app, free_port, serve_in_thread
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def card_bytes(seed):
+    buf = io.BytesIO()
+    Image.new("RGB", (600, 360), (seed % 255, 120, 200)).save(buf, "JPEG")
+    return buf.getvalue()
+
+async def follow(client, request_id, delay):
+    await asyncio.sleep(delay)
+    statuses = []
+    async with client.stream("GET", f"/status-stream/{request_id}") as r:
+        async for line in r.aiter_lines():
+            if line.startswith("data: "):
+                statuses.append(json.loads(line[6:])["status"])
+    return statuses
+
+async def one_card(base_url, seed, streams):
+    request_id = str(uuid.uuid4())
+    # Separate clients so the streams use separate connections (and workers)
+    clients = [httpx.AsyncClient(base_url=base_url, timeout=90) for _ in range(streams + 1)]
+    try:
+        followers = [follow(c, request_id, 0.1 * i) for i, c in enumerate(clients[1:])]
+        upload = clients[0].post("/analyze-card", data={"request_id": request_id},
+                                 files={"front": ("card.jpg", card_bytes(seed), "image/jpeg")})
+        response, *results = await asyncio.gather(upload, *followers)
+        return response.status_code, results
+    finally:
+        for c in clients:
+            await c.aclose()
+
+async def run(base_url, cards, streams):
+    outcomes = await asyncio.gather(*(one_card(base_url, i, streams) for i in range(cards)))
+    complete = sum(1 for _, results in outcomes for s in results if s and s[-1] == "Complete")
+    total = cards * streams
+    return complete, total, [code for code, _ in outcomes]
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(f"{base_url}/model-stats", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("uvicorn did not start")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "memory"])
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--cards", type=int, default=10)
+    parser.add_argument("--streams", type=int, default=3, help="status streams per card")
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    serve_in_thread(create_app(1.0), stub_port)
+
+    app_port = free_port()
+    env = dict(
+        os.environ,
+        PYTHONPATH=BACKEND_DIR,
+        STATUS_BACKEND=args.backend,
+        GEMINI_BASE_URL=f"http://127.0.0.1:{stub_port}/v1beta",
+        GOOGLE_API_KEY="stub",
+    )
+    workdir = tempfile.mkdtemp()
+    # Create the schema once up front so workers do not race on it
+    subprocess.run([sys.executable, "-c", "import main"], cwd=workdir, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port), "--workers", str(args.workers),
+         "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{app_port}"
+    try:
+        wait_until_up(base_url)
+        complete, total, codes = asyncio.run(run(base_url, args.cards, args.streams))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    print(f"backend={args.backend} workers={args.workers}: {complete}/{total} streams reached Complete, "
+          f"upload statuses {sorted(set(codes))}")
+    sys.exit(0 if complete == total else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Bytes and latency of a dashboard grid of --cards cards loaded as the full
+uploaded images versus /thumbnails derivatives: first (rendering) request,
+cached request, and a 304 revalidation. Cards are merged front+back images
+as stored by /analyze-card.
+
+Run from the backend folder:
+    python -m benchmarks.thumbnails --cards 50
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+def write_cards(count):
+    """Merged, text-heavy card images under uploads/, like the analyzed uploads."""
+    os.makedirs("uploads", exist_ok=True)
+    rng = random.Random(0)
+    paths = []
+    for i in range(count):
+        img = Image.new("RGB", (1600, 2100), (250, 248, 240))
+        draw = ImageDraw.Draw(img)
+        for y in range(40, 2100, 36):
+            draw.text((60, y), f"Vendor {i} | +91 98{rng.randint(10**7, 10**8):d} | www.vendor{i}.example.com " * 2,
+                      fill=(rng.randint(0, 80),) * 3)
+        path = f"uploads/card{i}.jpg"
+        img.save(path, "JPEG", quality=85)
+        paths.append(path)
+    return paths
+
+def load_grid(client, urls, headers=None):
+    sizes = []
+    timings = []
+    responses = []
+    for url in urls:
+        start = time.perf_counter()
+        response = client.get(url, headers=headers or {})
+        timings.append((time.perf_counter() - start) * 1000)
+        sizes.append(len(response.content))
+        responses.append(response)
+    return sum(sizes), statistics.median(timings), responses
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=50)
+    parser.add_argument("--preset", default="sm")
+    args = parser.parse_args()
+
+    # The backend opens its DB and uploads folder relative to the working directory
+    os.chdir(tempfile.mkdtemp())
+    from fastapi.testclient import TestClient
+    from main import app
+
+    paths = write_cards(args.cards)
+    accept = {"accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8"}
+    print(f"{args.cards} cards; grid total bytes and median ms per image")
+    print(f"{'request':>28} | {'bytes':>10} | {'median ms':>9}")
+    with TestClient(app) as client:
+        total, ms, _ = load_grid(client, [f"/{p}" for p in paths])
+        print(f"{'full image (/uploads)':>28} | {total:>10} | {ms:>9.1f}")
+        thumbs = [f"/thumbnails/{args.preset}/{p}" for p in paths]
+        total, ms, responses = load_grid(client, thumbs, accept)
+        print(f"{args.preset + ' thumbnail, first':>28} | {total:>10} | {ms:>9.1f}")
+        total, ms, _ = load_grid(client, thumbs, accept)
+        print(f"{args.preset + ' thumbnail, cached':>28} | {total:>10} | {ms:>9.1f}")
+        etags = [r.headers["etag"] for r in responses]
+        timings = []
+        for url, etag in zip(thumbs, etags):
+            start = time.perf_counter()
+            assert client.get(url, headers={**accept, "if-none-match": etag}).status_code == 304
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{args.preset + ' thumbnail, 304':>28} | {0:>10} | {statistics.median(timings):>9.1f}")
+
+if __name__ == "__main__":
+    main()
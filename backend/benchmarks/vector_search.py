@@ -0,0 +1,99 @@
+"""
+Recall and latency of the vector and hybrid card search against the LIKE
+scan and FTS. Each query has a handful of relevant vendors hidden in a
+catalog of unrelated ones; queries use wording that does not line up
+exactly with the cards (singular/plural, typos, partial words).
+
+Run from the backend folder:
+    python -m benchmarks.vector_search --sizes 1000 10000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import db
+from benchmarks.search import FILLER, search_cards_like
+
+# concept -> (product names on the relevant cards, queries that should find them)
+CONCEPTS = {
+    "plants": (["Succulent Planters", "Bonsai Starter Kit", "Desk Terrarium"], ["desk plant", "planter", "succulents", "terrariums"]),
+    "leather": (["Leather Journals", "Monogrammed Wallets", "Laptop Sleeves"], ["leather journal", "leathr jornal", "wallet"]),
+    "coffee": (["Coffee Hampers", "Single Origin Beans", "Pour Over Sets"], ["coffee hamper", "cofee beans", "pourover"]),
+    "tech": (["Wireless Chargers", "Power Banks", "Bluetooth Speakers"], ["wireless charging", "powerbank", "speaker"]),
+    "tea": (["Darjeeling Tea Chests", "Herbal Infusions", "Matcha Kits"], ["tea chest", "darjeling", "herbal infusion"]),
+}
+RELEVANT_PER_CONCEPT = 5
+TOP_K = 10
+
+def build_db(path, size):
+    db.DB_NAME = path
+    db.init_db()
+    rng = random.Random(size)
+    rows = []
+    for concept, (products, _) in CONCEPTS.items():
+        rows += [(concept, rng.sample(products, 2)) for _ in range(RELEVANT_PER_CONCEPT)]
+    rows += [(None, rng.sample(FILLER, 3)) for _ in range(size - len(rows))]
+    rng.shuffle(rows)
+
+    relevant = {concept: set() for concept in CONCEPTS}
+    conn = db.sqlite3.connect(path)
+    for card_id, (concept, products) in enumerate(rows, start=1):
+        conn.execute(
+            "INSERT INTO cards (id, name, contact, category, website, additional_info, image_path) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (card_id, f"{rng.choice(FILLER).title()} Co. {card_id}", "", "General", "",
+             json.dumps({"products_sold": ", ".join(products), "tagline": " ".join(rng.sample(FILLER, 3))}), "None")
+        )
+        if concept:
+            relevant[concept].add(card_id)
+    conn.commit()
+    conn.close()
+
+    start = time.perf_counter()
+    db.rebuild_vector_index()
+    return relevant, time.perf_counter() - start
+
+def evaluate(search, relevant, repeat):
+    """(mean recall@TOP_K, p50 ms, p95 ms) over every concept query."""
+    scores = []
+    timings = []
+    for concept, (_, queries) in CONCEPTS.items():
+        for query in queries:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                results = search(query)
+                timings.append((time.perf_counter() - start) * 1000)
+            found = {card["id"] for card in results[:TOP_K]}
+            scores.append(len(relevant[concept] & found) / len(relevant[concept]))
+    timings.sort()
+    return statistics.mean(scores), statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    searches = [
+        ("LIKE", search_cards_like),
+        ("FTS", db.search_cards),
+        ("vector", lambda q: db.semantic_search_cards(q, hybrid=False)),
+        ("hybrid", db.semantic_search_cards),
+    ]
+    print(f"recall@{TOP_K} over {sum(len(q) for _, q in CONCEPTS.values())} queries, {RELEVANT_PER_CONCEPT} relevant cards each")
+    print(f"{'rows':>8} | {'method':>6} | {'recall':>6} | {'p50':>8} | {'p95':>8}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            relevant, build_s = build_db(os.path.join(tmp, "bench.db"), size)
+            for label, search in searches:
+                score, p50, p95 = evaluate(search, relevant, args.repeat)
+                print(f"{size:>8} | {label:>6} | {score:>6.0%} | {p50:>6.2f}ms | {p95:>6.2f}ms")
+            index_mb = os.path.getsize(db.vector_index().path) / 1e6
+            db.get_pool().close_all()
+        print(f"{size:>8} | index build {build_s:.1f}s, {index_mb:.1f} MB")
+
+if __name__ == "__main__":
+    main()
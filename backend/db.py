@@ -1,140 +1,791 @@
 import sqlite3
+import base64
 import json
+import os
+import queue
+import re
+import threading
 from contextlib import contextmanager
 
-DB_NAME = "storytellerz.db"
+from services.tracing import span, traced
 
+DB_NAME = os.getenv("DB_NAME", "storytellerz.db")
+
+# Maximum number of ranked matches returned by search_cards
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "50"))
+
+# Default and maximum page sizes for get_cards_page
+CARDS_PAGE_LIMIT = int(os.getenv("CARDS_PAGE_LIMIT", "50"))
+CARDS_PAGE_MAX = 500
+
+CARD_COLUMNS = ("id", "name", "contact", "category", "website", "additional_info", "image_path", "created_at")
+
+# Cards written per transaction by bulk imports
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+# Columns a bulk import can match existing cards on
+UPSERT_KEYS = ("website", "name")
+
+# Connection pool tuning
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_CACHE_KB = int(os.getenv("DB_CACHE_KB", "16384"))
+DB_MMAP_BYTES = int(os.getenv("DB_MMAP_BYTES", str(256 * 1024 * 1024)))
+DB_STATEMENT_CACHE = 256
+
+class ConnectionPool:
+    """
+    Bounded pool of tuned SQLite connections.
+
+    Connections are opened lazily up to `size` and handed out LIFO so the
+    hottest page cache is reused first. A thread that is already holding a
+    connection gets the same one back, so nested calls share a transaction.
+    """
+
+    def __init__(self, db_name, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.db_name = db_name
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=DB_STATEMENT_CACHE,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_KB}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_BYTES}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._open()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No database connection available after {self.timeout}s")
+
+    @contextmanager
+    def connection(self):
+        """Yields a pooled connection; commits on success, rolls back on error."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+
+        # Time spent waiting here means the pool is too small for the load
+        with span("db.acquire"):
+            conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self._idle.put(conn)
+
+    def close_all(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._opened = 0
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Returns the pool for the current DB_NAME, rebuilding it if DB_NAME changed."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.db_name != DB_NAME:
+            if _pool is not None:
+                _pool.close_all()
+            _pool = ConnectionPool(DB_NAME)
+        return _pool
+
+def get_connection():
+    return get_pool().connection()
+
+# Flattens the scalar values of additional_info so the search index sees
+# "Desk Plants Modern & Calm" rather than the raw JSON text.
+_FLATTEN_INFO_SQL = """
+    CASE WHEN json_valid({col}) THEN (
+        SELECT group_concat(value, ' ') FROM json_tree({col})
+        WHERE type NOT IN ('object', 'array')
+    ) ELSE {col} END
+"""
+
+@traced("db.init_db")
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cards (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT,
+                contact TEXT,
+                category TEXT,
+                website TEXT,
+                additional_info TEXT,
+                image_path TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # Backs keyset pagination on (created_at, id), optionally within a category
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cards_created_id ON cards (created_at, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cards_category_created_id ON cards (category COLLATE NOCASE, created_at, id)')
+        migrate_upsert_keys(conn)
+        migrate_fts(conn)
+        migrate_vendor_products(conn)
+    if not vector_index().exists():
+        rebuild_vector_index()
+
+def migrate_fts(conn):
+    """
+    Creates the cards_fts full-text index and the triggers that keep it in
+    sync with cards. Existing rows are backfilled the first time it runs.
+    """
     cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS cards (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            contact TEXT,
-            category TEXT,
-            website TEXT,
-            additional_info TEXT,
-            image_path TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cards_fts'")
+    if cursor.fetchone():
+        return
+
+    flat_new = _FLATTEN_INFO_SQL.format(col="new.additional_info")
+    cursor.executescript(f'''
+        CREATE VIRTUAL TABLE cards_fts USING fts5(
+            name, category, info,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS cards_fts_insert AFTER INSERT ON cards BEGIN
+            INSERT INTO cards_fts (rowid, name, category, info)
+            VALUES (new.id, new.name, new.category, {flat_new});
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS cards_fts_delete AFTER DELETE ON cards BEGIN
+            DELETE FROM cards_fts WHERE rowid = old.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS cards_fts_update AFTER UPDATE ON cards BEGIN
+            DELETE FROM cards_fts WHERE rowid = old.id;
+            INSERT INTO cards_fts (rowid, name, category, info)
+            VALUES (new.id, new.name, new.category, {flat_new});
+        END;
+    ''')
+
+    # Backfill rows saved before the index existed
+    cursor.execute(f'''
+        INSERT INTO cards_fts (rowid, name, category, info)
+        SELECT id, name, category, {_FLATTEN_INFO_SQL.format(col="additional_info")} FROM cards
+    ''')
+
+# Currency symbols/codes recognised in scraped and typed prices
+CURRENCY_CODES = {
+    "$": "USD", "₹": "INR", "€": "EUR", "£": "GBP",
+    "rs": "INR", "rs.": "INR", "inr": "INR", "usd": "USD", "eur": "EUR", "gbp": "GBP"
+}
+_PRICE_RE = re.compile(
+    r"(?i)(?P<cur>[$₹€£]|\b(?:rs|inr|usd|eur|gbp)\b\.?)?\s*(?P<amount>\d[\d,]*(?:\.\d+)?)\s*(?P<code>\b(?:inr|usd|eur|gbp)\b)?"
+)
+
+def parse_price(text):
+    """
+    Parses the first amount in a price string such as "₹ 1,299", "$45.00 USD"
+    or "Rs. 450". Returns (amount, currency code or None); (None, None) if
+    there is no number.
+    """
+    match = _PRICE_RE.search(str(text or ""))
+    if not match:
+        return None, None
+    amount = float(match.group("amount").replace(",", ""))
+    marker = (match.group("cur") or match.group("code") or "").lower()
+    return amount, CURRENCY_CODES.get(marker)
+
+def _split_products(text):
+    if isinstance(text, list):
+        return [str(p).strip() for p in text if str(p).strip()]
+    return [p.strip() for p in re.split(r"[,;\n]", str(text or "")) if p.strip()]
+
+def vendor_product_rows(additional_info):
+    """
+    Flattens additional_info into (name, price_amount, currency, source)
+    rows: priced entries from pricing_guide first, then product names from
+    products_sold (or the older products/items keys) without a price.
+    """
+    info = additional_info if isinstance(additional_info, dict) else {}
+    rows = []
+    seen = set()
+
+    guide = info.get("pricing_guide")
+    if isinstance(guide, list):
+        for entry in guide:
+            if not isinstance(entry, dict):
+                continue
+            name = str(entry.get("item") or "").strip()
+            if not name or name == "Generic Price" or name.lower() in seen:
+                continue
+            amount, currency = parse_price(entry.get("price"))
+            rows.append((name, amount, currency, "pricing_guide"))
+            seen.add(name.lower())
+
+    for key in ("products_sold", "products", "items"):
+        for name in _split_products(info.get(key)):
+            if name.lower() not in seen:
+                rows.append((name, None, None, key))
+                seen.add(name.lower())
+    return rows
+
+def sync_vendor_products(conn, card_id, additional_info):
+    """Replaces a card's vendor_products rows; runs inside the caller's transaction."""
+    conn.execute('DELETE FROM vendor_products WHERE card_id = ?', (card_id,))
+    conn.executemany(
+        'INSERT INTO vendor_products (card_id, name, price_amount, currency, source) VALUES (?, ?, ?, ?, ?)',
+        [(card_id, *row) for row in vendor_product_rows(additional_info)]
+    )
+
+def fold_key(value):
+    """Trimmed, Unicode case-folded value ("ÉCOLE " -> "école"), or None when blank."""
+    return value.strip().casefold() if isinstance(value, str) and value.strip() else None
+
+def migrate_upsert_keys(conn):
+    """
+    Adds name_key/website_key, the fold_key of name and website, indexed for
+    bulk-import upserts. Folded in Python because SQLite's lower() and
+    NOCASE only fold ASCII. Existing cards are filled in the first time.
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(cards)")}
+    if "name_key" not in columns:
+        conn.execute("ALTER TABLE cards ADD COLUMN name_key TEXT")
+        conn.execute("ALTER TABLE cards ADD COLUMN website_key TEXT")
+        conn.executemany(
+            "UPDATE cards SET name_key = ?, website_key = ? WHERE id = ?",
+            [(fold_key(name), fold_key(website), card_id)
+             for card_id, name, website in conn.execute("SELECT id, name, website FROM cards").fetchall()]
         )
+    # Replaced by the key columns
+    conn.execute("DROP INDEX IF EXISTS idx_cards_website")
+    conn.execute("DROP INDEX IF EXISTS idx_cards_name")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cards_website_key ON cards (website_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cards_name_key ON cards (name_key)")
+
+def migrate_vendor_products(conn):
+    """
+    Creates vendor_products, one row per product a vendor sells, so products
+    and prices can be queried with indexes instead of LIKE over the
+    additional_info JSON. Existing cards are parsed the first time it runs.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vendor_products'")
+    if cursor.fetchone():
+        return
+
+    cursor.executescript('''
+        CREATE TABLE vendor_products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            card_id INTEGER NOT NULL REFERENCES cards (id) ON DELETE CASCADE,
+            name TEXT NOT NULL COLLATE NOCASE,
+            price_amount REAL,
+            currency TEXT,
+            source TEXT NOT NULL
+        );
+        CREATE INDEX idx_vendor_products_card ON vendor_products (card_id);
+        CREATE INDEX idx_vendor_products_name ON vendor_products (name);
+        CREATE INDEX idx_vendor_products_price ON vendor_products (price_amount);
+        CREATE INDEX idx_vendor_products_currency_price ON vendor_products (currency, price_amount);
+
+        CREATE VIRTUAL TABLE vendor_products_fts USING fts5(
+            name,
+            content = 'vendor_products', content_rowid = 'id',
+            -- Stemmed, so "notebooks" finds "Leather Notebook"
+            tokenize = 'porter unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        );
+
+        CREATE TRIGGER vendor_products_fts_insert AFTER INSERT ON vendor_products BEGIN
+            INSERT INTO vendor_products_fts (rowid, name) VALUES (new.id, new.name);
+        END;
+
+        CREATE TRIGGER vendor_products_fts_delete AFTER DELETE ON vendor_products BEGIN
+            INSERT INTO vendor_products_fts (vendor_products_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        END;
+
+        -- foreign_keys is off on our connections, so cascade by hand
+        CREATE TRIGGER cards_vendor_products_delete AFTER DELETE ON cards BEGIN
+            DELETE FROM vendor_products WHERE card_id = old.id;
+        END;
     ''')
-    conn.commit()
-    conn.close()
 
+    # Backfill from the additional_info blobs saved so far
+    for card_id, info in cursor.execute('SELECT id, additional_info FROM cards').fetchall():
+        try:
+            additional_info = json.loads(info) if info else {}
+        except ValueError:
+            continue
+        sync_vendor_products(conn, card_id, additional_info)
+
+def vector_index():
+    """The card embedding index stored next to the current DB_NAME."""
+    # Imported here: services modules import db themselves
+    from services.vector_index import get_index
+    return get_index(DB_NAME)
+
+def card_text(name, category, additional_info):
+    """What a card is embedded from: name, category, products and tagline."""
+    info = additional_info if isinstance(additional_info, dict) else {}
+    products = [row[0] for row in vendor_product_rows(info)]
+    return " ".join(str(part) for part in [name, category, *products, info.get("tagline")] if part)
+
+def _index_card(card_id, card_data):
+    # The card is already committed; a failed index write is logged, not raised
+    try:
+        vector_index().upsert(int(card_id), card_text(
+            card_data.get('name'), card_data.get('category'), card_data.get('additional_info', {})
+        ))
+    except Exception as e:
+        print(f"Vector index error: {e}")
+
+@traced("db.rebuild_vector_index")
+def rebuild_vector_index(batch_size=CARDS_PAGE_MAX):
+    """Re-embeds every card from scratch, e.g. for an existing DB or after bulk inserts."""
+    index = vector_index()
+    index.clear()
+    for page in _batched(iter_cards(fields=["name", "category", "additional_info"]), batch_size):
+        index.upsert_many(
+            (card["id"], card_text(card["name"], card["category"], card["additional_info"])) for card in page
+        )
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+@traced("db.save_card")
 def save_card(card_data):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO cards (name, contact, category, website, additional_info, image_path)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (
-        card_data.get('name'),
-        card_data.get('contact'),
-        card_data.get('category'),
-        card_data.get('website'),
-        json.dumps(card_data.get('additional_info', {})),
-        card_data.get('image_path')
-    ))
-    card_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO cards (name, contact, category, website, additional_info, image_path, name_key, website_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', _card_params(card_data))
+        sync_vendor_products(conn, cursor.lastrowid, card_data.get('additional_info', {}))
+        card_id = cursor.lastrowid
+    _index_card(card_id, card_data)
     return card_id
 
+@traced("db.update_card")
 def update_card(card_id, card_data):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE cards 
-        SET name = ?, contact = ?, category = ?, website = ?, additional_info = ?, image_path = ?
-        WHERE id = ?
-    ''', (
+    with get_connection() as conn:
+        conn.execute('''
+            UPDATE cards 
+            SET name = ?, contact = ?, category = ?, website = ?, additional_info = ?, image_path = ?,
+                name_key = ?, website_key = ?
+            WHERE id = ?
+        ''', (*_card_params(card_data), card_id))
+        sync_vendor_products(conn, card_id, card_data.get('additional_info', {}))
+    _index_card(card_id, card_data)
+    return card_id
+
+@traced("db.delete_card")
+def delete_card(card_id):
+    with get_connection() as conn:
+        conn.execute('DELETE FROM cards WHERE id = ?', (card_id,))
+    try:
+        vector_index().delete(int(card_id))
+    except Exception as e:
+        print(f"Vector index error: {e}")
+    return True
+
+def image_in_use(image_path):
+    """True if a saved card shows this image."""
+    with get_connection() as conn:
+        return conn.execute('SELECT 1 FROM cards WHERE image_path = ? LIMIT 1', (image_path,)).fetchone() is not None
+
+def _card_params(card_data):
+    return (
         card_data.get('name'),
         card_data.get('contact'),
         card_data.get('category'),
         card_data.get('website'),
         json.dumps(card_data.get('additional_info', {})),
         card_data.get('image_path'),
-        card_id
-    ))
-    conn.commit()
-    conn.close()
-    return card_id
+        fold_key(card_data.get('name')),
+        fold_key(card_data.get('website'))
+    )
 
-def delete_card(card_id):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM cards WHERE id = ?', (card_id,))
-    conn.commit()
-    conn.close()
-    return True
+def _upsert_key(card_data, upsert_on):
+    return fold_key(card_data.get(upsert_on)) if upsert_on else None
 
-def get_all_cards():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM cards ORDER BY created_at DESC')
-    rows = cursor.fetchall()
-    cards = []
-    for row in rows:
-        cards.append({
-            "id": row[0],
-            "name": row[1],
-            "contact": row[2],
-            "category": row[3],
-            "website": row[4],
-            "additional_info": json.loads(row[5]) if row[5] else {},
-            "image_path": row[6],
-            "created_at": row[7]
-        })
-    conn.close()
-    return cards
-
-def search_cards(query):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # Split query into keywords for flexible matching (case-insensitive)
-    keywords = query.lower().split()
-    
-    if not keywords:
+def _existing_ids(conn, column, keys):
+    """Folded key -> newest card id holding it, for the keys that already exist."""
+    found = {}
+    keys = list(keys)
+    for start in range(0, len(keys), CARDS_PAGE_MAX):
+        batch = keys[start:start + CARDS_PAGE_MAX]
+        rows = conn.execute(
+            f"SELECT id, {column}_key FROM cards WHERE {column}_key IN ({', '.join('?' * len(batch))}) ORDER BY id",
+            batch
+        ).fetchall()
+        found.update((key, card_id) for card_id, key in rows)
+    return found
+
+@traced("db.import_cards")
+def import_cards(cards, upsert_on=None):
+    """
+    Writes one chunk of card dicts (the save_card shape) in a single
+    transaction with executemany. With upsert_on="website" or "name", a card
+    whose value matches an existing card (after fold_key) updates it
+    instead, and repeats within the chunk collapse to the last one.
+    Returns {"inserted": n, "updated": n}.
+    """
+    if upsert_on is not None and upsert_on not in UPSERT_KEYS:
+        raise ValueError(f"upsert_on must be one of: {', '.join(UPSERT_KEYS)}")
+
+    if upsert_on:
+        latest = {}
+        for i, card in enumerate(cards):
+            latest[_upsert_key(card, upsert_on) or ("row", i)] = card
+        cards = list(latest.values())
+
+    with get_connection() as conn:
+        keys = {_upsert_key(card, upsert_on) for card in cards} - {None}
+        existing = _existing_ids(conn, upsert_on, keys) if upsert_on else {}
+        updates = []
+        inserts = []
+        for card in cards:
+            card_id = existing.get(_upsert_key(card, upsert_on))
+            if card_id is None:
+                inserts.append(card)
+            else:
+                updates.append((card_id, card))
+
+        conn.executemany('''
+            UPDATE cards
+            SET name = ?, contact = ?, category = ?, website = ?, additional_info = ?, image_path = ?,
+                name_key = ?, website_key = ?
+            WHERE id = ?
+        ''', [(*_card_params(card), card_id) for card_id, card in updates])
+        conn.executemany('''
+            INSERT INTO cards (name, contact, category, website, additional_info, image_path, name_key, website_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [_card_params(card) for card in inserts])
+
+        # The transaction holds the write lock, so AUTOINCREMENT handed this
+        # chunk a contiguous run of ids ending at the sequence value
+        last_id = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'cards'").fetchone()
+        first_id = (last_id[0] if last_id else 0) - len(inserts) + 1
+        written = updates + [(first_id + i, card) for i, card in enumerate(inserts)]
+
+        updated_ids = [card_id for card_id, _ in updates]
+        for start in range(0, len(updated_ids), CARDS_PAGE_MAX):
+            batch = updated_ids[start:start + CARDS_PAGE_MAX]
+            conn.execute(f"DELETE FROM vendor_products WHERE card_id IN ({', '.join('?' * len(batch))})", batch)
+        conn.executemany(
+            'INSERT INTO vendor_products (card_id, name, price_amount, currency, source) VALUES (?, ?, ?, ?, ?)',
+            [(card_id, *row) for card_id, card in written for row in vendor_product_rows(card.get('additional_info', {}))]
+        )
+
+    try:
+        vector_index().upsert_many(
+            (card_id, card_text(card.get('name'), card.get('category'), card.get('additional_info', {})))
+            for card_id, card in written
+        )
+    except Exception as e:
+        print(f"Vector index error: {e}")
+    return {"inserted": len(inserts), "updated": len(updates)}
+
+def stream_cards(fields=None, batch_size=CARDS_PAGE_MAX):
+    """
+    Yields every card, oldest first, from a single cursor on its own
+    connection: one consistent snapshot, fetched batch_size rows at a time.
+    Not pooled, because a streaming response may resume the generator on a
+    different thread each time and pooled connections are pinned per thread.
+    """
+    columns = _resolve_fields(fields)
+
+    def generate():
+        conn = sqlite3.connect(DB_NAME, timeout=DB_POOL_TIMEOUT, check_same_thread=False)
+        try:
+            cursor = conn.execute(f"SELECT {', '.join(columns)} FROM cards ORDER BY id")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield _row_to_dict(row, columns)
+        finally:
+            conn.close()
+
+    return generate()
+
+def encode_cursor(card):
+    raw = json.dumps([card["created_at"], card["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, card_id = json.loads(base64.urlsafe_b64decode(padded))
+        return created_at, int(card_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _resolve_fields(fields):
+    """Validates a field projection. id and created_at are always kept for the cursor."""
+    if not fields:
+        return CARD_COLUMNS
+    unknown = [f for f in fields if f not in CARD_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return tuple(c for c in CARD_COLUMNS if c in fields or c in ("id", "created_at"))
+
+@traced("db.get_cards_page")
+def get_cards_page(limit=CARDS_PAGE_LIMIT, cursor=None, fields=None, category=None):
+    """
+    Returns one page of cards, newest first, using keyset pagination on
+    (created_at, id). Pass the returned next_cursor to fetch the next page.
+    """
+    columns = _resolve_fields(fields)
+    limit = max(1, min(limit, CARDS_PAGE_MAX))
+
+    conditions = []
+    params = []
+    if category:
+        conditions.append("category = ? COLLATE NOCASE")
+        params.append(category)
+    if cursor:
+        conditions.append("(created_at, id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # Fetch one extra row to know whether another page exists
+    sql = f"SELECT {', '.join(columns)} FROM cards {where} ORDER BY created_at DESC, id DESC LIMIT ?"
+    with get_connection() as conn:
+        rows = conn.execute(sql, params + [limit + 1]).fetchall()
+
+    items = [_row_to_dict(row, columns) for row in rows[:limit]]
+    next_cursor = encode_cursor(items[-1]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+def iter_cards(fields=None, category=None, batch_size=CARDS_PAGE_MAX):
+    """
+    Yields every card page by page, so callers can stream the full catalog
+    without holding it in memory or pinning a connection between pages.
+    """
+    _resolve_fields(fields)
+
+    def generate():
+        cursor = None
+        while True:
+            page = get_cards_page(batch_size, cursor, fields, category)
+            yield from page["items"]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+    return generate()
+
+def _row_to_dict(row, columns):
+    card = dict(zip(columns, row))
+    if "additional_info" in card:
+        card["additional_info"] = json.loads(card["additional_info"]) if card["additional_info"] else {}
+    return card
+
+def _row_to_card(row):
+    return {
+        "id": row[0],
+        "name": row[1],
+        "contact": row[2],
+        "category": row[3],
+        "website": row[4],
+        "additional_info": json.loads(row[5]) if row[5] else {},
+        "image_path": row[6],
+        "created_at": row[7]
+    }
+
+def _search_keywords(query):
+    # Plain word tokens only, so user input can never break the MATCH syntax
+    return re.findall(r"\w+", query.lower())
+
+def _card_filter_sql(min_price=None, max_price=None, currency=None, categories=None, has_website=None):
+    """
+    SQL predicates (on cards) and params for the structured search filters.
+    Prices are matched against vendor_products, whose amounts are parsed
+    when a card is saved, so nothing is parsed at query time.
+    """
+    conditions = []
+    params = []
+    if categories:
+        conditions.append(f"cards.category COLLATE NOCASE IN ({', '.join('?' * len(categories))})")
+        params.extend(categories)
+    if has_website is not None:
+        conditions.append("COALESCE(cards.website, '') != ''" if has_website else "COALESCE(cards.website, '') = ''")
+    if min_price is not None or max_price is not None or currency:
+        price_conditions = []
+        if currency:
+            price_conditions.append("currency = ?")
+            params.append(currency.upper())
+        if min_price is not None:
+            price_conditions.append("price_amount >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            price_conditions.append("price_amount <= ?")
+            params.append(max_price)
+        conditions.append(f"cards.id IN (SELECT card_id FROM vendor_products WHERE {' AND '.join(price_conditions)})")
+    return conditions, params
+
+@traced("db.search_cards")
+def search_cards(query, limit=SEARCH_LIMIT, min_price=None, max_price=None, currency=None, categories=None, has_website=None):
+    """
+    Full-text search over name, category and the flattened additional_info.
+    Matches ANY keyword (prefix match) and returns the best BM25 hits first.
+
+    The optional filters narrow the hits in SQL: a price range (any product
+    of the vendor within it, optionally in one currency), categories, and
+    whether the vendor has a website. With filters but no keywords, the
+    newest matching cards are returned.
+    """
+    keywords = _search_keywords(query)
+    conditions, params = _card_filter_sql(min_price, max_price, currency, categories, has_website)
+    if not keywords and not conditions:
+        return []
+
+    if keywords:
+        match = " OR ".join(f'"{word}"*' for word in keywords)
+        conditions.insert(0, "cards_fts MATCH ?")
+        params.insert(0, match)
+        # Column weights: a hit in the name beats category, which beats info
+        sql = f'''
+            SELECT cards.* FROM cards_fts
+            JOIN cards ON cards.id = cards_fts.rowid
+            WHERE {' AND '.join(conditions)}
+            ORDER BY bm25(cards_fts, 10.0, 5.0, 1.0)
+            LIMIT ?
+        '''
+    else:
+        sql = f'''
+            SELECT cards.* FROM cards
+            WHERE {' AND '.join(conditions)}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        '''
+
+    with get_connection() as conn:
+        rows = conn.execute(sql, params + [limit]).fetchall()
+    return [_row_to_card(row) for row in rows]
+
+# Reciprocal rank fusion constant: higher flattens the gap between top ranks
+RRF_K = 60
+
+@traced("db.semantic_search_cards")
+def semantic_search_cards(query, limit=SEARCH_LIMIT, hybrid=True, min_price=None, max_price=None,
+                          currency=None, categories=None, has_website=None):
+    """
+    Cards ranked by embedding similarity to the query, so "desk plants"
+    finds a vendor listing "Succulent Planters" even with no shared word.
+    With hybrid=True the vector ranking is fused with the FTS ranking of
+    search_cards (reciprocal rank fusion). Takes the same filters as
+    search_cards.
+    """
+    filters = dict(min_price=min_price, max_price=max_price, currency=currency,
+                   categories=categories, has_website=has_website)
+    candidates = limit * 4
+    rankings = [[card_id for card_id, _ in vector_index().search(query, candidates)]]
+    if hybrid:
+        rankings.append([card["id"] for card in search_cards(query, candidates, **filters)])
+
+    # Drop vector hits that were deleted or fail the filters
+    conditions, params = _card_filter_sql(**filters)
+    if rankings[0]:
+        conditions.insert(0, f"id IN ({', '.join('?' * len(rankings[0]))})")
+        with get_connection() as conn:
+            allowed = {row[0] for row in conn.execute(
+                f"SELECT id FROM cards WHERE {' AND '.join(conditions)}", rankings[0] + params
+            )}
+        rankings[0] = [card_id for card_id in rankings[0] if card_id in allowed]
+
+    scores = {}
+    for ranking in rankings:
+        for rank, card_id in enumerate(ranking):
+            scores[card_id] = scores.get(card_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    ids = sorted(scores, key=lambda card_id: -scores[card_id])[:limit]
+    if not ids:
         return []
 
-    # Dynamic SQL builder: match ANY keyword in ANY field (broad search)
+    with get_connection() as conn:
+        rows = conn.execute(f"SELECT * FROM cards WHERE id IN ({', '.join('?' * len(ids))})", ids).fetchall()
+    by_id = {row[0]: row for row in rows}
+    return [_row_to_card(by_id[card_id]) for card_id in ids if card_id in by_id]
+
+@traced("db.search_products")
+def search_products(query=None, min_price=None, max_price=None, currency=None, limit=SEARCH_LIMIT):
+    """
+    Products across all vendors, each with its vendor's id and name.
+    query matches product-name words (prefix match); the price bounds and
+    currency use the vendor_products indexes. Priced matches come first,
+    cheapest first.
+    """
     conditions = []
     params = []
-    
-    for word in keywords:
-        # Check if the word appears in name, category, or info
-        conditions.append('(lower(name) LIKE ? OR lower(category) LIKE ? OR lower(additional_info) LIKE ?)')
-        params.extend([f'%{word}%', f'%{word}%', f'%{word}%'])
-    
-    query_sql = f"SELECT * FROM cards WHERE {' OR '.join(conditions)}"
-    
-    cursor.execute(query_sql, params)
-    rows = cursor.fetchall()
-    
-    # Deduplicate results by ID
-    seen_ids = set()
-    cards = []
-    
-    for row in rows:
-        card_id = row[0]
-        if card_id in seen_ids:
-            continue
-        seen_ids.add(card_id)
-            
-        cards.append({
-            "id": row[0],
-            "name": row[1],
-            "contact": row[2],
-            "category": row[3],
-            "website": row[4],
-            "additional_info": json.loads(row[5]) if row[5] else {},
-            "image_path": row[6],
-            "created_at": row[7]
-        })
-    conn.close()
-    return cards
+    join = ""
+    keywords = _search_keywords(query or "")
+    if keywords:
+        join = "JOIN vendor_products_fts ON vendor_products_fts.rowid = p.id"
+        conditions.append("vendor_products_fts MATCH ?")
+        params.append(" OR ".join(f'"{word}"*' for word in keywords))
+    if min_price is not None:
+        conditions.append("p.price_amount >= ?")
+        params.append(min_price)
+    if max_price is not None:
+        conditions.append("p.price_amount <= ?")
+        params.append(max_price)
+    if currency:
+        conditions.append("p.currency = ?")
+        params.append(currency.upper())
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = f'''
+        SELECT p.id, p.card_id, c.name, p.name, p.price_amount, p.currency, p.source
+        FROM vendor_products p {join}
+        JOIN cards c ON c.id = p.card_id
+        {where}
+        ORDER BY p.price_amount IS NULL, p.price_amount, p.id
+        LIMIT ?
+    '''
+    with get_connection() as conn:
+        rows = conn.execute(sql, params + [limit]).fetchall()
+    return [
+        {"id": r[0], "card_id": r[1], "vendor_name": r[2], "name": r[3], "price_amount": r[4], "currency": r[5], "source": r[6]}
+        for r in rows
+    ]
 
 # Initialize on import (safe for simple apps)
 try:
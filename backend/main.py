@@ -1,22 +1,40 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Query, Request
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import shutil
 import os
+import asyncio
+import time
 import uuid
 import json
-from typing import List, Optional
-from PIL import Image
+from typing import List, Literal, Optional
 import datetime
+from contextlib import asynccontextmanager
 
-from db import init_db, save_card, get_all_cards, search_cards, update_card, delete_card
-from services import gemini_service, status_service
+from db import save_card, get_cards_page, CARDS_PAGE_LIMIT, iter_cards, stream_cards, search_cards, semantic_search_cards, search_products, update_card, delete_card, image_in_use
+from services import gemini_service, status_service, image_service, executors
 from services.gemini_service import extract_card_data
-from services.scraper_service import scrape_vendor_website
+from services import scraper_service, bulk_io, thumbnail_service
+from services.scraper_service import scrape_vendor_website, peek_scrape, SCRAPE_DEADLINE
 from services.status_service import update_status
+from services.search_cache import get_web_search_cache, normalize_query
+from services.job_queue import JobQueue
+from services.extraction_cache import get_cached_extraction, store_extraction
+from services.tracing import TracingMiddleware, detached, record, render_prometheus, span, traced
+from services.rate_limiter import PRIORITY_UPLOAD, PRIORITY_BACKGROUND
 
-app = FastAPI(title="Gifting Platform Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    await gemini_service.close_client()
+    await scraper_service.close_client()
+    executors.shutdown()
+
+app = FastAPI(title="Gifting Platform Backend", lifespan=lifespan)
 
 # Add Status Streaming Router
 app.include_router(status_service.router)
@@ -33,15 +51,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Spans per stage -> /metrics, plus a Server-Timing header on every response
+app.add_middleware(TracingMiddleware)
+
 # Static files for images
 os.makedirs("uploads", exist_ok=True)
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 # Models (Pydantic)
 class SearchRequest(BaseModel):
-    query: str
+    query: str = ""
+    # keyword: FTS only; semantic: embeddings only; hybrid: both, fused
+    mode: Literal["keyword", "semantic", "hybrid"] = "hybrid"
+    # Optional filters, applied to internal results only
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    currency: Optional[str] = None
+    categories: List[str] = []
+    has_website: Optional[bool] = None
 
 class SearchResult(BaseModel):
     source: str
@@ -52,111 +82,213 @@ class SearchResult(BaseModel):
     image_url: str = ""
     products: List[dict] = []
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+async def save_upload(upload: UploadFile, path: str):
+    """Copies an upload to disk in chunks, with every blocking write on the I/O pool."""
+    buffer = await executors.run_io(open, path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            await executors.run_io(buffer.write, chunk)
+    finally:
+        await executors.run_io(buffer.close)
+
+def remove_files(*paths):
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+# Names extract_card_data uses for failed extractions; never cached, and retried as jobs
+EXTRACTION_FAILURES = ("AI Error", "File Error", "Error: Missing API Key")
+
+@traced("analyze.merge")
+async def stage_card_images(front_path, back_path, file_extension, request_id):
+    """
+    Hashes, dedupes and preprocesses saved upload(s) into one stored card image.
+    Temp files are removed. Returns (image_hash, file_path, upload_stats).
+    """
+    # Same card (front + back) -> same hash -> same file and cached analysis
+    image_hash = await executors.run_cpu(image_service.image_fingerprint, front_path, back_path)
+    file_path = f"uploads/{image_hash[:32]}.{image_service.OUTPUT_EXT}"
+
+    upload_stats = {}
+    if await executors.run_io(os.path.exists, file_path):
+        # Already stored from an earlier upload; drop the duplicates
+        await executors.run_io(remove_files, front_path, back_path)
+        return image_hash, file_path, upload_stats
+
+    if back_path:
+        await update_status(request_id, "Merging front and back sides...")
+    else:
+        await update_status(request_id, "Optimizing image...")
+    prep_start = time.perf_counter()
+    try:
+        # Orient, downscale and re-encode each side, then merge the small copies
+        upload_stats = await executors.run_cpu(image_service.prepare_card_image, front_path, back_path, file_path)
+        upload_stats["preprocess_ms"] = round((time.perf_counter() - prep_start) * 1000, 1)
+        await executors.run_io(remove_files, front_path)
+    except Exception as merge_err:
+        print(f"Image Merge Error: {merge_err}")
+        await update_status(request_id, f"Merge warning: {merge_err}")
+        # Keep the original front upload as-is
+        await executors.run_io(remove_files, file_path)
+        file_path = f"uploads/{image_hash[:32]}.{file_extension}"
+        await executors.run_io(os.replace, front_path, file_path)
+    finally:
+        # Cleanup temp
+        await executors.run_io(remove_files, back_path)
+    return image_hash, file_path, upload_stats
+
+def merge_scraped_data(extracted_data, scraped_data):
+    """Folds a scrape_vendor_website result into an analysis (products, pricing guide, scrape_status)."""
+    # Capture Scrape Status/Errors
+    scrape_status = "success"
+    if not scraped_data.get("products") and not scraped_data.get("pricing_info"):
+        if "error" in scraped_data: # If our scraper returns specific error keys
+            scrape_status = scraped_data["error"]
+        else:
+            scrape_status = "no_data_found"
+    
+    # Merge Scraped Products
+    if scraped_data.get("products"):
+        existing_products = extracted_data.get("products", "")
+        new_products = ", ".join(scraped_data["products"])
+        if existing_products:
+            extracted_data["products"] = f"{existing_products}, {new_products}"
+        else:
+            extracted_data["products"] = new_products
+            
+    # Add Pricing Info to Additional Info
+    if "additional_info" not in extracted_data: extracted_data["additional_info"] = {}
+    
+    if scraped_data.get("pricing_guide"):
+        extracted_data["additional_info"]["pricing_guide"] = scraped_data["pricing_guide"]
+    elif "Failed" in str(scraped_data.get("pricing_guide", "")):
+        extracted_data["additional_info"]["pricing_guide"] = scraped_data.get("pricing_guide")
+    
+    # Pass status to frontend
+    extracted_data["scrape_status"] = scrape_status
+    return extracted_data
+
+# Strong references to fire-and-forget tasks so they are not garbage collected
+background_tasks = set()
+
+def pregenerate_thumbnails_later(image_path):
+    """Renders a saved card's dashboard thumbnails in the background."""
+    if not image_path:
+        return
+    task = asyncio.create_task(detached(thumbnail_service.pregenerate(image_path)))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+async def finish_scrape_later(scrape, image_hash, extracted_data):
+    """Completes a scrape that missed SCRAPE_DEADLINE and updates the cached analysis."""
+    try:
+        merged = merge_scraped_data(extracted_data, await scrape)
+        if merged.get("name") not in EXTRACTION_FAILURES:
+            await executors.run_io(store_extraction, image_hash, gemini_service.EXTRACT_PROMPT_VERSION, merged)
+    except Exception as e:
+        print(f"Late scrape error: {e}")
+
+async def analyze_card_image(image_hash, file_path, request_id, scrape_deadline=SCRAPE_DEADLINE, priority=PRIORITY_UPLOAD):
+    """
+    Returns the cached analysis for this image, or runs Gemini extraction plus
+    the website scrape. A scrape still running after scrape_deadline seconds
+    (None waits for it) is finished in the background and reported as
+    scrape_status "pending"; poll /vendor-website for its result. priority
+    is the extraction's place in the Gemini quota queue.
+    """
+    cached = await cached_analysis(image_hash, file_path, request_id)
+    if cached:
+        return cached
+
+    # Extract data with Gemini
+    await update_status(request_id, "AI Analysis: Reading text from card...")
+    with span("analyze.gemini"):
+        extracted_data = await extract_card_data(file_path, priority)
+    return await complete_analysis(image_hash, file_path, request_id, extracted_data, scrape_deadline)
+
+async def cached_analysis(image_hash, file_path, request_id):
+    """The stored analysis of this image as an analyze_card_image result, or None."""
+    with span("analyze.cache_lookup"):
+        cached = await executors.run_io(get_cached_extraction, image_hash, gemini_service.EXTRACT_PROMPT_VERSION)
+    if cached:
+        await update_status(request_id, "Found a previous analysis of this card.")
+        return {**cached, "image_path": file_path, "cache_hit": True}
+    return None
+
+async def complete_analysis(image_hash, file_path, request_id, extracted_data, scrape_deadline=SCRAPE_DEADLINE):
+    """The rest of analyze_card_image once Gemini has extracted the card: scrape, cache, image path."""
+    # 3. New Feature: Scrape Website if available
+    website = extracted_data.get("website")
+    late_scrape = None
+    if website:
+         print(f"Scraping website found on card: {website}")
+         await update_status(request_id, f"Found website: {website}. Scraping product details...")
+         scrape = asyncio.ensure_future(scrape_vendor_website(website))
+         try:
+             with span("analyze.scrape"):
+                 scraped = await asyncio.wait_for(asyncio.shield(scrape), scrape_deadline)
+             merge_scraped_data(extracted_data, scraped)
+         except asyncio.TimeoutError:
+             await update_status(request_id, "Website is slow to respond. Pricing details will follow.")
+             late_scrape = finish_scrape_later(scrape, image_hash, json.loads(json.dumps(extracted_data)))
+             extracted_data["scrape_status"] = "pending"
+    else:
+         await update_status(request_id, "No website found on card. Skipping web scrape.")
+         extracted_data["scrape_status"] = "no_website"
+
+    try:
+        # Cache the analysis for re-uploads of the same card (never failures)
+        if extracted_data.get("name") not in EXTRACTION_FAILURES:
+            with span("analyze.store"):
+                await executors.run_io(store_extraction, image_hash, gemini_service.EXTRACT_PROMPT_VERSION, extracted_data)
+    finally:
+        # Started only now, so the finished analysis is written after the pending one
+        if late_scrape is not None:
+            task = asyncio.create_task(detached(late_scrape))
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+
+    # Add image path to response
+    extracted_data["image_path"] = file_path
+    extracted_data["cache_hit"] = False
+    return extracted_data
+
 @app.post("/analyze-card")
 async def analyze_card(
     front: UploadFile = File(...),
     back: Optional[UploadFile] = File(None),
     request_id: Optional[str] = Form(None)
 ):
+    request_start = time.perf_counter()
     await update_status(request_id, "Starting upload...")
     if not front:
         raise HTTPException(status_code=400, detail="No front file uploaded")
     
     try:
-        # Save Front File with a unique name
+        # Save uploads under temporary names until we know their content hash
         await update_status(request_id, "Saving image files...")
         file_extension = front.filename.split(".")[-1]
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
-        file_path = f"uploads/{unique_filename}"
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(front.file, buffer)
-            
-        # If Back File exists, merge them
-        if back:
-            try:
-                await update_status(request_id, "Merging front and back sides...")
-                # Save Back temp
+        temp_id = uuid.uuid4()
+        front_path = f"uploads/temp_front_{temp_id}.{file_extension}"
+        back_path = None
+        with span("analyze.upload"):
+            await save_upload(front, front_path)
+            if back:
                 back_ext = back.filename.split(".")[-1]
-                back_path = f"uploads/temp_back_{unique_filename}"
-                with open(back_path, "wb") as buffer:
-                    shutil.copyfileobj(back.file, buffer)
-                
-                # Open images
-                img1 = Image.open(file_path)
-                img2 = Image.open(back_path)
-                
-                # Convert to RGB to avoid mode mismatches (e.g. RGBA vs RGB)
-                if img1.mode != 'RGB': img1 = img1.convert('RGB')
-                if img2.mode != 'RGB': img2 = img2.convert('RGB')
-                
-                w1, h1 = img1.size
-                w2, h2 = img2.size
-                
-                max_width = max(w1, w2)
-                total_height = h1 + h2 + 20 # 20px padding
-                
-                new_im = Image.new('RGB', (max_width, total_height), (255, 255, 255))
-                
-                new_im.paste(img1, (0,0))
-                new_im.paste(img2, (0, h1 + 20))
-                
-                # Save combined image overwriting the original front file path
-                new_im.save(file_path)
-                
-                # Cleanup temp
-                if os.path.exists(back_path):
-                    os.remove(back_path)
-                    
-            except Exception as merge_err:
-                print(f"Image Merge Error: {merge_err}")
-                await update_status(request_id, f"Merge warning: {merge_err}")
-                if os.path.exists(back_path): os.remove(back_path)
-            
-        # Extract data with Gemini
-        await update_status(request_id, "AI Analysis: Reading text from card...")
-        extracted_data = extract_card_data(file_path)
-        
-        # 3. New Feature: Scrape Website if available
-        website = extracted_data.get("website")
-        if website:
-             print(f"Scraping website found on card: {website}")
-             await update_status(request_id, f"Found website: {website}. Scraping product details...")
-             scraped_data = scrape_vendor_website(website)
-             
-             # Capture Scrape Status/Errors
-             scrape_status = "success"
-             if not scraped_data.get("products") and not scraped_data.get("pricing_info"):
-                 if "error" in scraped_data: # If our scraper returns specific error keys
-                     scrape_status = scraped_data["error"]
-                 else:
-                     scrape_status = "no_data_found"
-             
-             # Merge Scraped Products
-             if scraped_data.get("products"):
-                 existing_products = extracted_data.get("products", "")
-                 new_products = ", ".join(scraped_data["products"])
-                 if existing_products:
-                     extracted_data["products"] = f"{existing_products}, {new_products}"
-                 else:
-                     extracted_data["products"] = new_products
-                     
-             # Add Pricing Info to Additional Info
-             if "additional_info" not in extracted_data: extracted_data["additional_info"] = {}
-             
-             if scraped_data.get("pricing_guide"):
-                 extracted_data["additional_info"]["pricing_guide"] = scraped_data["pricing_guide"]
-             elif "Failed" in str(scraped_data.get("pricing_guide", "")):
-                 extracted_data["additional_info"]["pricing_guide"] = scraped_data.get("pricing_guide")
-             
-             # Pass status to frontend
-             extracted_data["scrape_status"] = scrape_status
-        else:
-             await update_status(request_id, "No website found on card. Skipping web scrape.")
-             extracted_data["scrape_status"] = "no_website"
+                back_path = f"uploads/temp_back_{temp_id}.{back_ext}"
+                await save_upload(back, back_path)
+
+        image_hash, file_path, upload_stats = await stage_card_images(front_path, back_path, file_extension, request_id)
+        extracted_data = await analyze_card_image(image_hash, file_path, request_id)
 
-        # Add image path to response
-        extracted_data["image_path"] = file_path
+        upload_stats["total_ms"] = round((time.perf_counter() - request_start) * 1000, 1)
+        extracted_data["upload_stats"] = upload_stats
+        print(f"Analyze card: {upload_stats}")
         
         await update_status(request_id, "Complete")
         return extracted_data
@@ -164,18 +296,157 @@ async def analyze_card(
         await update_status(request_id, f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def stage_job_images(job):
+    """Stages an analyze_card job's image once; retries pick up from the stored file."""
+    payload = job["payload"]
+    if "image_hash" not in payload:
+        image_hash, file_path, _ = await stage_card_images(
+            payload["front_path"], payload.get("back_path"), payload["file_extension"], job["id"]
+        )
+        payload.update(image_hash=image_hash, file_path=file_path)
+        await executors.run_io(job_queue.update_payload, job["id"], payload)
+    return payload
+
+async def run_analyze_card_job(job):
+    """Job handler for /analyze-cards/batch uploads. Progress is published under the job id."""
+    payload = await stage_job_images(job)
+
+    # Nobody is waiting on a job, so let the scrape run to completion and
+    # leave Gemini quota to interactive requests first
+    extracted_data = await analyze_card_image(
+        payload["image_hash"], payload["file_path"], job["id"], scrape_deadline=None, priority=PRIORITY_BACKGROUND
+    )
+    return await finish_analyze_card_job(job, extracted_data)
+
+async def run_analyze_card_jobs(jobs):
+    """
+    Batch handler for analyze_card jobs: the cards without a cached analysis
+    go to Gemini together through extract_cards_batch (which re-runs any card
+    the batch reply missed on its own), then each card is scraped and saved
+    as in run_analyze_card_job. Returns one result or exception per job.
+    """
+    async def prepare(job):
+        payload = await stage_job_images(job)
+        return payload, await cached_analysis(payload["image_hash"], payload["file_path"], job["id"])
+
+    prepared = await asyncio.gather(*(prepare(job) for job in jobs), return_exceptions=True)
+    misses = [i for i, p in enumerate(prepared) if not isinstance(p, BaseException) and p[1] is None]
+    extracted = {}
+    if misses:
+        for i in misses:
+            await update_status(jobs[i]["id"], f"AI Analysis: Reading text from card (batch of {len(misses)})...")
+        with span("analyze.gemini_batch"):
+            results = await gemini_service.extract_cards_batch(
+                [prepared[i][0]["file_path"] for i in misses], priority=PRIORITY_BACKGROUND
+            )
+        extracted = dict(zip(misses, results))
+
+    async def finish(i):
+        if isinstance(prepared[i], BaseException):
+            raise prepared[i]
+        payload, cached = prepared[i]
+        extracted_data = cached or await complete_analysis(
+            payload["image_hash"], payload["file_path"], jobs[i]["id"], extracted[i], scrape_deadline=None
+        )
+        return await finish_analyze_card_job(jobs[i], extracted_data)
+
+    return await asyncio.gather(*(finish(i) for i in range(len(jobs))), return_exceptions=True)
+
+async def finish_analyze_card_job(job, extracted_data):
+    """Fails the job on an extraction error (so it is retried), else auto-saves if asked."""
+    payload = job["payload"]
+    if extracted_data.get("name") in EXTRACTION_FAILURES:
+        # Usually every model was rate limited; let the queue back off and retry
+        raise RuntimeError(extracted_data.get("contact") or extracted_data["name"])
+
+    if payload.get("auto_save"):
+        card_data = prepare_vendor_record({**extracted_data})
+        extracted_data["saved_card_id"] = await executors.run_io(save_card, card_data)
+        pregenerate_thumbnails_later(card_data.get("image_path"))
+    return extracted_data
+
+async def remove_failed_job_files(job):
+    """Deletes a failed job's upload, and its stored image unless a saved card uses it."""
+    payload = job["payload"]
+    paths = [payload.get("front_path"), payload.get("back_path")]
+    file_path = payload.get("file_path")
+    if file_path and not await executors.run_io(image_in_use, file_path):
+        paths.append(file_path)
+    await executors.run_io(remove_files, *paths)
+
+job_queue = JobQueue()
+# Ready jobs are claimed together and extracted GEMINI_EXTRACT_BATCH_SIZE cards per request
+job_queue.register(
+    "analyze_card", run_analyze_card_job, run_analyze_card_jobs, gemini_service.EXTRACT_BATCH_SIZE,
+    on_failed=remove_failed_job_files
+)
+
+@app.get("/vendor-website")
+def get_vendor_website(url: str):
+    """
+    Scraped details for a card whose analysis returned scrape_status
+    "pending", shaped like the analysis fields they fill in.
+    """
+    status, scraped_data = peek_scrape(url)
+    if status != "done":
+        return {"status": status}
+    return {"status": status, **merge_scraped_data({}, scraped_data)}
+
+@app.post("/analyze-cards/batch")
+async def analyze_cards_batch(
+    files: List[UploadFile] = File(...),
+    auto_save: bool = Form(False)
+):
+    """
+    Queues one background analysis job per uploaded card front and returns
+    the job ids at once. Follow a job on /status-stream/{job_id} and fetch
+    its result from /jobs/{job_id}. With auto_save the vendor is saved as
+    soon as its analysis succeeds.
+    """
+    saved = []
+    for upload in files:
+        file_extension = upload.filename.split(".")[-1]
+        front_path = f"uploads/temp_front_{uuid.uuid4()}.{file_extension}"
+        await save_upload(upload, front_path)
+        saved.append((upload.filename, file_extension, front_path))
+    # One transaction for the lot, so the workers can claim the uploads as batches
+    job_ids = await executors.run_io(job_queue.enqueue_many, "analyze_card", [
+        {
+            "front_path": front_path,
+            "file_extension": file_extension,
+            "filename": filename,
+            "auto_save": auto_save
+        }
+        for filename, file_extension, front_path in saved
+    ])
+    jobs = [{"job_id": job_id, "filename": filename} for job_id, (filename, _, _) in zip(job_ids, saved)]
+    for job in jobs:
+        await update_status(job["job_id"], "Queued")
+    return {"jobs": jobs}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def prepare_vendor_record(card_data):
+    """Shapes an analysis/vendor payload for save_card/update_card."""
+    # Validate additional_info is a dict
+    if "additional_info" not in card_data or not isinstance(card_data["additional_info"], dict):
+        card_data["additional_info"] = {}
+
+    # Merge products into additional_info
+    if "products" in card_data:
+        card_data["additional_info"]["products_sold"] = card_data.pop("products")
+    return card_data
+
 @app.post("/save-vendor")
 async def save_vendor_endpoint(card_data: dict):
     try:
-        # Validate additional_info is a dict
-        if "additional_info" not in card_data or not isinstance(card_data["additional_info"], dict):
-            card_data["additional_info"] = {}
-
-        # Merge products into additional_info
-        if "products" in card_data:
-            card_data["additional_info"]["products_sold"] = card_data.pop("products")
-
-        card_id = save_card(card_data)
+        card_id = await executors.run_io(save_card, prepare_vendor_record(card_data))
+        pregenerate_thumbnails_later(card_data.get("image_path"))
         return {"id": card_id, "message": "Vendor saved successfully"}
     except Exception as e:
         print(f"Save Error: {e}")
@@ -184,15 +455,8 @@ async def save_vendor_endpoint(card_data: dict):
 @app.put("/update-vendor/{card_id}")
 async def update_vendor_endpoint(card_id: int, card_data: dict):
     try:
-        # Validate additional_info is a dict
-        if "additional_info" not in card_data or not isinstance(card_data["additional_info"], dict):
-            card_data["additional_info"] = {}
-
-        # Merge products into additional_info
-        if "products" in card_data:
-            card_data["additional_info"]["products_sold"] = card_data.pop("products")
-        
-        update_card(card_id, card_data)
+        await executors.run_io(update_card, card_id, prepare_vendor_record(card_data))
+        pregenerate_thumbnails_later(card_data.get("image_path"))
         return {"id": card_id, "message": "Vendor updated successfully"}
     except Exception as e:
         print(f"Update Error: {e}")
@@ -201,74 +465,418 @@ async def update_vendor_endpoint(card_id: int, card_data: dict):
 @app.delete("/delete-vendor/{card_id}")
 async def delete_vendor_endpoint(card_id: int):
     try:
-        delete_card(card_id)
+        await executors.run_io(delete_card, card_id)
         return {"id": card_id, "message": "Vendor deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/cards")
-def get_cards():
-    return get_all_cards()
+def get_cards(
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    category: Optional[str] = None
+):
+    """
+    Without limit/cursor this streams the full list as a JSON array (the
+    original response shape). With them it returns one keyset page:
+    {"items": [...], "next_cursor": "..."}.
+    """
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        if limit is None and cursor is None:
+            cards = iter_cards(field_list, category)
+            return StreamingResponse(stream_json_array(cards), media_type="application/json")
+        return get_cards_page(limit or CARDS_PAGE_LIMIT, cursor, field_list, category)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def stream_json_array(items):
+    yield "["
+    for i, item in enumerate(items):
+        yield ("," if i else "") + json.dumps(item)
+    yield "]"
+
+@app.get("/thumbnails/{preset}/{image_path:path}")
+async def get_thumbnail(preset: str, image_path: str, request: Request, format: Optional[str] = None):
+    """
+    Preset-sized derivative (sm, md, lg) of an uploaded image, e.g.
+    /thumbnails/sm/uploads/<hash>.jpg. WebP/AVIF/JPEG by ?format= or the
+    Accept header. Rendered once, then served from disk with a strong ETag.
+    """
+    try:
+        fmt = thumbnail_service.negotiate_format(format, request.headers.get("accept"))
+        thumb = await thumbnail_service.get_thumbnail(image_path, preset, fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
+        print(f"Thumbnail Error: {e}")
+        raise HTTPException(status_code=415, detail="Not a readable image")
+    if thumb is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    headers = {"ETag": thumb["etag"], "Cache-Control": thumbnail_service.THUMB_CACHE_CONTROL}
+    if format is None:
+        headers["Vary"] = "Accept"
+    if thumbnail_service.etag_matches(request.headers.get("if-none-match"), thumb["etag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(thumb["path"], media_type=thumb["media_type"], headers=headers)
+
+@app.post("/cards/bulk")
+async def import_cards_bulk(
+    request: Request,
+    format: Optional[Literal["jsonl", "csv"]] = None,
+    upsert_on: Optional[Literal["website", "name"]] = None
+):
+    """
+    Imports vendors from a JSON Lines or CSV body (format from ?format= or
+    the Content-Type). The body is parsed while it uploads and written in
+    chunked transactions. With upsert_on, rows matching an existing card's
+    website or name update it. Returns counts plus the first bad rows.
+    """
+    fmt = format or bulk_io.format_for(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="Pass ?format=jsonl|csv or a text/csv or application/x-ndjson body")
+
+    body = bulk_io.BodyStream()
+    work = asyncio.ensure_future(executors.run_io(bulk_io.import_stream, body, fmt, upsert_on))
+    try:
+        await body.feed(request)
+        return await work
+    except Exception as e:
+        body.abandon()
+        print(f"Bulk Import Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/cards/export")
+def export_cards(format: Literal["jsonl", "csv"] = "jsonl"):
+    """Streams every card, oldest first, as JSON Lines or CSV (importable by /cards/bulk)."""
+    cards = stream_cards()
+    if format == "csv":
+        return StreamingResponse(bulk_io.export_csv(cards), media_type="text/csv",
+                                 headers={"Content-Disposition": 'attachment; filename="vendors.csv"'})
+    return StreamingResponse(bulk_io.export_jsonl(cards), media_type="application/x-ndjson",
+                             headers={"Content-Disposition": 'attachment; filename="vendors.jsonl"'})
+
+@app.get("/products")
+def list_products(
+    q: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    currency: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500)
+):
+    """
+    Products vendors sell, e.g. ?max_price=500&currency=INR for gifts under
+    ₹500 or ?q=notebook for vendors selling notebooks.
+    """
+    return search_products(q, min_price, max_price, currency, limit)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Span durations (p50/p95/p99 over recent calls, plus totals) in the
+    Prometheus text format. Per worker process; scrape each worker.
+    """
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/model-stats")
+def model_stats():
+    """
+    Per-model latency, error and 429 rates behind the router's current
+    order, plus the quota limiter's queue depth, wait times and bucket
+    levels (for sizing GEMINI_QUOTAS).
+    """
+    return {**gemini_service.router.stats(), "limiter": gemini_service.limiter.stats()}
+
+# Per-backend deadlines (seconds) for the /search-gifts fan-out
+INTERNAL_SEARCH_DEADLINE = float(os.getenv("INTERNAL_SEARCH_DEADLINE", "3"))
+WEB_SEARCH_DEADLINE = float(os.getenv("WEB_SEARCH_DEADLINE", "20"))
+
+def build_internal_results(cards):
+    base_url = os.getenv("BASE_URL", "http://localhost:8000")
+    internal_results = []
+    for card in cards:
+        internal_results.append(SearchResult(
+            source="Internal Database",
+            title=f"Gift from {card['name']}",
+            description=f"Category: {card['category']}. Contact: {card['contact']}",
+            link=card['website'] if card['website'] else "#",
+            image_url=f"{base_url}/thumbnails/md/{card['image_path']}"
+        ))
+    return internal_results
+
+def build_web_products(gemini_data):
+    web_products = []
+    for item in gemini_data.get("products", []):
+        web_products.append(SearchResult(
+            source="Web Product",
+            title=item.get("title", "Gift Idea"),
+            price=item.get("price", "N/A"),
+            link=item.get("link", "#"),
+            description=item.get("description", ""),
+            image_url=""
+        ))
+    return web_products
+
+def build_web_vendors(gemini_data):
+    web_vendors = []
+    for item in gemini_data.get("vendors", []):
+         web_vendors.append(SearchResult(
+            source="Global Vendor",
+            title=item.get("name", "Vendor"),
+            price="N/A", # Not applicable for vendor
+            link=item.get("website", "#"),
+            description=item.get("specialty", ""),
+            image_url="",
+            products=item.get("products", [])
+        ))
+    return web_vendors
+
+def search_filters(request: SearchRequest):
+    """The structured filters of a search request as search_cards keyword arguments."""
+    if request.min_price is not None and request.max_price is not None and request.min_price > request.max_price:
+        raise HTTPException(status_code=400, detail="min_price must not exceed max_price")
+    return {
+        "min_price": request.min_price,
+        "max_price": request.max_price,
+        "currency": request.currency,
+        "categories": [c for c in request.categories if c.strip()],
+        "has_website": request.has_website
+    }
+
+def run_internal_search(query, mode, filters):
+    if mode == "keyword" or not query.strip():
+        return search_cards(query, **filters)
+    return semantic_search_cards(query, hybrid=(mode == "hybrid"), **filters)
+
+@traced("search.internal")
+async def search_internal(query, filters=None, mode="hybrid"):
+    """Internal DB search off the event loop. Returns [] if it misses its deadline."""
+    try:
+        cards = await asyncio.wait_for(
+            asyncio.to_thread(run_internal_search, query, mode, filters or {}),
+            INTERNAL_SEARCH_DEADLINE
+        )
+        return build_internal_results(cards), False
+    except asyncio.TimeoutError:
+        print(f"Internal search missed its {INTERNAL_SEARCH_DEADLINE}s deadline")
+        return [], True
+
+@traced("search.web")
+async def search_web(query):
+    """
+    Gemini web search through the query cache. If it misses its deadline the
+    fallback insights are returned, but the call keeps running (shielded) so
+    its answer still lands in the cache for the next search.
+    """
+    if not query.strip():
+        # Filter-only browsing of our own vendors; nothing to ask the web
+        return {}, "skipped", False
+    web_cache = get_web_search_cache()
+    fetch = asyncio.ensure_future(web_cache.get_or_fetch(
+        query,
+        gemini_service.search_web_gems,
+        cacheable=gemini_service.is_complete_search
+    ))
+    try:
+        gemini_data, cache_status = await asyncio.wait_for(asyncio.shield(fetch), WEB_SEARCH_DEADLINE)
+        return gemini_data, cache_status, False
+    except asyncio.TimeoutError:
+        print(f"Web search missed its {WEB_SEARCH_DEADLINE}s deadline. Returning fallback insights.")
+        return gemini_service.FALLBACK_SEARCH_DATA, "timeout", True
+
+def log_search_error(e):
+    import traceback
+    error_msg = f"Search API Error: {str(e)}\n{traceback.format_exc()}"
+    print(error_msg)
+    with open("backend_errors.log", "a") as f:
+        f.write(f"[{datetime.datetime.now()}] {error_msg}\n")
 
 @app.post("/search-gifts")
 async def search_gifts(request: SearchRequest):
+    filters = search_filters(request)
     try:
         query = request.query
-        
-        # 1. Search Internal DB
-        base_url = os.getenv("BASE_URL", "http://localhost:8000")
-        internal_cards = search_cards(query)
-        internal_results = []
-        for card in internal_cards:
-            internal_results.append(SearchResult(
-                source="Internal Database",
-                title=f"Gift from {card['name']}",
-                description=f"Category: {card['category']}. Contact: {card['contact']}",
-                link=card['website'] if card['website'] else "#",
-                image_url=f"{base_url}/{card['image_path']}"
-            ))
-            
-        # 2. Search Web via Gemini
-        gemini_data = gemini_service.search_web_gems(query)
-        
-        web_products = []
-        for item in gemini_data.get("products", []):
-            web_products.append(SearchResult(
-                source="Web Product",
-                title=item.get("title", "Gift Idea"),
-                price=item.get("price", "N/A"),
-                link=item.get("link", "#"),
-                description=item.get("description", ""),
-                image_url=""
-            ))
-
-        web_vendors = []
-        for item in gemini_data.get("vendors", []):
-             web_vendors.append(SearchResult(
-                source="Global Vendor",
-                title=item.get("name", "Vendor"),
-                price="N/A", # Not applicable for vendor
-                link=item.get("website", "#"),
-                description=item.get("specialty", ""),
-                image_url="",
-                products=item.get("products", [])
-            ))
-        
+
+        # Internal DB and Gemini web search run side by side, each with its own deadline
+        (internal_results, internal_late), (gemini_data, cache_status, web_late) = await asyncio.gather(
+            search_internal(query, filters, request.mode),
+            search_web(query)
+        )
+
         return {
             "internal_results": internal_results,
-            "web_products": web_products,
-            "web_vendors": web_vendors,
-            "market_insights": gemini_data.get("market_insights", {})
+            "web_products": build_web_products(gemini_data),
+            "web_vendors": build_web_vendors(gemini_data),
+            "market_insights": gemini_data.get("market_insights", {}),
+            "timed_out": [name for name, late in (("internal", internal_late), ("web", web_late)) if late],
+            "cache": {"web_search": cache_status, **get_web_search_cache().stats()}
         }
 
     except Exception as e:
-        import traceback
-        error_msg = f"Search API Error: {str(e)}\n{traceback.format_exc()}"
-        print(error_msg)
-        with open("backend_errors.log", "a") as f:
-            f.write(f"[{datetime.datetime.now()}] {error_msg}\n")
+        log_search_error(e)
         raise HTTPException(status_code=500, detail=str(e))
 
+# Streamed web searches in progress, by cache key: {"events": [...], "listeners": [queue, ...]}
+web_streams = {}
+
+def start_web_stream(query):
+    """
+    Runs the streamed Gemini search for a cache miss in its own task and
+    returns a queue of its events, ending with None. The task outlives the
+    request, so a complete answer is still cached if the client goes away
+    or WEB_SEARCH_DEADLINE passes first. A second miss on the same key
+    while it runs joins it (replaying what has arrived) instead of asking
+    Gemini again.
+    """
+    events = asyncio.Queue()
+    key = normalize_query(query)
+    shared = web_streams.get(key) if key else None
+    if shared is not None:
+        for item in shared["events"]:
+            events.put_nowait(item)
+        shared["listeners"].append(events)
+        return events
+    shared = {"events": [], "listeners": [events]}
+    if key:
+        web_streams[key] = shared
+
+    async def run():
+        try:
+            async for event, value in gemini_service.stream_web_gems(query):
+                if event == "done":
+                    await get_web_search_cache().store(query, value, cacheable=gemini_service.is_complete_search)
+                shared["events"].append((event, value))
+                for listener in shared["listeners"]:
+                    listener.put_nowait((event, value))
+        except Exception as e:
+            print(f"Web search stream error: {e}")
+        finally:
+            if web_streams.get(key) is shared:
+                del web_streams[key]
+            for listener in shared["listeners"]:
+                listener.put_nowait(None)
+
+    # Shared by every request that joins it, so its spans belong to none of them
+    task = asyncio.create_task(detached(run()))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return events
+
+async def web_search_sections(query, timed_out):
+    """
+    NDJSON sections of the web search. A cached result goes out in one
+    piece; on a miss the insights and each product and vendor go out as
+    soon as Gemini has written them, and whatever has not arrived by
+    WEB_SEARCH_DEADLINE is sent from the fallback data.
+    """
+    web_cache = get_web_search_cache()
+    cached = await web_cache.lookup(
+        query, gemini_service.search_web_gems, cacheable=gemini_service.is_complete_search
+    ) if query.strip() else ({}, "skipped")
+    if cached:
+        gemini_data, cache_status = cached
+        yield {"section": "market_insights", "data": gemini_data.get("market_insights", {})}
+        yield {"section": "web_products", "items": build_web_products(gemini_data)}
+        yield {"section": "web_vendors", "items": build_web_vendors(gemini_data)}
+        yield {"section": "cache", "data": {"web_search": cache_status, **web_cache.stats()}}
+        return
+
+    events = start_web_stream(query)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + WEB_SEARCH_DEADLINE
+    sent = set()
+    cache_status = "miss"
+    while True:
+        try:
+            item = await asyncio.wait_for(events.get(), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            print(f"Web search missed its {WEB_SEARCH_DEADLINE}s deadline. Returning fallback insights.")
+            timed_out.append("web")
+            cache_status = "timeout"
+            fallback = gemini_service.FALLBACK_SEARCH_DATA
+            if "market_insights" not in sent:
+                yield {"section": "market_insights", "data": fallback["market_insights"]}
+            if "product" not in sent:
+                yield {"section": "web_products", "items": build_web_products(fallback)}
+            if "vendor" not in sent:
+                yield {"section": "web_vendors", "items": build_web_vendors(fallback)}
+            break
+        if item is None:
+            break
+
+        event, value = item
+        if not sent and event != "done":
+            record("search.web_first_result", loop.time() - started)
+        if event == "market_insights":
+            yield {"section": "market_insights", "data": value}
+        elif event == "product":
+            yield {"section": "web_products", "items": build_web_products({"products": [value]})}
+        elif event == "vendor":
+            yield {"section": "web_vendors", "items": build_web_vendors({"vendors": [value]})}
+        sent.add(event)
+    yield {"section": "cache", "data": {"web_search": cache_status, **web_cache.stats()}}
+
+@app.post("/search-gifts/stream")
+async def search_gifts_stream(request: SearchRequest):
+    """
+    Same search as /search-gifts, streamed as NDJSON. Each line is one
+    section (or part of one) as soon as its backend answers, e.g.
+    {"section": "internal_results", "items": [...]}, then
+    web_products / web_vendors / market_insights, then {"section": "done"}.
+    Clients append "items" to the named section; on a cache miss the web
+    sections arrive one product or vendor per line as Gemini writes them.
+    """
+    query = request.query
+    filters = search_filters(request)
+
+    async def event_stream():
+        def line(payload):
+            return json.dumps(jsonable_encoder(payload)) + "\n"
+
+        timed_out = []
+        sections = asyncio.Queue()
+
+        async def internal_sections():
+            internal_results, late = await search_internal(query, filters, request.mode)
+            if late: timed_out.append("internal")
+            yield {"section": "internal_results", "items": internal_results}
+
+        async def forward(source):
+            try:
+                async for section in source:
+                    await sections.put(section)
+            except Exception as e:
+                await sections.put(e)
+            finally:
+                await sections.put(None)
+
+        tasks = [
+            asyncio.ensure_future(forward(internal_sections())),
+            asyncio.ensure_future(forward(web_search_sections(query, timed_out)))
+        ]
+        try:
+            running = len(tasks)
+            while running:
+                section = await sections.get()
+                if section is None:
+                    running -= 1
+                elif isinstance(section, Exception):
+                    raise section
+                else:
+                    yield line(section)
+            yield line({"section": "done", "timed_out": timed_out})
+        except Exception as e:
+            log_search_error(e)
+            yield line({"section": "error", "detail": str(e)})
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
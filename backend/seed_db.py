@@ -1,8 +1,5 @@
 
-import sqlite3
-import json
-
-DB_NAME = "storytellerz.db"
+from db import get_connection, save_card
 
 SAMPLE_VENDORS = [
     {
@@ -64,34 +61,18 @@ SAMPLE_VENDORS = [
 ]
 
 def seed_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
     # Check if data already exists to avoid dupes
-    cursor.execute("SELECT count(*) FROM cards")
-    count = cursor.fetchone()[0]
+    with get_connection() as conn:
+        count = conn.execute("SELECT count(*) FROM cards").fetchone()[0]
     
     if count > 0:
         print(f"Database already has {count} entries. Skipping seed.")
-        conn.close()
         return
 
     print("Seeding database with sample vendors...")
+    # save_card also fills the search index and vendor_products
     for vendor in SAMPLE_VENDORS:
-        cursor.execute('''
-            INSERT INTO cards (name, contact, category, website, additional_info, image_path)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            vendor['name'],
-            vendor['contact'],
-            vendor['category'],
-            vendor['website'],
-            json.dumps(vendor['additional_info']),
-            vendor['image_path']
-        ))
-    
-    conn.commit()
-    conn.close()
+        save_card(vendor)
     print("Database seeded successfully!")
 
 if __name__ == "__main__":
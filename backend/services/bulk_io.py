@@ -0,0 +1,237 @@
+import asyncio
+import csv
+import io
+import itertools
+import json
+import queue
+import threading
+import time
+
+from db import IMPORT_CHUNK_SIZE, import_cards
+
+BULK_FORMATS = ("jsonl", "csv")
+# Request body chunks buffered between the event loop and the import thread
+BODY_QUEUE_CHUNKS = 16
+# Rows per chunk of an export response
+EXPORT_BATCH_ROWS = 500
+# Bad rows listed in an import summary; the rest are only counted
+MAX_REPORTED_ERRORS = 50
+
+# Card columns a bulk row may set directly; anything else goes to additional_info
+IMPORT_FIELDS = ("name", "contact", "category", "website", "image_path")
+EXPORT_FIELDS = ("id", "name", "contact", "category", "website", "additional_info", "image_path", "created_at")
+IGNORED_FIELDS = ("id", "created_at")
+
+def format_for(content_type):
+    """Bulk format implied by a Content-Type header, or None."""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return "csv"
+    if content_type in ("application/x-ndjson", "application/jsonl", "application/json-lines", "application/x-jsonlines"):
+        return "jsonl"
+    return None
+
+class BodyStream(io.RawIOBase):
+    """
+    Read-only file object over a request body that is still arriving.
+
+    The event loop feed()s chunks as they come in; a worker thread reads
+    them through csv/TextIOWrapper as if from a file. The queue is bounded,
+    so a slow import pushes back on the upload instead of buffering it.
+    """
+
+    def __init__(self, max_chunks=BODY_QUEUE_CHUNKS):
+        self._chunks = queue.Queue(max_chunks)
+        self._pending = b""
+        self._eof = False
+        self._abandoned = threading.Event()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending and not self._eof:
+            chunk = self._chunks.get()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._pending = chunk
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def put(self, chunk):
+        """Blocking; False once the reader has given up, so the feeder can stop."""
+        while not self._abandoned.is_set():
+            try:
+                self._chunks.put(chunk, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    async def feed(self, request):
+        """Copies request.stream() into the queue without blocking the event loop."""
+        try:
+            async for chunk in request.stream():
+                if chunk and not await asyncio.to_thread(self.put, chunk):
+                    return
+        finally:
+            # End of body (or a dropped client) ends the reader's file too
+            await asyncio.to_thread(self.put, None)
+
+    def abandon(self):
+        self._abandoned.set()
+
+def card_from_record(record):
+    """
+    Shapes one imported row like a /save-vendor payload: known columns are
+    kept, additional_info may be an object or a JSON string, "products" moves
+    to products_sold, and any other non-empty field lands in additional_info.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("Row is not an object")
+    info = record.get("additional_info") or {}
+    if isinstance(info, str):
+        info = json.loads(info)
+    if not isinstance(info, dict):
+        raise ValueError("additional_info must be an object")
+    info = dict(info)
+
+    card = {}
+    for key, value in record.items():
+        if key in IMPORT_FIELDS:
+            card[key] = value.strip() if isinstance(value, str) else value
+        elif key == "products":
+            info["products_sold"] = value
+        elif key not in IGNORED_FIELDS and key != "additional_info" and key and value not in (None, ""):
+            info[key] = value
+    if not card.get("name"):
+        raise ValueError("name is required")
+    card["additional_info"] = info
+    return card
+
+def read_lines(stream):
+    """
+    Yields (line number, text or UnicodeDecodeError) for each line of a
+    UTF-8 byte stream, so one badly encoded line fails alone.
+    """
+    for line_no, raw in enumerate(io.BufferedReader(stream), start=1):
+        try:
+            yield line_no, raw.decode("utf-8-sig" if line_no == 1 else "utf-8")
+        except UnicodeDecodeError as e:
+            yield line_no, e
+
+def read_jsonl(lines):
+    """Yields (line number, record or exception) for each non-blank line."""
+    for line_no, line in lines:
+        if isinstance(line, Exception):
+            yield line_no, line
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as e:
+            yield line_no, e
+
+def read_csv(lines):
+    """
+    Yields (line number, record or exception) for each CSV row; the first
+    row names the columns. Undecodable lines are left out of the rows and
+    reported on their own.
+    """
+    skipped = []
+    line_no = 0
+
+    def decoded():
+        nonlocal line_no
+        for line_no, line in lines:
+            if isinstance(line, Exception):
+                skipped.append((line_no, line))
+            else:
+                yield line
+
+    reader = csv.DictReader(decoded())
+    while True:
+        try:
+            record = next(reader)
+            # Cells past the header land under None
+            record.pop(None, None)
+        except StopIteration:
+            break
+        except csv.Error as e:
+            # The reader starts afresh on the next line
+            record = ValueError(f"Malformed CSV row: {e}")
+        yield from skipped
+        skipped.clear()
+        yield line_no, record
+    yield from skipped
+
+def import_stream(stream, fmt, upsert_on=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Imports a JSONL or CSV byte stream chunk by chunk (one transaction per
+    chunk). Bad rows (invalid, undecodable or unparsable) are skipped and
+    reported by line; good rows are kept.
+    Blocking; run it off the event loop.
+    """
+    if fmt not in BULK_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(BULK_FORMATS)}")
+    summary = {"inserted": 0, "updated": 0, "failed": 0, "errors": []}
+    start = time.perf_counter()
+    try:
+        lines = read_lines(stream)
+        rows = read_jsonl(lines) if fmt == "jsonl" else read_csv(lines)
+
+        def cards():
+            for line_no, record in rows:
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    yield card_from_record(record)
+                except ValueError as e:
+                    summary["failed"] += 1
+                    if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                        summary["errors"].append({"line": line_no, "error": str(e)})
+
+        good = cards()
+        while chunk := list(itertools.islice(good, chunk_size)):
+            counts = import_cards(chunk, upsert_on)
+            summary["inserted"] += counts["inserted"]
+            summary["updated"] += counts["updated"]
+    finally:
+        if isinstance(stream, BodyStream):
+            stream.abandon()
+
+    elapsed = time.perf_counter() - start
+    written = summary["inserted"] + summary["updated"]
+    summary["elapsed_ms"] = round(elapsed * 1000)
+    summary["rows_per_second"] = round(written / elapsed) if elapsed else written
+    return summary
+
+def _in_batches(cards, size=EXPORT_BATCH_ROWS):
+    cards = iter(cards)
+    while batch := list(itertools.islice(cards, size)):
+        yield batch
+
+def export_jsonl(cards):
+    # One chunk per batch: StreamingResponse hops to a worker thread per chunk
+    for batch in _in_batches(cards):
+        yield "".join(json.dumps(card) + "\n" for card in batch)
+
+def export_csv(cards, fields=EXPORT_FIELDS):
+    """CSV chunks with additional_info as a JSON string; read_csv takes the same layout back."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for batch in _in_batches(cards):
+        writer.writerows(
+            [json.dumps(card.get(field, {})) if field == "additional_info" else card.get(field) for field in fields]
+            for card in batch
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,57 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+# CPU-bound image work (decode, resize, merge, hash) runs in a process pool so
+# it never holds the event loop or the GIL. 0 falls back to the I/O threads.
+CPU_WORKERS = int(os.getenv("IMAGE_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Blocking file I/O (upload writes, reads, cleanup) runs on this many threads
+IO_WORKERS = int(os.getenv("IO_THREAD_WORKERS", "8"))
+# At most this many image jobs queued or running at once; extra callers wait
+CPU_QUEUE_LIMIT = int(os.getenv("IMAGE_QUEUE_LIMIT", str(max(1, CPU_WORKERS) * 2)))
+
+_cpu_pool = None
+_io_pool = None
+_cpu_slots = None
+
+def get_cpu_pool():
+    global _cpu_pool
+    if CPU_WORKERS <= 0:
+        return get_io_pool()
+    if _cpu_pool is None:
+        _cpu_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS)
+    return _cpu_pool
+
+def get_io_pool():
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="file-io")
+    return _io_pool
+
+async def run_cpu(fn, *args, **kwargs):
+    """Runs a picklable, module-level function in the image process pool."""
+    global _cpu_slots
+    if _cpu_slots is None:
+        _cpu_slots = asyncio.Semaphore(CPU_QUEUE_LIMIT)
+    async with _cpu_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_cpu_pool(), partial(fn, *args, **kwargs))
+
+async def run_io(fn, *args, **kwargs):
+    """Runs a blocking file operation on the I/O thread pool."""
+    loop = asyncio.get_running_loop()
+    # Carry context variables over, like asyncio.to_thread (tracing relies on it)
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_io_pool(), partial(context.run, fn, *args, **kwargs))
+
+def shutdown():
+    global _cpu_pool, _io_pool, _cpu_slots
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=False, cancel_futures=True)
+        _cpu_pool = None
+    if _io_pool is not None:
+        _io_pool.shutdown(wait=False, cancel_futures=True)
+        _io_pool = None
+    _cpu_slots = None
@@ -0,0 +1,65 @@
+import json
+import os
+import time
+
+from db import get_connection
+
+# Cached analyses expire after EXTRACTION_CACHE_TTL seconds; beyond
+# EXTRACTION_CACHE_MAX_ENTRIES the least recently hit entries are evicted.
+CACHE_TTL = float(os.getenv("EXTRACTION_CACHE_TTL", str(30 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "5000"))
+
+def init_extraction_cache():
+    with get_connection() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                image_hash TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_hit_at REAL NOT NULL,
+                PRIMARY KEY (image_hash, prompt_version)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_hit ON extraction_cache (last_hit_at)')
+
+def get_cached_extraction(image_hash, prompt_version):
+    now = time.time()
+    with get_connection() as conn:
+        row = conn.execute(
+            'SELECT result, created_at FROM extraction_cache WHERE image_hash = ? AND prompt_version = ?',
+            (image_hash, prompt_version)
+        ).fetchone()
+        if not row:
+            return None
+        if now - row[1] > CACHE_TTL:
+            conn.execute(
+                'DELETE FROM extraction_cache WHERE image_hash = ? AND prompt_version = ?',
+                (image_hash, prompt_version)
+            )
+            return None
+        conn.execute(
+            'UPDATE extraction_cache SET last_hit_at = ? WHERE image_hash = ? AND prompt_version = ?',
+            (now, image_hash, prompt_version)
+        )
+    return json.loads(row[0])
+
+def store_extraction(image_hash, prompt_version, result):
+    now = time.time()
+    with get_connection() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO extraction_cache (image_hash, prompt_version, result, created_at, last_hit_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (image_hash, prompt_version, json.dumps(result), now, now))
+        conn.execute('DELETE FROM extraction_cache WHERE created_at < ?', (now - CACHE_TTL,))
+        conn.execute('''
+            DELETE FROM extraction_cache WHERE rowid IN (
+                SELECT rowid FROM extraction_cache ORDER BY last_hit_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (CACHE_MAX_ENTRIES,))
+
+# Initialize on import, like db.py
+try:
+    init_extraction_cache()
+except Exception:
+    pass
@@ -1,41 +1,179 @@
 
 import os
 import json
-import requests
+import asyncio
 import base64
+import httpx
 from dotenv import load_dotenv
+from services import executors
+from services.tracing import span, traced
+from services.json_stream import JSONStreamParser
+from services.model_router import ModelRouter, ModelAttemptError, AllModelsFailed
+from services.rate_limiter import RateLimiter, QueueTimeout, parse_quotas, PRIORITY_INTERACTIVE, PRIORITY_UPLOAD, PRIORITY_BACKGROUND
 
 load_dotenv()
 
 API_KEY = os.environ.get("GOOGLE_API_KEY")
+# Overridable so tests and benchmarks can point at a local stub server
+API_BASE_URL = os.environ.get("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
 # Models to try in order of preference (Fastest -> Smartest)
 # Based on check_models.py output
 MODELS = ["gemini-2.5-flash", "gemini-2.0-flash-001", "gemini-2.5-pro"]
 
+# Per-call timeouts (seconds). Vision calls get longer to read the image.
+EXTRACT_TIMEOUT = float(os.environ.get("GEMINI_EXTRACT_TIMEOUT", "45"))
+SEARCH_TIMEOUT = float(os.environ.get("GEMINI_SEARCH_TIMEOUT", "30"))
+CONNECT_TIMEOUT = 5.0
+MAX_CONNECTIONS = int(os.environ.get("GEMINI_MAX_CONNECTIONS", "20"))
+
+# Our requests/tokens per minute per model. Override as
+# GEMINI_QUOTAS="gemini-2.5-flash=1000/1000000,..."; 0 lifts a limit.
+MODEL_QUOTAS = {
+    "gemini-2.5-flash": (1000, 1000000),
+    "gemini-2.0-flash-001": (2000, 4000000),
+    "gemini-2.5-pro": (150, 2000000),
+    **parse_quotas(os.environ.get("GEMINI_QUOTAS", "")),
+}
+# Token estimates charged up front and corrected from usageMetadata: a
+# 1600px card is about 6 tiles of 258 tokens; replies are short for cards
+IMAGE_TOKEN_ESTIMATE = 1548
+EXTRACT_OUTPUT_TOKENS = 300
+SEARCH_OUTPUT_TOKENS = 2000
+
+# Every call waits here for its model's quota instead of firing into a 429.
+# GEMINI_LIMITER_BACKEND=sqlite shares the buckets between uvicorn workers.
+limiter = RateLimiter(MODEL_QUOTAS)
+
+# Reorders MODELS from live latency/error data. 429s bench a model for
+# GEMINI_COOLDOWN seconds; GEMINI_HEDGE=1 races a second model past p95.
+router = ModelRouter(
+    MODELS,
+    cooldown=float(os.environ.get("GEMINI_COOLDOWN", "30")),
+    hedge=os.environ.get("GEMINI_HEDGE", "0") == "1",
+)
+
+# Bump whenever the extraction prompt or its post-processing changes, so
+# cached extractions from the old prompt are not reused
+EXTRACT_PROMPT_VERSION = "1"
+
+_client = None
+
 def get_api_url(model_id):
-    return f"https://generativelanguage.googleapis.com/v1beta/models/{model_id}:generateContent?key={API_KEY}"
+    return f"{API_BASE_URL}/models/{model_id}:generateContent?key={API_KEY}"
 
-def extract_card_data(image_path: str):
-    if not API_KEY:
-        return {"name": "Error: Missing API Key"}
-# ... (rest of extract_card_data is unchanged)
+def get_stream_url(model_id):
+    return f"{API_BASE_URL}/models/{model_id}:streamGenerateContent?alt=sse&key={API_KEY}"
 
-    encoded_string = ""
-    target_mime_type = "image/jpeg"
+def get_client():
+    """Returns the shared keep-alive client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers={'Content-Type': 'application/json'},
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+            timeout=httpx.Timeout(SEARCH_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def estimate_tokens(payload: dict, output_tokens: int):
+    parts = [part for content in payload["contents"] for part in content["parts"]]
+    prompt = sum(len(part.get("text", "")) // 4 for part in parts)
+    images = sum(1 for part in parts if "inline_data" in part)
+    return prompt + images * IMAGE_TOKEN_ESTIMATE + output_tokens
+
+def _used_tokens(response):
     try:
-        if image_path.lower().endswith('.png'): target_mime_type = "image/png"
-        elif image_path.lower().endswith('.webp'): target_mime_type = "image/webp"
-        
-        with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-    except Exception as e:
-        return {"name": "File Error", "contact": str(e)}
+        return response.json()["usageMetadata"]["totalTokenCount"]
+    except Exception:
+        return None
 
-    # Enhanced prompt for better accuracy
-    prompt = """
-        Analyze this business card image. Extract all text and details.
-        Return a strict JSON object with these fields:
-        {
+async def generate_content(model_id: str, payload: dict, timeout: float,
+                           priority: int = PRIORITY_UPLOAD, output_tokens: int = EXTRACT_OUTPUT_TOKENS):
+    """
+    POSTs one generateContent call through the shared client once the
+    model's quota allows it. Raises ModelAttemptError if the wait in the
+    limiter's queue runs past the priority's timeout.
+    """
+    try:
+        async with limiter.slot(model_id, estimate_tokens(payload, output_tokens), priority) as permit:
+            response = await get_client().post(
+                get_api_url(model_id),
+                json=payload,
+                timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT),
+            )
+            if response.status_code == 429:
+                permit.rate_limited()
+            elif response.status_code == 200:
+                permit.used(_used_tokens(response))
+            return response
+    except QueueTimeout as e:
+        print(f"Model {model_id} quota queue: {e}. Trying next...")
+        raise ModelAttemptError(f"Queue timeout: {model_id}")
+
+async def stream_generate_content(model_id: str, payload: dict, timeout: float,
+                                  priority: int = PRIORITY_INTERACTIVE, output_tokens: int = SEARCH_OUTPUT_TOKENS):
+    """
+    streamGenerateContent under the same quota slot as generate_content,
+    yielding the reply text chunk by chunk as the model writes it. Raises
+    ModelAttemptError on a queue timeout, a non-200 answer or a read that
+    times out (timeout applies per chunk).
+    """
+    try:
+        async with limiter.slot(model_id, estimate_tokens(payload, output_tokens), priority) as permit:
+            async with get_client().stream(
+                "POST",
+                get_stream_url(model_id),
+                json=payload,
+                timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT),
+            ) as response:
+                if response.status_code != 200:
+                    if response.status_code == 429:
+                        permit.rate_limited()
+                    print(f"DEBUG: Failed {model_id} - Status: {response.status_code}, Body: {(await response.aread())[:500]}")
+                    raise ModelAttemptError(f"{response.status_code}: {model_id}", response.status_code)
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    chunk = json.loads(line[5:])
+                    # Running totals; the last chunk's are the call's
+                    if "usageMetadata" in chunk:
+                        permit.used(chunk["usageMetadata"].get("totalTokenCount"))
+                    for candidate in chunk.get("candidates", [])[:1]:
+                        for part in candidate.get("content", {}).get("parts", []):
+                            if part.get("text"):
+                                yield part["text"]
+    except QueueTimeout as e:
+        print(f"Model {model_id} quota queue: {e}. Trying next...")
+        raise ModelAttemptError(f"Queue timeout: {model_id}")
+    except httpx.TimeoutException:
+        print(f"Search via {model_id} timed out after {timeout}s")
+        raise ModelAttemptError(f"Timeout: {model_id}")
+
+def _read_image_b64(image_path: str):
+    with open(image_path, "rb") as image_file:
+        return base64.b64encode(image_file.read()).decode('utf-8')
+
+async def _image_part(image_path: str):
+    target_mime_type = "image/jpeg"
+    if image_path.lower().endswith('.png'): target_mime_type = "image/png"
+    elif image_path.lower().endswith('.webp'): target_mime_type = "image/webp"
+
+    encoded_string = await executors.run_io(_read_image_b64, image_path)
+    return {"inline_data": {"mime_type": target_mime_type, "data": encoded_string}}
+
+def _response_json(response):
+    text = response.json()['candidates'][0]['content']['parts'][0]['text']
+    text = text.replace("```json", "").replace("```", "").strip()
+    return json.loads(text)
+
+# Enhanced prompt for better accuracy
+CARD_FIELDS = """{
             "name": "Business Name (or Person Name)",
             "phone": "Mobile/Phone numbers (comma separated)",
             "email": "Email addresses (comma separated)",
@@ -46,138 +184,259 @@ def extract_card_data(image_path: str):
             "tagline": "Slogan or Tagline",
             "social_media": "Instagram/LinkedIn handles",
             "designation": "Job Title (if personal card)"
-        }
+        }"""
+
+EXTRACT_PROMPT = f"""
+        Analyze this business card image. Extract all text and details.
+        Return a strict JSON object with these fields:
+        {CARD_FIELDS}
         If a field is not found, use an empty string. 
         Be extremely careful with phone numbers and emails.
     """
 
+def card_record(data: dict):
+    """Post-processes one extracted card to match our DB schema."""
+    # Combine phone, email, address into 'contact'
+    contact_parts = []
+    if data.get("phone"): contact_parts.append(f"Ph: {data['phone']}")
+    if data.get("email"): contact_parts.append(f"✉ {data['email']}")
+    if data.get("address"): contact_parts.append(f"📍 {data['address']}")
+
+    final_data = {
+        "name": data.get("name", ""),
+        "category": data.get("category", ""),
+        "website": data.get("website", ""),
+        "contact": " | ".join(contact_parts),
+        "products": data.get("products", ""),
+        "additional_info": {
+            "tagline": data.get("tagline", ""),
+            "social_media": data.get("social_media", ""),
+            "designation": data.get("designation", "")
+        }
+    }
+    return final_data
+
+async def _request_json(model_id, payload, timeout, priority, output_tokens=EXTRACT_OUTPUT_TOKENS):
+    """One generateContent call, parsed to JSON or raised as a ModelAttemptError for the router."""
+    try:
+        response = await generate_content(model_id, payload, timeout, priority, output_tokens)
+    except httpx.TimeoutException:
+        print(f"Model {model_id} timed out after {timeout}s. Trying next...")
+        raise ModelAttemptError(f"Timeout: {model_id}")
+
+    if response.status_code == 429:
+        print(f"Model {model_id} rate limited (429). Trying next...")
+        raise ModelAttemptError(f"429: {model_id}", 429)
+    if response.status_code != 200:
+        print(f"Model {model_id} failed with {response.status_code}. Trying next...")
+        raise ModelAttemptError(f"{response.status_code}: {model_id}", response.status_code)
+
+    try:
+        return _response_json(response)
+    except Exception as e:
+        print(f"Parsing error for {model_id}: {e}")
+        raise ModelAttemptError("Parsing Error")
+
+@traced("gemini.extract_card_data")
+async def extract_card_data(image_path: str, priority: int = PRIORITY_UPLOAD):
+    if not API_KEY:
+        return {"name": "Error: Missing API Key"}
+
+    try:
+        image_part = await _image_part(image_path)
+    except Exception as e:
+        return {"name": "File Error", "contact": str(e)}
+
     payload = {
         "contents": [{
             "parts": [
-                {"text": prompt},
-                {"inline_data": {"mime_type": target_mime_type, "data": encoded_string}}
+                {"text": EXTRACT_PROMPT},
+                image_part
             ]
         }],
         "generationConfig": {"response_mime_type": "application/json"}
     }
     
-    headers = {'Content-Type': 'application/json'}
-    
-    last_error = ""
-    
-    # Try each model until one works
-    for model_id in MODELS:
+    async def attempt(model_id):
         print(f"Trying model: {model_id}...")
-        url = get_api_url(model_id)
+        with span("gemini.extract_attempt", model=model_id):
+            data = await _request_json(model_id, payload, EXTRACT_TIMEOUT, priority)
+            if not isinstance(data, dict):
+                raise ModelAttemptError("Parsing Error")
+            return card_record(data)
+
+    # Let the router pick (and optionally hedge) models until one works
+    try:
+        return await router.run(attempt)
+    except AllModelsFailed as e:
+        return {"name": "AI Error", "contact": f"All models failed. Last: {e}"}
+
+# Cards packed into one generateContent call by extract_cards_batch
+EXTRACT_BATCH_SIZE = int(os.environ.get("GEMINI_EXTRACT_BATCH_SIZE", "8"))
+
+def batch_extract_prompt(count: int):
+    return f"""
+        Analyze each of the {count} business card images below. Every image is
+        preceded by its label "Image <index>:" (indexes start at 0).
+        Return a strict JSON array with exactly one object per image:
+        [{{"index": 0, ...fields}}, {{"index": 1, ...fields}}]
+        where the fields of each object are:
+        {CARD_FIELDS}
+        Never merge details from different images.
+        If a field is not found, use an empty string. 
+        Be extremely careful with phone numbers and emails.
+    """
+
+def split_batch_response(data, count: int):
+    """
+    Maps a batch reply back to per-image results. Returns a list of
+    `count` card records, with None for images whose entry is missing,
+    duplicated or malformed.
+    """
+    results = [None] * count
+    if isinstance(data, dict):
+        # Some models wrap the array, e.g. {"cards": [...]}
+        data = next((v for v in data.values() if isinstance(v, list)), None)
+    if not isinstance(data, list):
+        return results
+
+    seen = set()
+    for item in data:
+        if not isinstance(item, dict):
+            continue
         try:
-            response = requests.post(url, headers=headers, json=payload)
-            
-            if response.status_code == 200:
-                # Success!
-                try:
-                    text = response.json()['candidates'][0]['content']['parts'][0]['text']
-                    text = text.replace("```json", "").replace("```", "").strip()
-                    data = json.loads(text)
-                    
-                    # Post-process to match our DB schema
-                    # Combine phone, email, address into 'contact'
-                    contact_parts = []
-                    if data.get("phone"): contact_parts.append(f"Ph: {data['phone']}")
-                    if data.get("email"): contact_parts.append(f"✉ {data['email']}")
-                    if data.get("address"): contact_parts.append(f"📍 {data['address']}")
-                    
-                    final_data = {
-                        "name": data.get("name", ""),
-                        "category": data.get("category", ""),
-                        "website": data.get("website", ""),
-                        "contact": " | ".join(contact_parts),
-                        "products": data.get("products", ""),
-                        "additional_info": {
-                            "tagline": data.get("tagline", ""),
-                            "social_media": data.get("social_media", ""),
-                            "designation": data.get("designation", "")
-                        }
-                    }
-                    return final_data
-
-                except Exception as e:
-                    print(f"Parsing error for {model_id}: {e}")
-                    last_error = "Parsing Error"
-                    continue 
-            
-            elif response.status_code == 429:
-                print(f"Model {model_id} rate limited (429). Trying next...")
-                last_error = f"429: {model_id}"
-                continue
-            else:
-                print(f"Model {model_id} failed with {response.status_code}. Trying next...")
-                last_error = f"{response.status_code}: {model_id}"
-                continue
-                
-        except Exception as e:
-            last_error = str(e)
+            index = int(item.get("index"))
+        except (TypeError, ValueError):
+            continue
+        if not 0 <= index < count:
+            continue
+        if index in seen:
+            # A repeated index means the model lost track; trust neither entry
+            results[index] = None
+            continue
+        seen.add(index)
+        if not any(isinstance(item.get(k), str) and item.get(k) for k in ("name", "phone", "email", "website")):
             continue
-            
-    return {"name": "AI Error", "contact": f"All models failed. Last: {last_error}"}
+        results[index] = card_record(item)
+    return results
 
-def search_web_gems(query: str):
-    print(f"DEBUG: Starting search_web_gems for query: '{query}'")
-    
-    # Define fallback data with nested products and market insights
-    fallback_data = {
-        "market_insights": {
-            "price_trend": "Stable",
-            "average_price": "$25 - $60",
-            "trending_keywords": ["Eco-friendly", "Handmade", "Personalized", "Minimalist"],
-            "summary": "Demand for sustainable and personalized corporate gifts is rising. fast shipping is a key differentiator."
+async def _extract_chunk(image_paths, priority):
+    parts = [{"text": batch_extract_prompt(len(image_paths))}]
+    readable = []
+    for path in image_paths:
+        try:
+            image_part = await _image_part(path)
+        except Exception:
+            readable.append(False)
+            continue
+        parts.append({"text": f"Image {sum(readable)}:"})
+        parts.append(image_part)
+        readable.append(True)
+
+    results = [None] * len(image_paths)
+    count = sum(readable)
+    if count:
+        payload = {
+            "contents": [{"parts": parts}],
+            "generationConfig": {"response_mime_type": "application/json"}
+        }
+
+        async def attempt(model_id):
+            print(f"Trying model: {model_id} for {count} cards...")
+            with span("gemini.extract_batch_attempt", model=model_id):
+                return await _request_json(model_id, payload, EXTRACT_TIMEOUT * 2, priority,
+                                           EXTRACT_OUTPUT_TOKENS * count)
+
+        try:
+            batch = split_batch_response(await router.run(attempt), count)
+        except AllModelsFailed:
+            batch = [None] * count
+        batch_iter = iter(batch)
+        results = [next(batch_iter) if ok else None for ok in readable]
+
+    # Re-run anything the batch reply did not cover on its own
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        print(f"Batch extraction missed {len(missing)} of {len(image_paths)} cards. Retrying individually...")
+        retried = await asyncio.gather(*(extract_card_data(image_paths[i], priority) for i in missing))
+        for i, result in zip(missing, retried):
+            results[i] = result
+    return results
+
+async def extract_cards_batch(image_paths, batch_size: int = None, priority: int = PRIORITY_BACKGROUND):
+    """
+    Extracts many cards with one multimodal request per `batch_size` images
+    (GEMINI_EXTRACT_BATCH_SIZE), saving the per-request overhead of
+    extract_card_data. Results come back in the order of image_paths, in the
+    same shape as extract_card_data, including its error dicts. Waits
+    behind interactive calls for quota unless given a higher priority.
+    """
+    if not API_KEY:
+        return [{"name": "Error: Missing API Key"} for _ in image_paths]
+
+    batch_size = max(1, batch_size or EXTRACT_BATCH_SIZE)
+    chunks = [image_paths[i:i + batch_size] for i in range(0, len(image_paths), batch_size)]
+    results = []
+    for chunk_results in await asyncio.gather(*(_extract_chunk(chunk, priority) for chunk in chunks)):
+        results.extend(chunk_results)
+    return results
+
+# Returned when no model can answer a search, with nested products and
+# market insights in the same shape as a live response
+FALLBACK_SEARCH_DATA = {
+    "market_insights": {
+        "price_trend": "Stable",
+        "average_price": "$25 - $60",
+        "trending_keywords": ["Eco-friendly", "Handmade", "Personalized", "Minimalist"],
+        "summary": "Demand for sustainable and personalized corporate gifts is rising. fast shipping is a key differentiator."
+    },
+    "products": [
+        {"title": "Eco-Friendly Bamboo Set", "price": "$45", "description": "Sustainable desk organizer set made from premium bamboo.", "link": "#"},
+        {"title": "Custom Leather Journal", "price": "$30", "description": "Handcrafted leather notebook with personalized embossing.", "link": "#"},
+        {"title": "Artisan Coffee Hamper", "price": "$60", "description": "Gourmet selection of single-origin beans and treats.", "link": "#"},
+        {"title": "Smart Tech Tracker", "price": "$25", "description": "Bluetooth tracker for keys and wallets with custom branding.", "link": "#"},
+        {"title": "Premium Metal Pen", "price": "$15", "description": "Weighted luxury pen suitable for corporate gifting.", "link": "#"}
+    ],
+    "vendors": [
+        {
+            "name": "Global Green Gifting", 
+            "specialty": "Sustainable Corporate Gifts", 
+            "website": "https://example.com",
+            "products": [
+                 {"title": "Bamboo Tumbler", "price": "$12"},
+                 {"title": "Recycled Notebook", "price": "$8"},
+                 {"title": "Organic Cotton Tote", "price": "$15"}
+            ]
         },
-        "products": [
-            {"title": "Eco-Friendly Bamboo Set", "price": "$45", "description": "Sustainable desk organizer set made from premium bamboo.", "link": "#"},
-            {"title": "Custom Leather Journal", "price": "$30", "description": "Handcrafted leather notebook with personalized embossing.", "link": "#"},
-            {"title": "Artisan Coffee Hamper", "price": "$60", "description": "Gourmet selection of single-origin beans and treats.", "link": "#"},
-            {"title": "Smart Tech Tracker", "price": "$25", "description": "Bluetooth tracker for keys and wallets with custom branding.", "link": "#"},
-            {"title": "Premium Metal Pen", "price": "$15", "description": "Weighted luxury pen suitable for corporate gifting.", "link": "#"}
-        ],
-        "vendors": [
-            {
-                "name": "Global Green Gifting", 
-                "specialty": "Sustainable Corporate Gifts", 
-                "website": "https://example.com",
-                "products": [
-                     {"title": "Bamboo Tumbler", "price": "$12"},
-                     {"title": "Recycled Notebook", "price": "$8"},
-                     {"title": "Organic Cotton Tote", "price": "$15"}
-                ]
-            },
-            {
-                "name": "LuxeStationery Co.", 
-                "specialty": "Premium Office Supplies", 
-                "website": "https://example.com",
-                "products": [
-                     {"title": "Gold Fountain Pen", "price": "$80"},
-                     {"title": "Leather Desk Pad", "price": "$45"},
-                     {"title": "Executive Planner", "price": "$35"}
-                ]
-            },
-            {
-                "name": "TechPromos intl.", 
-                "specialty": "Branded Tech Accessories", 
-                "website": "https://example.com",
-                "products": [
-                     {"title": "Wireless Charger", "price": "$25"},
-                     {"title": "Noise Cancelling Buds", "price": "$60"},
-                     {"title": "Smart Key Finder", "price": "$20"}
-                ]
-            }
-        ]
-    }
+        {
+            "name": "LuxeStationery Co.", 
+            "specialty": "Premium Office Supplies", 
+            "website": "https://example.com",
+            "products": [
+                 {"title": "Gold Fountain Pen", "price": "$80"},
+                 {"title": "Leather Desk Pad", "price": "$45"},
+                 {"title": "Executive Planner", "price": "$35"}
+            ]
+        },
+        {
+            "name": "TechPromos intl.", 
+            "specialty": "Branded Tech Accessories", 
+            "website": "https://example.com",
+            "products": [
+                 {"title": "Wireless Charger", "price": "$25"},
+                 {"title": "Noise Cancelling Buds", "price": "$60"},
+                 {"title": "Smart Key Finder", "price": "$20"}
+            ]
+        }
+    ]
+}
 
-    if not API_KEY: 
-        print("DEBUG: API_KEY is missing! returning fallback.")
-        return fallback_data
-    
-    headers = {'Content-Type': 'application/json'}
-    prompt = f"""
+def is_complete_search(data: dict):
+    """Whether a search result is worth caching: none of it came from FALLBACK_SEARCH_DATA."""
+    return data is not FALLBACK_SEARCH_DATA and not data.get("fallback_sections")
+
+def search_prompt(query: str):
+    return f"""
     You are an expert gifting assistant and market analyst.
     For the query: "{query}", provide a comprehensive analysis:
     
@@ -208,34 +467,118 @@ def search_web_gems(query: str):
         ]
     }}
     """
-    
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"response_mime_type": "application/json"}
-    }
-    
-    # Try models
-    for model_id in MODELS:
-        try:
+
+# Values picked out of the streamed search reply as each one completes.
+# The bare lists mark a section as received even when it is empty.
+SEARCH_STREAM_PATHS = [("market_insights",), ("products", "*"), ("vendors", "*"), ("products",), ("vendors",)]
+# Event name for one item of each list section
+SEARCH_ITEM_EVENTS = {"products": "product", "vendors": "vendor"}
+
+async def stream_web_gems(query: str, priority: int = PRIORITY_INTERACTIVE):
+    """
+    The web search, streamed. Yields ("market_insights", dict), then
+    ("product", dict) / ("vendor", dict) per item as soon as its object is
+    complete in the model's reply, and finally ("done", data) with the
+    assembled result.
+
+    If every model fails, or the reply breaks off or stops parsing partway,
+    the sections that never arrived are filled from FALLBACK_SEARCH_DATA
+    (and listed in data["fallback_sections"]); what already arrived stands.
+    """
+    print(f"DEBUG: Starting search_web_gems for query: '{query}'")
+    data = {"market_insights": None, "products": [], "vendors": []}
+    received = set()
+    complete = False
+
+    def collect(events):
+        for path, value in events:
+            section = path[0]
+            if section == "market_insights":
+                if isinstance(value, dict):
+                    received.add(section)
+                    data[section] = value
+                    yield section, value
+            elif len(path) == 1:
+                received.add(section)
+            elif isinstance(value, dict):
+                received.add(section)
+                data[section].append(value)
+                yield SEARCH_ITEM_EVENTS[section], value
+
+    if not API_KEY:
+        print("DEBUG: API_KEY is missing! returning fallback.")
+    else:
+        payload = {
+            "contents": [{"parts": [{"text": search_prompt(query)}]}],
+            "generationConfig": {"response_mime_type": "application/json"}
+        }
+
+        async def attempt(model_id):
+            """Opens the stream and reads up to the first complete object, so a dud model can still be skipped."""
             print(f"DEBUG: Trying search via {model_id}...")
-            url = get_api_url(model_id)
-            response = requests.post(url, headers=headers, json=payload)
-            
-            if response.status_code == 200:
-                print(f"DEBUG: Success with {model_id}")
-                text = response.json()['candidates'][0]['content']['parts'][0]['text']
-                text = text.replace("```json", "").replace("```", "").strip()
-                data = json.loads(text)
-                return {
-                    "market_insights": data.get("market_insights", fallback_data["market_insights"]),
-                    "products": data.get("products", []),
-                    "vendors": data.get("vendors", [])
-                }
-            else:
-                print(f"DEBUG: Failed {model_id} - Status: {response.status_code}, Body: {response.text}")
-        except Exception as e:
-            print(f"Search error with {model_id}: {e}")
+            chunks = stream_generate_content(model_id, payload, SEARCH_TIMEOUT, priority, SEARCH_OUTPUT_TOKENS)
+            parser = JSONStreamParser(SEARCH_STREAM_PATHS)
+            opened = False
+            try:
+                with span("gemini.search_attempt", model=model_id):
+                    async for text in chunks:
+                        events = parser.feed(text)
+                        if events or parser.done:
+                            opened = True
+                            print(f"DEBUG: Success with {model_id}")
+                            return chunks, parser, events
+            except ValueError as e:
+                print(f"Search error with {model_id}: {e}")
+                raise ModelAttemptError("Parsing Error")
+            finally:
+                if not opened:
+                    await chunks.aclose()
+            print(f"Search via {model_id} ended before its first result")
+            raise ModelAttemptError("Parsing Error")
+
+        try:
+            # No hedging: a second open stream could not be given back cleanly
+            chunks, parser, events = await router.run(attempt, hedge=False)
+        except AllModelsFailed:
+            print("DEBUG: All search models failed. Returning fallback data.")
+        else:
+            try:
+                for event in collect(events):
+                    yield event
+                while not parser.done:
+                    text = await chunks.__anext__()
+                    for event in collect(parser.feed(text)):
+                        yield event
+                complete = True
+            except StopAsyncIteration:
+                print("Search reply ended before its JSON did. Falling back for missing sections.")
+            except (ValueError, ModelAttemptError, httpx.HTTPError) as e:
+                print(f"Search stream broke off ({type(e).__name__}: {e}). Falling back for missing sections.")
+            finally:
+                await chunks.aclose()
+
+    fallback_sections = []
+    if "market_insights" not in received:
+        data["market_insights"] = FALLBACK_SEARCH_DATA["market_insights"]
+        fallback_sections.append("market_insights")
+        yield "market_insights", data["market_insights"]
+    # A reply that parsed completely but left a list out simply has none
+    for section, event in SEARCH_ITEM_EVENTS.items():
+        if section in received or complete:
             continue
-            
-    print("DEBUG: All search models failed. Returning fallback data.")        
-    return fallback_data
+        fallback_sections.append(section)
+        for item in FALLBACK_SEARCH_DATA[section]:
+            data[section].append(item)
+            yield event, item
+    if fallback_sections:
+        data["fallback_sections"] = fallback_sections
+    yield "done", data
+
+@traced("gemini.search_web_gems")
+async def search_web_gems(query: str, priority: int = PRIORITY_INTERACTIVE):
+    """The whole web search as one result, read off stream_web_gems."""
+    result = None
+    async for event, value in stream_web_gems(query, priority):
+        if event == "done":
+            result = value
+    return result
@@ -0,0 +1,123 @@
+import hashlib
+import os
+
+from PIL import Image, ImageFilter, ImageOps
+
+# Longest edge (px) each card side is scaled down to before it is merged,
+# stored and sent to Gemini. 1600px keeps small print legible.
+MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1600"))
+# JPEG or WEBP
+OUTPUT_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+QUALITY = int(os.getenv("IMAGE_QUALITY", "82"))
+# Crop each side to the detected card region (off by default)
+CROP_TO_CARD = os.getenv("IMAGE_CROP", "0") == "1"
+
+OUTPUT_EXT = "webp" if OUTPUT_FORMAT == "WEBP" else "jpg"
+
+MERGE_PADDING = 20
+
+def detect_card_region(img):
+    """
+    Rough bounding box of the card: edges are found on a small grayscale copy
+    and their extent is scaled back up. Returns None when the box is too
+    small or too close to the full frame to be worth cropping.
+    """
+    probe = img.convert("L")
+    probe.thumbnail((256, 256))
+    edges = probe.filter(ImageFilter.FIND_EDGES).point(lambda p: 255 if p > 40 else 0)
+    bbox = edges.getbbox()
+    if not bbox:
+        return None
+
+    sx, sy = img.width / probe.width, img.height / probe.height
+    pad_x, pad_y = img.width * 0.02, img.height * 0.02
+    left = max(0, int(bbox[0] * sx - pad_x))
+    top = max(0, int(bbox[1] * sy - pad_y))
+    right = min(img.width, int(bbox[2] * sx + pad_x))
+    bottom = min(img.height, int(bbox[3] * sy + pad_y))
+
+    coverage = (right - left) * (bottom - top) / float(img.width * img.height)
+    if coverage < 0.2 or coverage > 0.95:
+        return None
+    return (left, top, right, bottom)
+
+def load_side(path, max_edge=MAX_EDGE, crop=CROP_TO_CARD):
+    """Opens one card side upright, in RGB, optionally cropped, and no larger than max_edge."""
+    with Image.open(path) as img:
+        # Let the JPEG decoder skip detail we are about to throw away
+        scale = min(1.0, max_edge / float(max(img.size)))
+        img.draft("RGB", (int(img.width * scale), int(img.height * scale)))
+        img = ImageOps.exif_transpose(img)
+        if img.mode != 'RGB': img = img.convert('RGB')
+
+    if crop:
+        region = detect_card_region(img)
+        if region:
+            img = img.crop(region)
+
+    img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    return img
+
+def merge_sides(img1, img2):
+    """Stacks the front above the back on a white canvas."""
+    w1, h1 = img1.size
+    w2, h2 = img2.size
+
+    max_width = max(w1, w2)
+    total_height = h1 + h2 + MERGE_PADDING
+
+    new_im = Image.new('RGB', (max_width, total_height), (255, 255, 255))
+    new_im.paste(img1, (0, 0))
+    new_im.paste(img2, (0, h1 + MERGE_PADDING))
+    return new_im
+
+def save_optimized(img, out_path, fmt=OUTPUT_FORMAT, quality=QUALITY):
+    if fmt == "WEBP":
+        img.save(out_path, "WEBP", quality=quality, method=4)
+    else:
+        img.save(out_path, "JPEG", quality=quality, optimize=True, progressive=True)
+
+def prepare_card_image(front_path, back_path, out_path):
+    """
+    Preprocesses the uploaded side(s) into one optimized image at out_path:
+    EXIF orientation, optional crop, downscale, then merge and re-encode.
+    Returns byte counts so callers can report what was saved.
+    """
+    original_bytes = os.path.getsize(front_path) + (os.path.getsize(back_path) if back_path else 0)
+
+    img = load_side(front_path)
+    if back_path:
+        img = merge_sides(img, load_side(back_path))
+    save_optimized(img, out_path)
+
+    processed_bytes = os.path.getsize(out_path)
+    return {
+        "original_bytes": original_bytes,
+        "processed_bytes": processed_bytes,
+        "bytes_saved": max(0, original_bytes - processed_bytes),
+        "width": img.width,
+        "height": img.height,
+    }
+
+def _normalized_bytes(path):
+    """
+    Decoded, orientation-corrected RGB pixels, so the same card saved with
+    different metadata or re-encoded by the phone still hashes the same.
+    Falls back to the raw file bytes if the file is not a readable image.
+    """
+    try:
+        with Image.open(path) as img:
+            img = ImageOps.exif_transpose(img).convert("RGB")
+            return f"{img.width}x{img.height}".encode() + img.tobytes()
+    except Exception:
+        with open(path, "rb") as f:
+            return f.read()
+
+def image_fingerprint(front_path, back_path=None):
+    """SHA-256 over the normalized front (and back) image."""
+    digest = hashlib.sha256()
+    for path in (front_path, back_path):
+        if path:
+            digest.update(_normalized_bytes(path))
+            digest.update(b"|")
+    return digest.hexdigest()
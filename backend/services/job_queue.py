@@ -0,0 +1,283 @@
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+from db import get_connection
+from services.status_service import update_status
+
+# Jobs processed at once by this worker process
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+# Job starts per minute across this process, to stay inside the Gemini quota
+JOB_RATE_PER_MINUTE = float(os.getenv("JOB_RATE_PER_MINUTE", "30"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "4"))
+# First retry waits this long (seconds), doubling on each further attempt
+JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "5"))
+# A running job whose lease expires (e.g. the process died) is picked up again
+JOB_LEASE = float(os.getenv("JOB_LEASE", "600"))
+# Idle workers also look for jobs enqueued by other processes this often
+JOB_POLL_INTERVAL = 1.0
+
+class JobQueue:
+    """
+    Durable SQLite-backed job queue with an in-process asyncio worker pool.
+
+    Jobs survive restarts: queued jobs wait in the jobs table, and a job that
+    was running when its process died is reclaimed once its lease runs out.
+    Failures are retried with exponential backoff up to JOB_MAX_ATTEMPTS.
+    Progress goes to update_status under the job id, so /status-stream/{job_id}
+    works for jobs just as it does for interactive requests. Kinds registered
+    with a batch handler are claimed and run several at a time.
+    """
+
+    def __init__(self, concurrency=JOB_CONCURRENCY, rate_per_minute=JOB_RATE_PER_MINUTE,
+                 max_attempts=JOB_MAX_ATTEMPTS, backoff_base=JOB_BACKOFF_BASE, lease=JOB_LEASE):
+        self.concurrency = concurrency
+        self.rate_per_minute = rate_per_minute
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.lease = lease
+        self._handlers = {}
+        self._batch_handlers = {}  # kind -> (batch_handler, batch_size)
+        self._failure_handlers = {}
+        self._workers = []
+        self._wake = None
+        self._loop = None
+        self._next_start = 0.0
+        self._init_table()
+
+    def _init_table(self):
+        with get_connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    run_at REAL NOT NULL,
+                    lease_until REAL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs (status, run_at)')
+
+    def register(self, kind, handler, batch_handler=None, batch_size=1, on_failed=None):
+        """
+        handler(job) is awaited with the claimed job dict and returns a
+        JSON-able result. With a batch_handler, a worker that claims a job of
+        this kind also claims up to batch_size - 1 more that are ready and
+        awaits batch_handler(jobs), which returns one result or Exception per
+        job, in order. Each job is still retried or finished on its own.
+        on_failed(job) is awaited once a job has failed for good, e.g. to
+        clean up its files.
+        """
+        self._handlers[kind] = handler
+        if on_failed is not None:
+            self._failure_handlers[kind] = on_failed
+        if batch_handler is not None and batch_size > 1:
+            self._batch_handlers[kind] = (batch_handler, batch_size)
+
+    def enqueue(self, kind, payload):
+        return self.enqueue_many(kind, [payload])[0]
+
+    def enqueue_many(self, kind, payloads):
+        """Queues one job per payload in a single transaction, so workers see them together."""
+        job_ids = [str(uuid.uuid4()) for _ in payloads]
+        now = time.time()
+        with get_connection() as conn:
+            conn.executemany('''
+                INSERT INTO jobs (id, kind, status, payload, run_at, created_at, updated_at)
+                VALUES (?, ?, 'queued', ?, ?, ?, ?)
+            ''', [(job_id, kind, json.dumps(payload), now, now, now) for job_id, payload in zip(job_ids, payloads)])
+        if self._wake is not None:
+            # Callable from a worker thread; asyncio.Event is not thread-safe
+            self._loop.call_soon_threadsafe(self._wake.set)
+        return job_ids
+
+    def get(self, job_id):
+        with get_connection() as conn:
+            row = conn.execute('''
+                SELECT id, kind, status, payload, result, error, attempts, run_at, created_at, updated_at
+                FROM jobs WHERE id = ?
+            ''', (job_id,)).fetchone()
+        if not row:
+            return None
+        return {
+            "id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "payload": json.loads(row[3]),
+            "result": json.loads(row[4]) if row[4] else None,
+            "error": row[5],
+            "attempts": row[6],
+            "run_at": row[7],
+            "created_at": row[8],
+            "updated_at": row[9]
+        }
+
+    def update_payload(self, job_id, payload):
+        """Lets a handler checkpoint progress so a retry can skip finished steps."""
+        with get_connection() as conn:
+            conn.execute('UPDATE jobs SET payload = ?, updated_at = ? WHERE id = ?',
+                         (json.dumps(payload), time.time(), job_id))
+
+    def _claim(self, kind=None):
+        now = time.time()
+        with get_connection() as conn:
+            row = conn.execute('''
+                SELECT id, status, attempts FROM jobs
+                WHERE ((status = 'queued' AND run_at <= ?) OR (status = 'running' AND lease_until < ?))
+                    AND (? IS NULL OR kind = ?)
+                ORDER BY run_at, created_at LIMIT 1
+            ''', (now, now, kind, kind)).fetchone()
+            if not row:
+                return None
+            # Only succeeds if no other worker claimed it in between
+            claimed = conn.execute('''
+                UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ?
+                WHERE id = ? AND status = ? AND attempts = ?
+            ''', (now + self.lease, now, row[0], row[1], row[2])).rowcount
+        return self.get(row[0]) if claimed else None
+
+    def _claim_more(self, kind, limit):
+        """Claims up to `limit` further ready jobs of one kind to run alongside a claimed one."""
+        jobs = []
+        while len(jobs) < limit:
+            job = self._claim(kind)
+            if job is None:
+                break
+            jobs.append(job)
+        return jobs
+
+    def _finish(self, job_id, status, result=None, error=None, run_at=None):
+        with get_connection() as conn:
+            conn.execute('''
+                UPDATE jobs SET status = ?, result = ?, error = ?, run_at = COALESCE(?, run_at),
+                    lease_until = NULL, updated_at = ?
+                WHERE id = ?
+            ''', (status, json.dumps(result) if result is not None else None, error, run_at, time.time(), job_id))
+
+    def _release(self, job_id, run_at=None):
+        """Hands a running job back to the queue; jobs already finished are left alone."""
+        with get_connection() as conn:
+            conn.execute('''
+                UPDATE jobs SET status = 'queued', lease_until = NULL, run_at = COALESCE(?, run_at), updated_at = ?
+                WHERE id = ? AND status = 'running'
+            ''', (run_at, time.time(), job_id))
+
+    async def _wait_for_rate_slot(self):
+        if self.rate_per_minute <= 0:
+            return
+        now = time.monotonic()
+        start_at = max(now, self._next_start)
+        self._next_start = start_at + 60.0 / self.rate_per_minute
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+
+    async def _run(self, job):
+        handler = self._handlers.get(job["kind"])
+        await update_status(job["id"], f"Job started (attempt {job['attempts']} of {self.max_attempts})")
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler for job kind {job['kind']}")
+            result = await handler(job)
+        except Exception as e:
+            result = e
+        await self._settle(job, result)
+
+    async def _run_batch(self, jobs):
+        batch_handler, _ = self._batch_handlers[jobs[0]["kind"]]
+        for job in jobs:
+            await update_status(
+                job["id"], f"Job started (attempt {job['attempts']} of {self.max_attempts}, batch of {len(jobs)})"
+            )
+        try:
+            results = await batch_handler(jobs)
+        except Exception as e:
+            results = [e] * len(jobs)
+        for job, result in zip(jobs, results):
+            await self._settle(job, result)
+
+    async def _settle(self, job, result):
+        """Finishes a job with its result, or schedules a retry (or fails it) for an Exception."""
+        job_id = job["id"]
+        if isinstance(result, Exception):
+            e = result
+            if job["attempts"] >= self.max_attempts:
+                await asyncio.to_thread(self._finish, job_id, "failed", error=str(e))
+                await update_status(job_id, f"Error: {e}")
+                on_failed = self._failure_handlers.get(job["kind"])
+                if on_failed is not None:
+                    try:
+                        await on_failed(job)
+                    except Exception as cleanup_error:
+                        print(f"Job cleanup error for {job_id}: {cleanup_error}")
+                return
+            delay = self.backoff_base * (2 ** (job["attempts"] - 1)) * random.uniform(0.8, 1.2)
+            await asyncio.to_thread(self._finish, job_id, "queued", error=str(e), run_at=time.time() + delay)
+            await update_status(job_id, f"Attempt {job['attempts']} failed ({e}). Retrying in {delay:.0f}s...")
+            return
+        await asyncio.to_thread(self._finish, job_id, "done", result=result)
+        await update_status(job_id, "Complete")
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                # e.g. "database is locked" past the busy timeout; keep the worker alive
+                print(f"Job claim error: {e}")
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+                continue
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+            jobs = [job]
+            try:
+                if job["kind"] in self._batch_handlers:
+                    jobs += await asyncio.to_thread(
+                        self._claim_more, job["kind"], self._batch_handlers[job["kind"]][1] - 1
+                    )
+                # A batch is one start: it goes to Gemini as one request
+                await self._wait_for_rate_slot()
+                if len(jobs) > 1:
+                    await self._run_batch(jobs)
+                else:
+                    await self._run(job)
+            except asyncio.CancelledError:
+                # Shutting down: hand the jobs back rather than waiting out their lease
+                for claimed in jobs:
+                    self._release(claimed["id"])
+                raise
+            except Exception as e:
+                print(f"Job worker error for {', '.join(j['id'] for j in jobs)}: {e}")
+                # Back to the queue (after a backoff) instead of running until the lease expires
+                retry_at = time.time() + self.backoff_base
+                for claimed in jobs:
+                    try:
+                        await asyncio.to_thread(self._release, claimed["id"], retry_at)
+                    except Exception as release_error:
+                        print(f"Job release error for {claimed['id']}: {release_error}")
+
+    def start(self):
+        if self._workers:
+            return
+        self._wake = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
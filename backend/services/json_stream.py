@@ -0,0 +1,91 @@
+import json
+
+class JSONStreamParser:
+    """
+    Incremental scanner for one JSON object arriving in text chunks, such as
+    a streamed model reply. feed() returns every value completed so far
+    whose path matches one of `paths`, as (path, value) pairs, e.g. with
+    paths [("products", "*")] each element of the top-level "products"
+    array as soon as its closing brace arrives.
+
+    Anything before the first "{" (like a ```json fence) and after the
+    closing "}" is ignored. Only objects and arrays are reported. Raises
+    ValueError once the text can no longer be JSON.
+    """
+
+    def __init__(self, paths):
+        self.paths = [tuple(p) for p in paths]
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        # One frame per open container: [kind, key or index, start offset, expecting a key]
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+
+    def _path(self):
+        """Path of the value that just closed: the key or index it sits at in each open container."""
+        return tuple(frame[1] for frame in self._stack)
+
+    def _matches(self, path):
+        return any(
+            len(pattern) == len(path) and all(p == "*" or p == c for p, c in zip(pattern, path))
+            for pattern in self.paths
+        )
+
+    def feed(self, text):
+        self._buffer += text
+        events = []
+        buffer = self._buffer
+        stack = self._stack
+        i = self._pos
+        end = len(buffer)
+        while i < end and not self.done:
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    frame = stack[-1]
+                    if frame[0] == "{" and frame[3]:
+                        frame[1] = json.loads(buffer[self._string_start:i + 1])
+                # Skip ahead to the next character that can end or escape the string
+                if not self._escape and self._in_string:
+                    next_quote = buffer.find('"', i + 1)
+                    next_escape = buffer.find("\\", i + 1)
+                    stops = [s for s in (next_quote, next_escape) if s != -1]
+                    i = min(stops) if stops else end
+                    continue
+            elif not stack:
+                if ch == "{":
+                    stack.append(["{", None, i, True])
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                stack.append([ch, None if ch == "{" else 0, i, ch == "{"])
+            elif ch in "}]":
+                opener = stack.pop()
+                if (opener[0] == "{") != (ch == "}"):
+                    raise ValueError(f"Mismatched {ch!r} at offset {i}")
+                if not stack:
+                    self.done = True
+                else:
+                    path = self._path()
+                    if self._matches(path):
+                        events.append((path, json.loads(buffer[opener[2]:i + 1])))
+            elif ch == ",":
+                frame = stack[-1]
+                if frame[0] == "{":
+                    frame[3] = True
+                else:
+                    frame[1] += 1
+            elif ch == ":":
+                stack[-1][3] = False
+            i += 1
+        self._pos = i
+        return events
@@ -0,0 +1,183 @@
+import asyncio
+import time
+from collections import deque
+
+# Rolling window of recent calls kept per model
+WINDOW_SIZE = 50
+# Samples needed before a model's p95 is trusted as a hedging deadline
+MIN_HEDGE_SAMPLES = 5
+# Prior used to smooth scores while a model has few observations, so the
+# configured order wins until there is real data to overrule it
+PRIOR_CALLS = 3
+PRIOR_LATENCY = 3.0
+
+class ModelAttemptError(Exception):
+    """Raised by an attempt when a model call fails and the next model should be tried."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class AllModelsFailed(Exception):
+    pass
+
+class ModelStats:
+    def __init__(self):
+        self.latencies = deque(maxlen=WINDOW_SIZE)  # seconds, answered or hedge-cancelled calls
+        self.outcomes = deque(maxlen=WINDOW_SIZE)   # "ok", "error", "429" or "cancelled"
+        self.cooldown_until = 0.0
+        self.hedges = 0
+
+    def record(self, latency, outcome):
+        self.outcomes.append(outcome)
+        # A hedge loser's elapsed time is a lower bound on its latency; keep it
+        # so a model that keeps losing races is ranked as slow
+        if outcome in ("ok", "cancelled"):
+            self.latencies.append(latency)
+
+    def percentile(self, pct):
+        if not self.latencies:
+            return None
+        values = sorted(self.latencies)
+        return values[min(len(values) - 1, int(len(values) * pct))]
+
+    def rate(self, outcome):
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for o in self.outcomes if o == outcome) / len(self.outcomes)
+
+    def score(self):
+        """Expected seconds to a good answer: smoothed latency / smoothed success rate."""
+        n = len(self.latencies)
+        latency = (sum(self.latencies) + PRIOR_LATENCY * PRIOR_CALLS) / (n + PRIOR_CALLS)
+        ok = sum(1 for o in self.outcomes if o in ("ok", "cancelled"))
+        success = (ok + PRIOR_CALLS) / (len(self.outcomes) + PRIOR_CALLS)
+        return latency / success
+
+class ModelRouter:
+    """
+    Chooses which Gemini model to call based on what has actually been
+    happening: rolling latency, error rate and 429 rate per model.
+
+    Models that return 429 sit out a cooldown window. With hedging on, a
+    second request goes to the next model once the first has run past its
+    own p95, and whichever answers first wins.
+    """
+
+    def __init__(self, models, cooldown=30.0, hedge=False):
+        self.models = list(models)
+        self.cooldown = cooldown
+        self.hedge = hedge
+        self._stats = {m: ModelStats() for m in self.models}
+        self.last_order = list(self.models)
+
+    def candidates(self):
+        now = time.monotonic()
+        order = sorted(
+            self.models,
+            key=lambda m: (
+                self._stats[m].cooldown_until > now,
+                self._stats[m].score(),
+                self.models.index(m),
+            ),
+        )
+        self.last_order = order
+        return order
+
+    def record(self, model, latency, outcome):
+        stats = self._stats[model]
+        stats.record(latency, outcome)
+        if outcome == "429":
+            stats.cooldown_until = time.monotonic() + self.cooldown
+
+    def hedge_deadline(self, model):
+        stats = self._stats[model]
+        if len(stats.latencies) < MIN_HEDGE_SAMPLES:
+            return None
+        return stats.percentile(0.95)
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "order": self.last_order,
+            "hedging": self.hedge,
+            "models": {
+                m: {
+                    "calls": len(s.outcomes),
+                    "p50_latency": s.percentile(0.5),
+                    "p95_latency": s.percentile(0.95),
+                    "error_rate": round(s.rate("error") + s.rate("429"), 3),
+                    "rate_429": round(s.rate("429"), 3),
+                    "cooldown_remaining": round(max(0.0, s.cooldown_until - now), 1),
+                    "hedges_started": s.hedges,
+                    "score": round(s.score(), 3),
+                }
+                for m, s in self._stats.items()
+            },
+        }
+
+    async def _timed(self, model, attempt):
+        start = time.monotonic()
+        try:
+            result = await attempt(model)
+        except ModelAttemptError as e:
+            self.record(model, time.monotonic() - start, "429" if e.status_code == 429 else "error")
+            raise
+        except asyncio.CancelledError:
+            self.record(model, time.monotonic() - start, "cancelled")
+            raise
+        except Exception as e:
+            self.record(model, time.monotonic() - start, "error")
+            raise ModelAttemptError(str(e))
+        self.record(model, time.monotonic() - start, "ok")
+        return result
+
+    async def run(self, attempt, hedge=None):
+        """
+        Calls `attempt(model_id)` on candidates in ranked order until one
+        returns. Raises AllModelsFailed with the last error if none do.
+        """
+        hedge = self.hedge if hedge is None else hedge
+        order = self.candidates()
+        pending = {}
+        next_index = 0
+        last_error = "No models configured"
+        hedge_at = None
+
+        def launch():
+            nonlocal next_index
+            model = order[next_index]
+            next_index += 1
+            pending[asyncio.create_task(self._timed(model, attempt))] = model
+            return model
+
+        try:
+            while True:
+                if not pending:
+                    if next_index >= len(order):
+                        raise AllModelsFailed(last_error)
+                    primary = launch()
+                    deadline = self.hedge_deadline(primary) if hedge else None
+                    hedge_at = time.monotonic() + deadline if deadline is not None else None
+
+                timeout = None
+                if hedge_at is not None and len(pending) == 1 and next_index < len(order):
+                    timeout = max(0.0, hedge_at - time.monotonic())
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Primary is past its p95: race it against the next model
+                    self._stats[pending[next(iter(pending))]].hedges += 1
+                    hedge_at = None
+                    launch()
+                    continue
+
+                for task in done:
+                    pending.pop(task)
+                    try:
+                        return task.result()
+                    except ModelAttemptError as e:
+                        last_error = str(e)
+        finally:
+            for task in pending:
+                task.cancel()
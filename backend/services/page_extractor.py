@@ -0,0 +1,256 @@
+import codecs
+import json
+import os
+import re
+
+from lxml import etree, html as lxml_html
+
+# Vendor pages are read up to this many bytes; product grids sit well inside it
+MAX_BODY_BYTES = int(os.getenv("SCRAPE_MAX_BYTES", str(2 * 1024 * 1024)))
+MAX_ITEMS = 10
+
+PRICE_RE = re.compile(r'[$₹€£]\s*[\d,]+')
+CARD_CLASS_RE = re.compile(r'product|item|card|box', re.I)
+NAME_CLASS_RE = re.compile(r'title|name', re.I)
+
+CURRENCY_SYMBOLS = {"USD": "$", "INR": "₹", "EUR": "€", "GBP": "£"}
+
+# Pages reach the parser as UTF-8 bytes; parse_document transcodes the rest
+_parser = lxml_html.HTMLParser(encoding="utf-8", remove_comments=True)
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="...; charset=...">
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+# Browsers only look this far into the page for a meta charset
+META_CHARSET_WINDOW = 1024
+
+# Compiled once; evaluated per page/card
+_FIND_LD_JSON = etree.XPath("//script[@type='application/ld+json']")
+_FIND_MICRODATA_PRODUCTS = etree.XPath("//*[@itemscope][contains(@itemtype, 'schema.org/Product')]")
+_FIND_META = etree.XPath("//meta[@property or @name]")
+_FIND_CARDS = etree.XPath("//div[@class] | //li[@class] | //article[@class] | //tr[@class]")
+_FIND_NAMED = etree.XPath(".//*[self::h2 or self::h3 or self::h4 or self::h5 or self::a][@class]")
+_FIND_HEADING = etree.XPath("(.//*[self::h2 or self::h3 or self::h4])[1]")
+_FIND_HEADINGS = etree.XPath("//*[self::h2 or self::h3 or self::h4]")
+
+def page_encoding(page, declared=None):
+    """Charset of raw page bytes: the Content-Type one, else the page's meta charset, else UTF-8."""
+    match = META_CHARSET_RE.search(page[:META_CHARSET_WINDOW])
+    for candidate in (declared, match and match.group(1).decode("ascii", "ignore")):
+        if candidate:
+            try:
+                return codecs.lookup(candidate).name
+            except LookupError:
+                pass
+    return "utf-8"
+
+def parse_document(page, encoding=None):
+    """
+    Parses page (str or bytes) into an lxml tree; None when there is nothing
+    to parse. Bytes are decoded as `encoding` (the Content-Type charset) or
+    as the page itself declares.
+    """
+    if isinstance(page, str):
+        page = page.encode("utf-8", errors="replace")
+    else:
+        page = page[:MAX_BODY_BYTES]
+        charset = page_encoding(page, encoding)
+        if charset != "utf-8":
+            page = page.decode(charset, errors="replace").encode("utf-8")
+    page = page[:MAX_BODY_BYTES]
+    if not page.strip():
+        return None
+    try:
+        return lxml_html.document_fromstring(page, parser=_parser)
+    except (etree.ParserError, ValueError):
+        return None
+
+def _text(el, sep=""):
+    """Stripped text of el and its descendants, joined like BeautifulSoup's get_text(sep, strip=True)."""
+    return sep.join(s.strip() for s in el.itertext() if s.strip())
+
+def format_price(amount, currency=""):
+    if amount in (None, ""):
+        return ""
+    amount = str(amount).strip()
+    currency = (currency or "").strip().upper()
+    if PRICE_RE.search(amount):
+        return amount
+    symbol = CURRENCY_SYMBOLS.get(currency)
+    if symbol:
+        return f"{symbol}{amount}"
+    return f"{currency} {amount}".strip()
+
+def _offer_price(offers):
+    if isinstance(offers, list):
+        for offer in offers:
+            price = _offer_price(offer)
+            if price:
+                return price
+        return ""
+    if not isinstance(offers, dict):
+        return ""
+    amount = offers.get("price") or offers.get("lowPrice")
+    currency = offers.get("priceCurrency", "")
+    spec = offers.get("priceSpecification")
+    if amount in (None, "") and isinstance(spec, dict):
+        amount = spec.get("price")
+        currency = currency or spec.get("priceCurrency", "")
+    return format_price(amount, currency)
+
+def _json_ld_products(node, found):
+    if isinstance(node, list):
+        for item in node:
+            _json_ld_products(item, found)
+        return
+    if not isinstance(node, dict):
+        return
+    types = node.get("@type", [])
+    types = types if isinstance(types, list) else [types]
+    if "Product" in types and node.get("name"):
+        found.append({"item": str(node["name"]).strip(), "price": _offer_price(node.get("offers"))})
+    for key in ("@graph", "itemListElement", "item", "hasVariant"):
+        if key in node:
+            _json_ld_products(node[key], found)
+
+def extract_json_ld(doc):
+    found = []
+    for script in _FIND_LD_JSON(doc):
+        try:
+            _json_ld_products(json.loads(script.text or ""), found)
+        except ValueError:
+            continue
+    return found
+
+def _itemprop(scope, name):
+    for el in scope.iterfind(f".//*[@itemprop='{name}']"):
+        value = el.get("content") or _text(el)
+        if value:
+            return value
+    return ""
+
+def extract_microdata(doc):
+    found = []
+    for scope in _FIND_MICRODATA_PRODUCTS(doc):
+        name = _itemprop(scope, "name")
+        if name:
+            found.append({"item": name, "price": format_price(_itemprop(scope, "price"), _itemprop(scope, "priceCurrency"))})
+    return found
+
+def extract_open_graph(doc):
+    meta = {}
+    for el in _FIND_META(doc):
+        key = (el.get("property") or el.get("name") or "").lower()
+        if key and el.get("content") and key not in meta:
+            meta[key] = el.get("content").strip()
+    if meta.get("og:type", "").lower() != "product" or not meta.get("og:title"):
+        return []
+    amount = meta.get("product:price:amount") or meta.get("og:price:amount")
+    currency = meta.get("product:price:currency") or meta.get("og:price:currency")
+    return [{"item": meta["og:title"], "price": format_price(amount, currency)}]
+
+def extract_structured(doc):
+    """Products from JSON-LD, then microdata, then OpenGraph, de-duplicated by name."""
+    return _dedupe(extract_json_ld(doc) + extract_microdata(doc) + extract_open_graph(doc))
+
+def _first_price_text(el):
+    for text in el.itertext():
+        if PRICE_RE.search(text):
+            return text.strip()
+    return None
+
+def extract_heuristic(doc):
+    """
+    The original BeautifulSoup heuristics on the lxml tree: product-like
+    containers holding a title and a price, then headings carrying or
+    followed by a price.
+    """
+    # Script/style text is never a product, and is most of a heavy page
+    etree.strip_elements(doc, "script", "style", "noscript", "template", with_tail=False)
+
+    products_with_prices = []
+
+    # Strategy 1: Find "Product Cards" - containers with both name and price
+    for card in _FIND_CARDS(doc):
+        if not CARD_CLASS_RE.search(card.get("class", "")):
+            continue
+        name_tag = next((el for el in _FIND_NAMED(card) if NAME_CLASS_RE.search(el.get("class", ""))), None)
+        if name_tag is None:
+            # Fallback: Just look for any heading
+            name_tag = next(iter(_FIND_HEADING(card)), None)
+        if name_tag is None:
+            continue
+
+        price = _first_price_text(card)
+        if price:
+            name = _text(name_tag)
+            if 3 < len(name) < 100:
+                products_with_prices.append({"item": name, "price": price})
+
+    # Strategy 2: If Strategy 1 failed (or found very few), headings carrying or followed by a price
+    if len(products_with_prices) < 3:
+        headings = _FIND_HEADINGS(doc)[:15]
+        last_price_at = _last_price_position(doc) if headings else -1
+        positions = {el: i for i, el in enumerate(doc.iter())} if headings else {}
+        for h in headings:
+            text = _text(h)
+            price_match = PRICE_RE.search(text)
+            if price_match:
+                price = price_match.group()
+                name = text.replace(price, "").strip(" ()-")
+                if len(name) > 3:
+                    products_with_prices.append({"item": name, "price": price})
+            elif positions.get(h, last_price_at + 1) <= last_price_at:
+                parent = h.getparent()
+                pm = PRICE_RE.search(_text(parent, " ")) if parent is not None else None
+                if pm:
+                    # Name is just the heading text usually
+                    products_with_prices.append({"item": text, "price": pm.group()})
+
+    return _dedupe(products_with_prices)
+
+def loose_prices(doc, limit=5):
+    return [t.strip() for t in doc.itertext() if PRICE_RE.search(t)][:limit]
+
+def _last_price_position(doc):
+    """Document-order index of the last element whose text (or tail) holds a price."""
+    last = -1
+    for i, el in enumerate(doc.iter()):
+        if el.text and PRICE_RE.search(el.text):
+            last = max(last, i)
+        if el.tail and PRICE_RE.search(el.tail):
+            # A tail follows the element's whole subtree
+            last = max(last, i + sum(1 for _ in el.iterdescendants()))
+    return last
+
+def _dedupe(items):
+    # Remove duplicates based on item name
+    seen = set()
+    unique = []
+    for p in items:
+        if p["item"] and p["item"] not in seen:
+            seen.add(p["item"])
+            unique.append(p)
+    return unique
+
+def extract_vendor_page(page, encoding=None):
+    """
+    Extracts products and prices from a vendor page (str or bytes, read up
+    to MAX_BODY_BYTES; see parse_document for `encoding`). Structured data
+    wins; the heuristics only run when the page has none. Same result shape
+    as the old BeautifulSoup parser. CPU-bound; run it off the event loop.
+    """
+    doc = parse_document(page, encoding)
+    if doc is None:
+        return {"products": [], "pricing_guide": []}
+
+    pricing = extract_structured(doc) or extract_heuristic(doc)
+
+    # Fallback if no structured data
+    if not pricing:
+        raw_prices = loose_prices(doc)
+        if raw_prices:
+            return {"products": [], "pricing_guide": [{"item": "Generic Price", "price": p} for p in raw_prices]}
+
+    return {
+        "products": [p["item"] for p in pricing][:MAX_ITEMS],
+        "pricing_guide": pricing[:MAX_ITEMS]
+    }
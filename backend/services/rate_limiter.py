@@ -0,0 +1,374 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import asynccontextmanager
+
+import db
+from services.tracing import record
+
+# Callers waiting for quota are served lowest priority first, FIFO within one
+PRIORITY_INTERACTIVE = 0  # /search-gifts: a customer is watching the page
+PRIORITY_UPLOAD = 1       # /analyze-card: staff waiting on their upload
+PRIORITY_BACKGROUND = 2   # queued jobs and batch extraction
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_UPLOAD: "upload", PRIORITY_BACKGROUND: "background"}
+
+# Buckets hold this many seconds of quota, so a quiet spell allows a short burst
+BURST_SECONDS = float(os.getenv("GEMINI_BURST_SECONDS", "10"))
+# Longest wait in a model's queue (seconds) for each priority, in the order
+# above, before the call gives up on that model and the router moves on
+QUEUE_TIMEOUTS = dict(zip(PRIORITY_NAMES, (float(t) for t in os.getenv("GEMINI_QUEUE_TIMEOUTS", "10,20,120").split(","))))
+# Calls in flight per model from this process, at most
+MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "10"))
+# Waiters re-check the buckets at least this often (seconds); other workers
+# sharing a SQLite store can free or spend quota at any time
+POLL_INTERVAL = 1.0
+# Queue wait samples kept per model for the stats
+WAIT_WINDOW = 256
+
+class QueueTimeout(Exception):
+    """The model's quota did not free up within the caller's queue timeout."""
+
+def parse_quotas(spec):
+    """Parses "model=rpm/tpm,model=rpm/tpm" into {model: (rpm, tpm)}."""
+    quotas = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        model, _, limits = item.partition("=")
+        rpm, _, tpm = limits.partition("/")
+        quotas[model.strip()] = (float(rpm or 0), float(tpm or 0))
+    return quotas
+
+class Quota:
+    """Requests and tokens per minute for one model. A limit of 0 is no limit."""
+
+    def __init__(self, rpm=0, tpm=0, burst_seconds=BURST_SECONDS):
+        self.rpm = rpm
+        self.tpm = tpm
+        # kind -> (refill per second, capacity)
+        self.buckets = {
+            kind: (per_minute / 60, max(1.0, per_minute / 60 * burst_seconds))
+            for kind, per_minute in (("requests", rpm), ("tokens", tpm)) if per_minute > 0
+        }
+
+def refill(level, updated_at, now, rate, capacity):
+    return min(capacity, level + max(0.0, now - updated_at) * rate)
+
+class BucketStore(ABC):
+    """
+    Token bucket levels per (model, kind). Subclasses provide _update, which
+    applies fn to the refilled levels atomically and saves what it leaves.
+    """
+
+    blocking = False
+
+    @abstractmethod
+    def _update(self, model, quota, fn):
+        """Calls fn(levels) on the refilled {kind: level}, saves the levels and returns fn's result."""
+
+    def try_acquire(self, model, quota, need):
+        """Takes `need` ({kind: amount}) from every bucket and returns 0, or takes nothing and returns the seconds to wait."""
+        def take(levels):
+            wait = 0.0
+            for kind, (rate, capacity) in quota.buckets.items():
+                # A request larger than the whole bucket waits for a full one
+                amount = min(need.get(kind, 0), capacity)
+                if levels[kind] < amount:
+                    wait = max(wait, (amount - levels[kind]) / rate)
+            if wait == 0.0:
+                for kind, (_, capacity) in quota.buckets.items():
+                    levels[kind] -= min(need.get(kind, 0), capacity)
+            return wait
+        return self._update(model, quota, take)
+
+    def adjust(self, model, quota, kind, delta):
+        """Refunds (positive) or charges (negative, may go into debt) one bucket."""
+        def apply(levels):
+            if kind in levels:
+                levels[kind] = min(quota.buckets[kind][1], levels[kind] + delta)
+        self._update(model, quota, apply)
+
+    def drain(self, model, quota):
+        """Empties the model's buckets, e.g. after the API answered 429."""
+        def empty(levels):
+            for kind in levels:
+                levels[kind] = min(levels[kind], 0.0)
+        self._update(model, quota, empty)
+
+    def levels(self, model, quota):
+        return self._update(model, quota, dict)
+
+class MemoryBucketStore(BucketStore):
+    """Buckets for this worker process only."""
+
+    def __init__(self):
+        self._levels = {}  # (model, kind) -> (level, updated_at)
+
+    def _update(self, model, quota, fn):
+        now = time.monotonic()
+        levels = {}
+        for kind, (rate, capacity) in quota.buckets.items():
+            level, updated_at = self._levels.get((model, kind), (capacity, now))
+            levels[kind] = refill(level, updated_at, now, rate, capacity)
+        result = fn(levels)
+        for kind, level in levels.items():
+            self._levels[(model, kind)] = (level, now)
+        return result
+
+class SQLiteBucketStore(BucketStore):
+    """
+    Buckets shared by every uvicorn worker on one host through a
+    rate_buckets table in the app database, so the quota is spent once
+    however many workers there are. Each update is one write transaction.
+    """
+
+    blocking = True
+
+    def __init__(self):
+        with db.get_connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rate_buckets (
+                    name TEXT PRIMARY KEY,
+                    level REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+
+    def _update(self, model, quota, fn):
+        now = time.time()
+        names = {kind: f"{model}:{kind}" for kind in quota.buckets}
+        with db.get_connection() as conn:
+            # The insert takes the write lock, so the read below cannot go stale
+            conn.executemany(
+                'INSERT OR IGNORE INTO rate_buckets (name, level, updated_at) VALUES (?, ?, ?)',
+                [(names[kind], capacity, now) for kind, (_, capacity) in quota.buckets.items()]
+            )
+            levels = {}
+            for kind, (rate, capacity) in quota.buckets.items():
+                level, updated_at = conn.execute(
+                    'SELECT level, updated_at FROM rate_buckets WHERE name = ?', (names[kind],)
+                ).fetchone()
+                levels[kind] = refill(level, updated_at, now, rate, capacity)
+            result = fn(levels)
+            conn.executemany(
+                'UPDATE rate_buckets SET level = ?, updated_at = ? WHERE name = ?',
+                [(level, now, names[kind]) for kind, level in levels.items()]
+            )
+        return result
+
+def create_store(name=None):
+    """Builds the store named by GEMINI_LIMITER_BACKEND: "memory" (default) or "sqlite"."""
+    name = (name or os.getenv("GEMINI_LIMITER_BACKEND", "memory")).lower()
+    if name == "sqlite":
+        return SQLiteBucketStore()
+    if name == "memory":
+        return MemoryBucketStore()
+    raise ValueError(f"Unknown GEMINI_LIMITER_BACKEND: {name}")
+
+class Permit:
+    """Handed to the caller holding a slot, to report what the call actually cost."""
+
+    def __init__(self, tokens):
+        self.estimated_tokens = tokens
+        self.used_tokens = None
+        self.was_rate_limited = False
+
+    def used(self, tokens):
+        self.used_tokens = tokens
+
+    def rate_limited(self):
+        self.was_rate_limited = True
+
+class ModelLimiter:
+    """
+    Quota gate for one model: token buckets for requests and tokens per
+    minute, a cap on calls in flight, and a priority queue of callers.
+    Only the head of the queue is ever granted, so a background extraction
+    cannot take quota an interactive search is already waiting for.
+    """
+
+    def __init__(self, model, quota, store, max_in_flight=MAX_IN_FLIGHT):
+        self.model = model
+        self.quota = quota
+        self.store = store
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.granted = 0
+        self.timeouts = 0
+        self.rate_limited = 0
+        self.waits = deque(maxlen=WAIT_WINDOW)
+        self._waiters = []  # heap of (priority, seq, future, need)
+        self._seq = itertools.count()
+        self._dispatcher = None
+        self._wake = None
+
+    async def _call(self, fn, *args):
+        if self.store.blocking:
+            return await asyncio.to_thread(fn, self.model, self.quota, *args)
+        return fn(self.model, self.quota, *args)
+
+    def queued(self):
+        return [(priority, need) for priority, _, future, need in self._waiters if not future.done()]
+
+    async def acquire(self, tokens, priority=PRIORITY_UPLOAD):
+        """Waits until the call may go out. Raises QueueTimeout after QUEUE_TIMEOUTS[priority]."""
+        need = {"requests": 1, "tokens": tokens}
+        start = time.monotonic()
+        granted = False
+        if not self.queued() and self.in_flight < self.max_in_flight:
+            # Held across the bucket check (a thread hop with SQLite), so
+            # callers checking at the same time cannot overshoot the cap
+            self.in_flight += 1
+            try:
+                granted = await self._call(self.store.try_acquire, need) == 0
+            finally:
+                if not granted:
+                    self.in_flight -= 1
+        if not granted:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._seq), future, need))
+            self._ensure_dispatcher()
+            try:
+                await asyncio.wait_for(asyncio.shield(future), QUEUE_TIMEOUTS.get(priority))
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if future.done() and not future.cancelled():
+                    # Granted just as we gave up; hand the slot straight back
+                    self.release()
+                future.cancel()
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timeouts += 1
+                    raise QueueTimeout(f"No {self.model} quota within {QUEUE_TIMEOUTS.get(priority)}s")
+                raise
+
+        wait = time.monotonic() - start
+        self.granted += 1
+        self.waits.append(wait)
+        record("gemini.queue_wait", wait, {"model": self.model, "priority": PRIORITY_NAMES.get(priority, priority)})
+        return wait
+
+    def release(self):
+        self.in_flight -= 1
+        self._notify()
+
+    async def settle(self, permit):
+        """Charges the difference between the estimated and the reported token count, or drains on 429."""
+        if permit.was_rate_limited:
+            self.rate_limited += 1
+            await self._call(self.store.drain)
+        elif permit.used_tokens is not None and "tokens" in self.quota.buckets:
+            await self._call(self.store.adjust, "tokens", permit.estimated_tokens - permit.used_tokens)
+        self._notify()
+
+    def _notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wake = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        self._wake.set()
+
+    async def _dispatch(self):
+        """Grants the head of the queue whenever both buckets and the in-flight cap allow it."""
+        while self._waiters:
+            self._wake.clear()
+            priority, _, future, need = self._waiters[0]
+            if future.done():
+                # Timed out or cancelled while queued
+                heapq.heappop(self._waiters)
+                continue
+
+            wait = POLL_INTERVAL
+            if self.in_flight < self.max_in_flight:
+                # Reserved before the bucket check, as in acquire()
+                self.in_flight += 1
+                try:
+                    wait = await self._call(self.store.try_acquire, need)
+                finally:
+                    if wait != 0:
+                        self.in_flight -= 1
+                if wait == 0:
+                    heapq.heappop(self._waiters)
+                    if future.done():
+                        self.in_flight -= 1
+                        await self._call(self.store.adjust, "requests", 1)
+                        await self._call(self.store.adjust, "tokens", need["tokens"])
+                    else:
+                        future.set_result(None)
+                    continue
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), min(wait, POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                pass
+
+    def percentile(self, pct):
+        if not self.waits:
+            return None
+        values = sorted(self.waits)
+        return round(values[min(len(values) - 1, int(len(values) * pct))], 3)
+
+    def stats(self):
+        queued = self.queued()
+        return {
+            "rpm": self.quota.rpm,
+            "tpm": self.quota.tpm,
+            "queued": len(queued),
+            "queued_by_priority": {
+                name: sum(1 for p, _ in queued if p == priority) for priority, name in PRIORITY_NAMES.items()
+            },
+            "queued_tokens": sum(need["tokens"] for _, need in queued),
+            "in_flight": self.in_flight,
+            "granted": self.granted,
+            "queue_timeouts": self.timeouts,
+            "rate_limited": self.rate_limited,
+            "wait_p50": self.percentile(0.5),
+            "wait_p95": self.percentile(0.95),
+            "wait_max": round(max(self.waits), 3) if self.waits else None,
+            "available": {k: round(v, 1) for k, v in self.store.levels(self.model, self.quota).items()},
+        }
+
+class RateLimiter:
+    """
+    Process-wide gate in front of every outbound Gemini call, one
+    ModelLimiter per model. Models without a configured quota are only
+    held to the in-flight cap.
+    """
+
+    def __init__(self, quotas, store=None, max_in_flight=MAX_IN_FLIGHT):
+        self.quotas = {model: Quota(rpm, tpm) for model, (rpm, tpm) in quotas.items()}
+        self.store = store or create_store()
+        self.max_in_flight = max_in_flight
+        self._models = {}
+
+    def model(self, model):
+        limiter = self._models.get(model)
+        if limiter is None:
+            quota = self.quotas.get(model) or Quota()
+            limiter = self._models[model] = ModelLimiter(model, quota, self.store, self.max_in_flight)
+        return limiter
+
+    @asynccontextmanager
+    async def slot(self, model, tokens, priority=PRIORITY_UPLOAD):
+        """
+        Holds one call's worth of quota for `model`. Report the real cost
+        on the yielded Permit (used() or rate_limited()) before leaving.
+        """
+        limiter = self.model(model)
+        await limiter.acquire(tokens, priority)
+        permit = Permit(tokens)
+        try:
+            yield permit
+        finally:
+            limiter.release()
+            await limiter.settle(permit)
+
+    def stats(self):
+        return {
+            "backend": "sqlite" if self.store.blocking else "memory",
+            "max_in_flight": self.max_in_flight,
+            "models": {model: self.model(model).stats() for model in sorted(set(self.quotas) | set(self._models))},
+        }
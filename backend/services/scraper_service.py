@@ -1,102 +1,281 @@
-from bs4 import BeautifulSoup
-import requests
+import asyncio
+import json
+import os
 import re
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
 
-def scrape_vendor_website(url: str):
-    """
-    Visits the vendor's website to extract product details and pricing.
-    Returns a dictionary with 'products' and 'pricing_info'.
-    """
-    if not url:
-        return {"products": [], "pricing_info": ""}
-    
+import httpx
+from bs4 import BeautifulSoup
+
+from db import get_connection
+from services import executors
+from services.tracing import span, traced
+from services.page_extractor import extract_vendor_page, MAX_BODY_BYTES
+
+# Seconds one page fetch may take (vendor sites can be slow)
+SCRAPE_TIMEOUT = float(os.getenv("SCRAPE_TIMEOUT", "20"))
+# How long card analysis waits for the scrape before answering without it
+SCRAPE_DEADLINE = float(os.getenv("SCRAPE_DEADLINE", "4"))
+# Concurrent fetches per host (site_domain)
+SCRAPE_PER_HOST_LIMIT = int(os.getenv("SCRAPE_PER_HOST_LIMIT", "2"))
+SCRAPE_MAX_CONNECTIONS = int(os.getenv("SCRAPE_MAX_CONNECTIONS", "20"))
+# Scraped pages are reused per domain for this long; failures are retried sooner
+SCRAPE_CACHE_TTL = float(os.getenv("SCRAPE_CACHE_TTL", str(24 * 3600)))
+SCRAPE_ERROR_TTL = float(os.getenv("SCRAPE_ERROR_TTL", "600"))
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5'
+}
+
+_client = None
+_host_gates = {}  # domain -> [semaphore, holders and waiters]; dropped when idle
+_inflight = {}
+
+def init_scrape_cache():
+    with get_connection() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS scrape_cache (
+                domain TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                result TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+
+def get_client():
+    """Returns the shared keep-alive client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        # verify=False to handle misconfigured SSL on small vendor sites
+        _client = httpx.AsyncClient(
+            headers=HEADERS,
+            verify=False,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=SCRAPE_MAX_CONNECTIONS, max_keepalive_connections=SCRAPE_MAX_CONNECTIONS),
+            timeout=httpx.Timeout(SCRAPE_TIMEOUT, connect=5.0),
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def normalize_url(url: str):
     # Ensure URL has schema
+    url = url.strip()
     if not url.startswith('http'):
         url = 'https://' + url
-        
-    # Suppress InsecureRequestWarning
-    import urllib3
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    return url
 
+def site_domain(url: str):
+    """Cache key: the host without a leading www."""
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+@asynccontextmanager
+async def _host_gate(domain: str):
+    """Holds one of the SCRAPE_PER_HOST_LIMIT fetch slots for this host."""
+    gate = _host_gates.get(domain)
+    if gate is None:
+        gate = _host_gates[domain] = [asyncio.Semaphore(SCRAPE_PER_HOST_LIMIT), 0]
+    gate[1] += 1
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5'
-        }
-        
-        # Try with verify=False to handle misconfigured SSL on small vendor sites
-        # Increased timeout to 20s
-        response = requests.get(url, headers=headers, timeout=20, verify=False)
-        
-        if response.status_code != 200:
-            return {"products": [], "pricing_guide": f"Failed to access website: Status {response.status_code}", "error": f"HTTP {response.status_code}"}
-            
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        products_with_prices = []
-        found_prices = []
+        async with gate[0]:
+            yield
+    finally:
+        gate[1] -= 1
+        if not gate[1]:
+            del _host_gates[domain]
+
+def _cache_get(domain):
+    with get_connection() as conn:
+        row = conn.execute(
+            'SELECT result, etag, last_modified, expires_at FROM scrape_cache WHERE domain = ?',
+            (domain,)
+        ).fetchone()
+    if not row:
+        return None
+    return {"result": json.loads(row[0]), "etag": row[1], "last_modified": row[2], "expires_at": row[3]}
+
+def _cache_put(domain, url, result, etag=None, last_modified=None, ttl=SCRAPE_CACHE_TTL):
+    now = time.time()
+    with get_connection() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO scrape_cache (domain, url, result, etag, last_modified, fetched_at, expires_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (domain, url, json.dumps(result), etag, last_modified, now, now + ttl))
+
+def parse_vendor_page_soup(html: str):
+    """
+    The original BeautifulSoup extractor, superseded by
+    page_extractor.extract_vendor_page. Kept for benchmarks.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    products_with_prices = []
+    found_prices = []
+    
+    # Strategy 1: Find "Product Cards" - containers with both name and price
+    # Common containers for products
+    potential_cards = soup.find_all(['div', 'li', 'article', 'tr'], class_=re.compile(r'product|item|card|box', re.I))
+    
+    for card in potential_cards:
+        # Find name in this card
+        name_tag = card.find(['h2', 'h3', 'h4', 'h5', 'a'], class_=re.compile(r'title|name', re.I))
+        if not name_tag:
+             # Fallback: Just look for any heading
+             name_tag = card.find(['h2', 'h3', 'h4'])
         
-        # Strategy 1: Find "Product Cards" - containers with both name and price
-        # Common containers for products
-        potential_cards = soup.find_all(['div', 'li', 'article', 'tr'], class_=re.compile(r'product|item|card|box', re.I))
+        # Find price in this card
+        price_tag = card.find(string=re.compile(r'[$₹€£]\s*[\d,]+'))
         
-        for card in potential_cards:
-            # Find name in this card
-            name_tag = card.find(['h2', 'h3', 'h4', 'h5', 'a'], class_=re.compile(r'title|name', re.I))
-            if not name_tag:
-                 # Fallback: Just look for any heading
-                 name_tag = card.find(['h2', 'h3', 'h4'])
-            
-            # Find price in this card
-            price_tag = card.find(string=re.compile(r'[$₹€£]\s*[\d,]+'))
-            
-            if name_tag and price_tag:
-                name = name_tag.get_text(strip=True)
-                price = price_tag.strip()
-                if len(name) > 3 and len(name) < 100:
+        if name_tag and price_tag:
+            name = name_tag.get_text(strip=True)
+            price = price_tag.strip()
+            if len(name) > 3 and len(name) < 100:
+                products_with_prices.append({"item": name, "price": price})
+                found_prices.append(price)
+
+    # Strategy 2: If Strategy 1 failed (or found very few), try the loose search but clearer
+    if len(products_with_prices) < 3:
+        # extract simple headings
+        headings = soup.find_all(['h2', 'h3', 'h4'], limit=15)
+        for h in headings:
+            text = h.get_text(strip=True)
+            price_match = re.search(r'[$₹€£]\s*[\d,]+', text)
+            if price_match:
+                 price = price_match.group()
+                 name = text.replace(price, "").strip(" ()-")
+                 if len(name) > 3:
                     products_with_prices.append({"item": name, "price": price})
-                    found_prices.append(price)
-
-        # Strategy 2: If Strategy 1 failed (or found very few), try the loose search but clearer
-        if len(products_with_prices) < 3:
-            # extract simple headings
-            headings = soup.find_all(['h2', 'h3', 'h4'], limit=15)
-            for h in headings:
-                text = h.get_text(strip=True)
-                price_match = re.search(r'[$₹€£]\s*[\d,]+', text)
-                if price_match:
-                     price = price_match.group()
-                     name = text.replace(price, "").strip(" ()-")
-                     if len(name) > 3:
-                        products_with_prices.append({"item": name, "price": price})
-                elif h.find_next(string=re.compile(r'[$₹€£]\s*[\d,]+')):
-                     parent_text = h.parent.get_text(" ", strip=True) if h.parent else ""
-                     pm = re.search(r'[$₹€£]\s*[\d,]+', parent_text)
-                     if pm:
-                         price = pm.group()
-                         # Name is just the heading text usually
-                         products_with_prices.append({"item": text, "price": price})
-
-        # Remove duplicates based on item name
-        seen = set()
-        final_pricing = []
-        for p in products_with_prices:
-            if p['item'] not in seen:
-                seen.add(p['item'])
-                final_pricing.append(p)
-
-        # Fallback if no structured data
-        if not final_pricing:
-             raw_prices = list(soup.find_all(string=re.compile(r'[$₹€£]\s*[\d,]+')))
-             if raw_prices:
-                 return {"products": [], "pricing_guide": [{"item": "Generic Price", "price": p.strip()} for p in raw_prices[:5]]}
-        
-        return {
-            "products": [p['item'] for p in final_pricing][:10],
-            "pricing_guide": final_pricing[:10]
-        }
-        
+            elif h.find_next(string=re.compile(r'[$₹€£]\s*[\d,]+')):
+                 parent_text = h.parent.get_text(" ", strip=True) if h.parent else ""
+                 pm = re.search(r'[$₹€£]\s*[\d,]+', parent_text)
+                 if pm:
+                     price = pm.group()
+                     # Name is just the heading text usually
+                     products_with_prices.append({"item": text, "price": price})
+
+    # Remove duplicates based on item name
+    seen = set()
+    final_pricing = []
+    for p in products_with_prices:
+        if p['item'] not in seen:
+            seen.add(p['item'])
+            final_pricing.append(p)
+
+    # Fallback if no structured data
+    if not final_pricing:
+         raw_prices = list(soup.find_all(string=re.compile(r'[$₹€£]\s*[\d,]+')))
+         if raw_prices:
+             return {"products": [], "pricing_guide": [{"item": "Generic Price", "price": p.strip()} for p in raw_prices[:5]]}
+    
+    return {
+        "products": [p['item'] for p in final_pricing][:10],
+        "pricing_guide": final_pricing[:10]
+    }
+
+async def _read_capped(response):
+    """Body bytes up to MAX_BODY_BYTES; the rest of an oversized page is never downloaded."""
+    chunks = []
+    size = 0
+    async for chunk in response.aiter_bytes():
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= MAX_BODY_BYTES:
+            break
+    return b"".join(chunks)[:MAX_BODY_BYTES]
+
+async def _fetch(url, domain, cached):
+    headers = {}
+    # Revalidate instead of re-downloading when the old copy has validators
+    if cached and cached["etag"]:
+        headers['If-None-Match'] = cached["etag"]
+    if cached and cached["last_modified"]:
+        headers['If-Modified-Since'] = cached["last_modified"]
+
+    try:
+        with span("scrape.fetch"):
+            async with _host_gate(domain):
+                async with get_client().stream("GET", url, headers=headers) as response:
+                    body = await _read_capped(response)
+
+        if response.status_code == 304 and cached:
+            result = cached["result"]
+            await executors.run_io(_cache_put, domain, url, result, cached["etag"], cached["last_modified"])
+            return result
+
+        if response.status_code != 200:
+            result = {"products": [], "pricing_guide": f"Failed to access website: Status {response.status_code}", "error": f"HTTP {response.status_code}"}
+            await executors.run_io(_cache_put, domain, url, result, ttl=SCRAPE_ERROR_TTL)
+            return result
+
+        with span("scrape.extract"):
+            result = await executors.run_cpu(extract_vendor_page, body, response.charset_encoding)
+        await executors.run_io(
+            _cache_put, domain, url, result,
+            response.headers.get("etag"), response.headers.get("last-modified")
+        )
+        return result
     except Exception as e:
         print(f"Scraping Error: {e}")
-        return {"products": [], "pricing_guide": f"Error scraping website: {str(e)}"}
+        result = {"products": [], "pricing_guide": f"Error scraping website: {str(e)}"}
+        try:
+            await executors.run_io(_cache_put, domain, url, result, ttl=SCRAPE_ERROR_TTL)
+        except Exception:
+            pass
+        return result
+
+@traced("scrape.vendor_website")
+async def scrape_vendor_website(url: str):
+    """
+    Visits the vendor's website to extract product details and pricing.
+    Returns a dictionary with 'products' and 'pricing_guide'.
+
+    Results are cached per domain, and concurrent calls for one domain share
+    a single fetch, so many cards from one vendor cost one request.
+    """
+    if not url:
+        return {"products": [], "pricing_info": ""}
+
+    url = normalize_url(url)
+    domain = site_domain(url)
+    cached = await executors.run_io(_cache_get, domain)
+    if cached and cached["expires_at"] > time.time():
+        return cached["result"]
+
+    task = _inflight.get(domain)
+    if task is None:
+        task = _inflight[domain] = asyncio.create_task(_fetch(url, domain, cached))
+        task.add_done_callback(lambda _: _inflight.pop(domain, None))
+    # A caller giving up (see SCRAPE_DEADLINE) must not cancel the shared fetch
+    return await asyncio.shield(task)
+
+def peek_scrape(url: str):
+    """
+    Non-blocking look at a scrape: ("pending", None) while this process is
+    fetching it, ("done", result) once cached, ("missing", None) otherwise.
+    """
+    url = normalize_url(url)
+    domain = site_domain(url)
+    if domain in _inflight:
+        return "pending", None
+    cached = _cache_get(domain)
+    if cached:
+        return "done", cached["result"]
+    return "missing", None
+
+# Initialize on import, like db.py
+try:
+    init_scrape_cache()
+except Exception:
+    pass
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+
+from db import get_connection
+from services import executors
+from services.text_utils import STOPWORDS
+from services.tracing import detached
+
+# Fresh for SEARCH_CACHE_TTL seconds, then served stale (while a background
+# refresh runs) for another SEARCH_CACHE_STALE seconds before it is a miss
+DEFAULT_TTL = float(os.getenv("SEARCH_CACHE_TTL", str(6 * 3600)))
+STALE_TTL = float(os.getenv("SEARCH_CACHE_STALE", str(24 * 3600)))
+MEMORY_ENTRIES = int(os.getenv("SEARCH_CACHE_MEMORY_ENTRIES", "256"))
+
+def _stem(word):
+    # Deliberately tiny: enough to fold plurals and common suffixes together
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("sses", "shes", "ches", "xes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    if len(word) > 5 and word.endswith("ing"):
+        return word[:-3]
+    return word
+
+def normalize_query(query):
+    """'Eco-Friendly Corporate Gifts!' and 'eco friendly corporate gift' -> the same key."""
+    words = re.findall(r"[\w$₹€£]+", query.lower())
+    words = [_stem(w) for w in words if w not in STOPWORDS]
+    return " ".join(words)
+
+class SearchCache:
+    """
+    Two-tier cache for web search results: an in-process LRU in front of a
+    persistent SQLite table. Each entry has its own TTL; past it, the entry is
+    served stale once per refresh while a background task fetches a new one.
+    """
+
+    def __init__(self, table="search_cache", memory_entries=MEMORY_ENTRIES, ttl=DEFAULT_TTL, stale_ttl=STALE_TTL):
+        self.table = table
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._memory = OrderedDict()  # key -> (result, expires_at)
+        self._fetching = {}  # key -> task fetching it (a miss or a stale refresh)
+        self.counters = {"hits": 0, "misses": 0, "stale": 0}
+        self._init_table()
+
+    def _init_table(self):
+        with get_connection() as conn:
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+
+    def _remember(self, key, result, expires_at):
+        self._memory[key] = (result, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _read(self, key):
+        with get_connection() as conn:
+            row = conn.execute(f'SELECT result, expires_at FROM {self.table} WHERE key = ?', (key,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def _write(self, key, result, expires_at):
+        with get_connection() as conn:
+            conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, result, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(result), expires_at)
+            )
+            # Opportunistically drop rows that are past even the stale window
+            conn.execute(f'DELETE FROM {self.table} WHERE expires_at < ?', (time.time() - self.stale_ttl,))
+
+    async def get(self, key):
+        """Returns (result, expires_at) from memory, then SQLite, or None."""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        entry = await executors.run_io(self._read, key)
+        if entry:
+            self._remember(key, *entry)
+        return entry
+
+    async def set(self, key, result, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self._remember(key, result, expires_at)
+        await executors.run_io(self._write, key, result, expires_at)
+
+    async def _fetch_and_store(self, key, query, fetch, ttl, cacheable):
+        result = await fetch(query)
+        # An error or fallback answer never replaces what is cached, even a stale entry
+        if cacheable(result):
+            await self.set(key, result, ttl)
+        return result
+
+    def _fetched(self, key, task):
+        self._fetching.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            # Nobody awaits a stale refresh; the stale entry stays as it was
+            print(f"Search cache fetch error for {key!r}: {task.exception()}")
+
+    def _fetch_once(self, key, query, fetch, ttl, cacheable, background=False):
+        """
+        The running fetch for this key, or a new one; concurrent misses share
+        it. A background (stale refresh) fetch is kept out of the current
+        request's Server-Timing.
+        """
+        task = self._fetching.get(key)
+        if task is None:
+            work = self._fetch_and_store(key, query, fetch, ttl, cacheable)
+            task = asyncio.create_task(detached(work) if background else work)
+            self._fetching[key] = task
+            task.add_done_callback(lambda t: self._fetched(key, t))
+        return task
+
+    async def lookup(self, query, fetch, cacheable, ttl=None):
+        """
+        Returns (result, "hit") or (result, "stale"), starting a background
+        `fetch(query)` for a stale entry, or None on a miss. For callers that
+        fetch misses themselves and store() the answer. Only results that
+        pass cacheable(result) are stored. A query with nothing but stopwords
+        has no key and always misses.
+        """
+        key = normalize_query(query)
+        entry = await self.get(key) if key else None
+        now = time.time()
+        if entry and now < entry[1]:
+            self.counters["hits"] += 1
+            return entry[0], "hit"
+        if entry and now < entry[1] + self.stale_ttl:
+            self.counters["stale"] += 1
+            self._fetch_once(key, query, fetch, ttl, cacheable, background=True)
+            return entry[0], "stale"
+        self.counters["misses"] += 1
+        return None
+
+    async def store(self, query, result, cacheable, ttl=None):
+        key = normalize_query(query)
+        if key and cacheable(result):
+            await self.set(key, result, ttl)
+
+    async def get_or_fetch(self, query, fetch, cacheable, ttl=None):
+        """
+        Returns (result, status) where status is "hit", "stale" or "miss".
+        `fetch(query)` is awaited on a miss and in the background on a stale
+        hit; concurrent misses on one key wait for the same fetch.
+        """
+        cached = await self.lookup(query, fetch, cacheable, ttl)
+        if cached:
+            return cached
+        key = normalize_query(query)
+        if not key:
+            return await fetch(query), "miss"
+        # Shielded so a caller that gives up does not cancel the others' fetch
+        return await asyncio.shield(self._fetch_once(key, query, fetch, ttl, cacheable)), "miss"
+
+    def stats(self):
+        return {**self.counters, "memory_entries": len(self._memory)}
+
+web_search_cache = None
+
+def get_web_search_cache():
+    global web_search_cache
+    if web_search_cache is None:
+        web_search_cache = SearchCache()
+    return web_search_cache
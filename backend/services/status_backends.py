@@ -0,0 +1,274 @@
+import asyncio
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import db
+
+# Finished requests keep their history this long (seconds) for late subscribers
+STATUS_TTL = float(os.getenv("STATUS_TTL", "300"))
+# Hard cap on tracked requests; the least recently used are dropped first
+STATUS_MAX_REQUESTS = int(os.getenv("STATUS_MAX_REQUESTS", "5000"))
+# Subscribers give up after this long, as the old 600 x 100ms loop did
+STREAM_TIMEOUT = 60.0
+# Idle subscribers get a heartbeat (None) this often so proxies keep the stream open
+HEARTBEAT_INTERVAL = 15.0
+
+def is_terminal(message: str):
+    return message == "Complete" or message.startswith("Error")
+
+class StatusChannel:
+    """Full event history for one request plus a wake-up for its subscribers."""
+
+    def __init__(self):
+        self.events = []
+        self.finished_at = None
+        self._changed = asyncio.Event()
+
+    def publish(self, message):
+        self.events.append(message)
+        if is_terminal(message):
+            self.finished_at = time.monotonic()
+        # Wake everyone waiting on the current event, then arm a fresh one
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_for(self, cursor, timeout):
+        """Returns once there are events past `cursor`, or after `timeout`."""
+        changed = self._changed
+        if len(self.events) > cursor:
+            return
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+class StatusBus:
+    """
+    In-process pub/sub for request progress. Publishing appends to a
+    per-request channel and subscribers sleep until something is published.
+    """
+
+    def __init__(self, ttl=STATUS_TTL, max_requests=STATUS_MAX_REQUESTS):
+        self.ttl = ttl
+        self.max_requests = max_requests
+        self._channels = OrderedDict()
+
+    def channel(self, request_id):
+        channel = self._channels.get(request_id)
+        if channel is None:
+            channel = self._channels[request_id] = StatusChannel()
+            self._evict()
+        self._channels.move_to_end(request_id)
+        return channel
+
+    def publish(self, request_id, message):
+        self.channel(request_id).publish(message)
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [
+            rid for rid, ch in self._channels.items()
+            if ch.finished_at is not None and now - ch.finished_at > self.ttl
+        ]
+        for rid in expired:
+            del self._channels[rid]
+        while len(self._channels) > self.max_requests:
+            self._channels.popitem(last=False)
+
+    def __len__(self):
+        return len(self._channels)
+
+    def __contains__(self, request_id):
+        return request_id in self._channels
+
+    async def subscribe(self, request_id, timeout=STREAM_TIMEOUT):
+        """
+        Yields every status message for request_id in order, including ones
+        published before the subscriber connected, until a terminal message.
+        Yields None right away if nothing has been published yet, and again
+        on each idle heartbeat.
+        """
+        channel = self.channel(request_id)
+        deadline = time.monotonic() + timeout
+        cursor = 0
+        if not channel.events:
+            yield None
+        while True:
+            while cursor < len(channel.events):
+                message = channel.events[cursor]
+                cursor += 1
+                yield message
+                if is_terminal(message):
+                    return
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            before = len(channel.events)
+            await channel.wait_for(cursor, min(remaining, HEARTBEAT_INTERVAL))
+            if len(channel.events) == before and deadline - time.monotonic() > 0:
+                yield None
+
+class StatusBackend(ABC):
+    """Where status events are published and how subscribers receive them."""
+
+    @abstractmethod
+    async def publish(self, request_id, message):
+        """Records a status message for request_id and wakes its subscribers."""
+
+    @abstractmethod
+    def subscribe(self, request_id, timeout=STREAM_TIMEOUT):
+        """Async iterator of messages (None = nothing new yet), ending after a terminal one."""
+
+class MemoryStatusBackend(StatusBackend):
+    """Single-process backend: publishers and subscribers must share a worker."""
+
+    def __init__(self, ttl=STATUS_TTL, max_requests=STATUS_MAX_REQUESTS):
+        self.bus = StatusBus(ttl, max_requests)
+
+    async def publish(self, request_id, message):
+        self.bus.publish(request_id, message)
+
+    def subscribe(self, request_id, timeout=STREAM_TIMEOUT):
+        return self.bus.subscribe(request_id, timeout)
+
+class SQLiteStatusBackend(StatusBackend):
+    """
+    Shares status events between uvicorn workers on one host through a
+    status_events table in the app database.
+
+    Each worker runs a single watcher task that checks PRAGMA data_version
+    (which changes whenever another connection commits) and copies new rows
+    for requests it has subscribers for into its local StatusBus. The watcher
+    sleeps outright while the worker has no subscribers.
+    """
+
+    def __init__(self, poll_interval=0.05, retention=3600.0, ttl=STATUS_TTL, max_requests=STATUS_MAX_REQUESTS):
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.bus = StatusBus(ttl, max_requests)
+        self._last_ids = {}  # request_id -> newest row id copied into the local bus
+        self._cursor = 0
+        self._watcher = None
+        self._wake = None
+        self._init_table()
+
+    def _init_table(self):
+        with db.get_connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS status_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    request_id TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_status_events_request ON status_events (request_id, id)')
+
+    def _insert(self, request_id, message):
+        with db.get_connection() as conn:
+            conn.execute(
+                'INSERT INTO status_events (request_id, message, created_at) VALUES (?, ?, ?)',
+                (request_id, message, time.time())
+            )
+
+    def _history(self, request_id):
+        with db.get_connection() as conn:
+            return conn.execute(
+                'SELECT id, message FROM status_events WHERE request_id = ? ORDER BY id',
+                (request_id,)
+            ).fetchall()
+
+    def _deliver(self, request_id, rows):
+        last = self._last_ids.get(request_id, 0)
+        for row_id, message in rows:
+            if row_id > last:
+                self.bus.publish(request_id, message)
+                last = row_id
+        self._last_ids[request_id] = last
+
+    async def publish(self, request_id, message):
+        await asyncio.to_thread(self._insert, request_id, message)
+        if self._wake is not None:
+            self._wake.set()
+
+    async def subscribe(self, request_id, timeout=STREAM_TIMEOUT):
+        self._ensure_watcher()
+        if request_id not in self._last_ids or request_id not in self.bus:
+            self._last_ids.pop(request_id, None)
+            self._deliver(request_id, await asyncio.to_thread(self._history, request_id))
+        self._wake.set()
+        async for message in self.bus.subscribe(request_id, timeout):
+            yield message
+
+    def _ensure_watcher(self):
+        if self._watcher is None or self._watcher.done():
+            self._wake = asyncio.Event()
+            self._watcher = asyncio.create_task(self._watch())
+
+    def _poll(self, conn, version):
+        """Returns (data_version, new rows), or rows None if data_version still equals `version` (None always reads)."""
+        current = conn.execute('PRAGMA data_version').fetchone()[0]
+        if current == version:
+            return current, None
+        return current, conn.execute(
+            'SELECT id, request_id, message FROM status_events WHERE id > ? ORDER BY id',
+            (self._cursor,)
+        ).fetchall()
+
+    def _cleanup(self, conn):
+        conn.execute('DELETE FROM status_events WHERE created_at < ?', (time.time() - self.retention,))
+        conn.commit()
+
+    async def _watch(self):
+        # A dedicated connection: data_version only moves for *other* connections' commits.
+        # Its queries run in a thread so a locked database never stalls the event loop.
+        conn = await asyncio.to_thread(sqlite3.connect, db.DB_NAME, check_same_thread=False)
+        try:
+            self._cursor = max(
+                self._cursor,
+                (await asyncio.to_thread(
+                    lambda: conn.execute('SELECT COALESCE(MAX(id), 0) FROM status_events').fetchone()
+                ))[0]
+            )
+            version = None
+            next_cleanup = time.monotonic() + 60
+            while True:
+                # Forget requests the local bus has already evicted
+                for rid in [r for r in self._last_ids if r not in self.bus]:
+                    del self._last_ids[rid]
+                if not self._last_ids:
+                    await self._wake.wait()
+                    self._wake.clear()
+
+                # A wake-up (our own publish) re-reads even if data_version has not moved
+                forced = self._wake.is_set()
+                self._wake.clear()
+                version, rows = await asyncio.to_thread(self._poll, conn, None if forced else version)
+                for row_id, request_id, message in rows or []:
+                    if request_id in self._last_ids:
+                        self._deliver(request_id, [(row_id, message)])
+                    self._cursor = row_id
+
+                if time.monotonic() > next_cleanup:
+                    await asyncio.to_thread(self._cleanup, conn)
+                    next_cleanup = time.monotonic() + 60
+
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            conn.close()
+
+def create_backend(name=None):
+    """Builds the backend named by STATUS_BACKEND: "memory" (default) or "sqlite"."""
+    name = (name or os.getenv("STATUS_BACKEND", "memory")).lower()
+    if name == "sqlite":
+        return SQLiteStatusBackend()
+    if name == "memory":
+        return MemoryStatusBackend()
+    raise ValueError(f"Unknown STATUS_BACKEND: {name}")
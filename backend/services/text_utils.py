@@ -0,0 +1,7 @@
+# Filler words in gift searches and vendor text, skipped by the search cache
+# key and the card embeddings alike
+STOPWORDS = {
+    "a", "an", "and", "any", "are", "as", "at", "best", "by", "for", "from", "good",
+    "i", "idea", "ideas", "in", "is", "me", "my", "of", "on", "or", "our", "some",
+    "the", "to", "with", "want", "need", "looking",
+}
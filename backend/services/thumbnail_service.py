@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+from PIL import Image, ImageOps, features
+
+from services import executors
+
+UPLOAD_DIR = "uploads"
+# Derivatives are cached here, named after the source content and the preset
+THUMB_DIR = os.getenv("THUMB_DIR", "thumbnails")
+# Bounding box (width, height) per preset; a merged front+back card is about
+# twice as tall as it is wide. Images are only ever scaled down.
+THUMB_PRESETS = {"sm": (240, 480), "md": (480, 960), "lg": (960, 1920)}
+THUMB_QUALITY = int(os.getenv("THUMB_QUALITY", "80"))
+# Served formats in order of preference when the client accepts several
+THUMB_FORMATS = [f.strip() for f in os.getenv("THUMB_FORMATS", "webp,avif,jpeg").split(",") if f.strip()]
+# Presets rendered in the background when a card is saved
+THUMB_PREGENERATE = [p.strip() for p in os.getenv("THUMB_PREGENERATE", "sm,md").split(",") if p.strip()]
+# Bump when the rendering below changes, so stale derivatives get new names
+THUMB_VERSION = "1"
+# Names and URLs only change with the content, so clients may cache forever
+THUMB_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# format -> (Pillow format, MIME type, encoder options)
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"method": 4}),
+    # speed 8 is ~2x faster than the default for a few % larger files
+    "avif": ("AVIF", "image/avif", {"speed": 8}),
+    "jpeg": ("JPEG", "image/jpeg", {"optimize": True, "progressive": True}),
+}
+AVAILABLE_FORMATS = tuple(f for f in FORMATS if f == "jpeg" or features.check(f))
+
+_rendering = {}
+_digests = OrderedDict()
+_digests_lock = threading.Lock()
+DIGEST_CACHE_SIZE = 4096
+
+def negotiate_format(requested, accept):
+    """The explicitly requested format, else the first THUMB_FORMATS entry the Accept header allows."""
+    if requested:
+        if requested not in AVAILABLE_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(AVAILABLE_FORMATS)}")
+        return requested
+    accept = (accept or "").lower()
+    for fmt in THUMB_FORMATS:
+        if fmt in AVAILABLE_FORMATS and (fmt == "jpeg" or FORMATS[fmt][1] in accept):
+            return fmt
+    return "jpeg"
+
+def resolve_source(image_path):
+    """Absolute path of an image under UPLOAD_DIR, or None (missing, or outside the folder)."""
+    if not image_path:
+        return None
+    root = os.path.realpath(UPLOAD_DIR)
+    path = os.path.realpath(image_path)
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        return None
+    return path
+
+def source_digest(path):
+    """SHA-256 of the file, remembered per (path, size, mtime) so it is read once."""
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with _digests_lock:
+        if key in _digests:
+            _digests.move_to_end(key)
+            return _digests[key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+
+    with _digests_lock:
+        _digests[key] = digest.hexdigest()
+        if len(_digests) > DIGEST_CACHE_SIZE:
+            _digests.popitem(last=False)
+    return digest.hexdigest()
+
+def locate_thumbnail(image_path, preset, fmt):
+    """
+    (source path, derivative name, derivative path, already rendered) for
+    an upload, or None when there is no such upload. Blocking; every file
+    system check of a thumbnail request happens here, on the I/O pool.
+    """
+    src = resolve_source(image_path)
+    if src is None:
+        return None
+    name = f"{source_digest(src)[:32]}-{preset}-v{THUMB_VERSION}.{fmt}"
+    dest = os.path.join(THUMB_DIR, name)
+    return src, name, dest, os.path.exists(dest)
+
+def render_thumbnail(src, dest, box, fmt, quality=THUMB_QUALITY):
+    """
+    Scales src into box and writes it to dest. Written to a temporary name
+    and renamed, so another worker never sees half a file. CPU-bound; runs
+    in the image process pool.
+    """
+    pil_format, _, options = FORMATS[fmt]
+    with Image.open(src) as img:
+        # Let the JPEG decoder skip detail we are about to throw away
+        img.draft("RGB", box)
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+    img.thumbnail(box, Image.LANCZOS)
+
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+    try:
+        img.save(tmp, pil_format, quality=quality, **options)
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+async def get_thumbnail(image_path, preset, fmt):
+    """
+    Renders (or finds on disk) the preset-sized derivative of an uploaded
+    image. Returns {"path", "etag", "media_type"}, or None when there is no
+    such upload. Concurrent requests for the same derivative share one
+    render.
+    """
+    if preset not in THUMB_PRESETS:
+        raise ValueError(f"preset must be one of: {', '.join(THUMB_PRESETS)}")
+    if fmt not in AVAILABLE_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(AVAILABLE_FORMATS)}")
+    located = await executors.run_io(locate_thumbnail, image_path, preset, fmt)
+    if located is None:
+        return None
+
+    src, name, dest, rendered = located
+    if not rendered:
+        task = _rendering.get(dest)
+        if task is None:
+            task = _rendering[dest] = asyncio.ensure_future(
+                executors.run_cpu(render_thumbnail, src, dest, THUMB_PRESETS[preset], fmt)
+            )
+            task.add_done_callback(lambda _: _rendering.pop(dest, None))
+        # A client hanging up must not cancel the render others are waiting on
+        await asyncio.shield(task)
+
+    return {"path": dest, "etag": f'"{name}"', "media_type": FORMATS[fmt][1]}
+
+async def pregenerate(image_path, presets=None):
+    """Renders a saved card's thumbnails ahead of the first dashboard load."""
+    fmt = negotiate_format(None, ",".join(FORMATS[f][1] for f in AVAILABLE_FORMATS))
+    for preset in presets or THUMB_PREGENERATE:
+        try:
+            await get_thumbnail(image_path, preset, fmt)
+        except Exception as e:
+            print(f"Thumbnail error for {image_path} ({preset}): {e}")
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match check for a strong ETag (lists and * included)."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
@@ -0,0 +1,168 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Most recent durations kept per span series for the /metrics quantiles
+SPAN_WINDOW = int(os.getenv("SPAN_WINDOW", "1024"))
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_NAME = "archive_span_duration_seconds"
+# Distinct span names listed in one Server-Timing header at most
+SERVER_TIMING_MAX = 30
+
+class SpanSeries:
+    def __init__(self):
+        self.samples = deque(maxlen=SPAN_WINDOW)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self):
+        values = sorted(self.samples)
+        return {q: values[min(len(values) - 1, int(len(values) * q))] for q in QUANTILES}
+
+# (span name, sorted label pairs) -> SpanSeries, for this worker process
+_series = {}
+_series_lock = threading.Lock()
+# (name, seconds) spans of the HTTP request being handled, for Server-Timing
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+
+def record(name, seconds, labels=None):
+    key = (name, tuple(sorted((labels or {}).items())))
+    with _series_lock:
+        series = _series.get(key)
+        if series is None:
+            series = _series[key] = SpanSeries()
+        series.add(seconds)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+async def detached(coro):
+    """
+    Awaits coro with no request span list, for a background task spawned
+    while a request is handled: its spans still reach /metrics but are not
+    counted toward (or appended after) that request's Server-Timing.
+    """
+    _request_spans.set(None)
+    return await coro
+
+@contextmanager
+def span(name, **labels):
+    """
+    Times the block as one `name` span. The outcome label is ok, error or
+    cancelled, so failures do not skew the latency of successful calls.
+    Works around awaits too; use it inside async functions as a plain with.
+    """
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        record(name, time.perf_counter() - start, {**labels, "outcome": outcome})
+
+def traced(name):
+    """Decorator form of span() for sync and async functions."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_prometheus():
+    """All span series as a Prometheus summary (text exposition format 0.0.4)."""
+    with _series_lock:
+        snapshot = [(name, labels, series.quantiles(), series.total, series.count)
+                    for (name, labels), series in sorted(_series.items())]
+
+    lines = [
+        f"# HELP {METRIC_NAME} Duration of traced spans; quantiles over the last {SPAN_WINDOW} samples per series.",
+        f"# TYPE {METRIC_NAME} summary",
+    ]
+    for name, labels, quantiles, total, count in snapshot:
+        base = ",".join([f'span="{_label_value(name)}"'] + [f'{k}="{_label_value(v)}"' for k, v in labels])
+        for q, value in quantiles.items():
+            lines.append(f'{METRIC_NAME}{{{base},quantile="{q}"}} {value:.6f}')
+        lines.append(f"{METRIC_NAME}_sum{{{base}}} {total:.6f}")
+        lines.append(f"{METRIC_NAME}_count{{{base}}} {count}")
+    return "\n".join(lines) + "\n"
+
+def server_timing(spans, total_seconds):
+    """Server-Timing header value: one entry per span name (summed, with a count if repeated), then total."""
+    merged = {}
+    for name, seconds in spans:
+        total, count = merged.get(name, (0.0, 0))
+        merged[name] = (total + seconds, count + 1)
+    entries = []
+    for name, (seconds, count) in list(merged.items())[:SERVER_TIMING_MAX]:
+        entry = f"{name};dur={seconds * 1000:.1f}"
+        entries.append(entry + (f';desc="x{count}"' if count > 1 else ""))
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
+
+class TracingMiddleware:
+    """
+    Records an http.request span per request (labelled by route template,
+    method and status) and adds a Server-Timing header listing the spans
+    that finished before the response headers went out. For streamed
+    responses that is the work done before the first chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        spans = []
+        token = _request_spans.set(spans)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing(spans, time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_spans.reset(token)
+            route = scope.get("route")
+            record("http.request", time.perf_counter() - start, {
+                "route": getattr(route, "path", "unmatched"),
+                "method": scope["method"],
+                "status": status,
+            })
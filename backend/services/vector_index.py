@@ -0,0 +1,143 @@
+import functools
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from services.text_utils import STOPWORDS
+
+# Embedding width. Changing it (or the features below) starts a new index file.
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "256"))
+EMBEDDING_VERSION = "1"
+# Hits below this cosine similarity are noise from shared n-grams
+MIN_SIMILARITY = float(os.getenv("VECTOR_MIN_SIMILARITY", "0.15"))
+NGRAM_SIZES = (3, 4, 5)
+NGRAM_WEIGHT = 0.5
+
+@functools.lru_cache(maxsize=65536)
+def _word_features(word, dim):
+    """
+    (buckets, signed weights) for a word and its character n-grams, fastText
+    style. Cached: vendor text repeats the same words card after card.
+    """
+    padded = f"<{word}>"
+    features = [(word, 1.0)] + [
+        (padded[i:i + n], NGRAM_WEIGHT) for n in NGRAM_SIZES for i in range(len(padded) - n + 1)
+    ]
+    buckets = []
+    weights = []
+    for feature, weight in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        buckets.append(h % dim)
+        weights.append(weight if (h >> 31) & 1 else -weight)
+    return buckets, weights
+
+def embed(text, dim=VECTOR_DIM):
+    """
+    Hashed n-gram embedding: every feature lands in one of `dim` buckets
+    with a hash-chosen sign, and the vector is L2-normalized. Needs no
+    model or network, and "plants" lands close to "plant" and "planter".
+    """
+    buckets = []
+    weights = []
+    for word in re.findall(r"\w+", (text or "").lower()):
+        if word not in STOPWORDS:
+            word_buckets, word_weights = _word_features(word, dim)
+            buckets += word_buckets
+            weights += word_weights
+    if not buckets:
+        return np.zeros(dim, dtype=np.float32)
+    vec = np.bincount(buckets, weights, minlength=dim).astype(np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+class VectorIndex:
+    """
+    Card embeddings as a float32 matrix in a memory-mapped file, one row per
+    card id (AUTOINCREMENT ids are never reused, so a row never changes
+    owner). Deleted or never-indexed rows are zero and never match.
+
+    Every uvicorn worker maps the same file; the file only ever grows, and
+    each call re-checks its size so rows added by another worker are seen.
+    """
+
+    def __init__(self, path, dim=VECTOR_DIM):
+        self.path = path
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._rows = 0
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _open(self, min_rows=0):
+        row_bytes = self.dim * 4
+        rows = os.path.getsize(self.path) // row_bytes if self.exists() else 0
+        if min_rows > rows:
+            # Grow geometrically so a bulk load does not remap on every card
+            rows = max(min_rows, rows * 2, 1024)
+            with open(self.path, "ab") as f:
+                f.truncate(rows * row_bytes)
+        if rows != self._rows:
+            self._matrix = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(rows, self.dim)) if rows else None
+            self._rows = rows
+        return self._matrix
+
+    def upsert(self, card_id, text):
+        vec = embed(text, self.dim)
+        with self._lock:
+            self._open(card_id + 1)[card_id] = vec
+
+    def upsert_many(self, items):
+        """items: (card_id, text) pairs, written with one flush."""
+        items = [(card_id, embed(text, self.dim)) for card_id, text in items]
+        if not items:
+            return
+        with self._lock:
+            matrix = self._open(max(card_id for card_id, _ in items) + 1)
+            for card_id, vec in items:
+                matrix[card_id] = vec
+            matrix.flush()
+
+    def delete(self, card_id):
+        with self._lock:
+            matrix = self._open()
+            if matrix is not None and card_id < self._rows:
+                matrix[card_id] = 0
+
+    def clear(self):
+        with self._lock:
+            self._matrix = None
+            self._rows = 0
+            if self.exists():
+                os.remove(self.path)
+
+    def search(self, query, k=50):
+        """Top-k (card_id, cosine similarity) pairs, best first."""
+        q = embed(query, self.dim)
+        if not q.any():
+            return []
+        with self._lock:
+            matrix = self._open()
+        if matrix is None:
+            return []
+
+        scores = matrix @ q
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] >= MIN_SIMILARITY]
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(db_name):
+    """The index stored next to the SQLite file db_name."""
+    path = f"{db_name}.vectors-v{EMBEDDING_VERSION}-{VECTOR_DIM}.f32"
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = VectorIndex(path)
+        return _indexes[path]
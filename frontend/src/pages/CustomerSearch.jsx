@@ -1,9 +1,10 @@
 import React, { useState } from 'react';
-import axios from 'axios';
 import API_BASE_URL from '../config';
 
 const CustomerSearch = () => {
     const [query, setQuery] = useState('');
+    // Optional filters for our own vendors (the web results are not filtered)
+    const [filters, setFilters] = useState({ min_price: '', max_price: '', currency: '', category: '' });
     const [results, setResults] = useState({ internal: [], web_products: [], web_vendors: [], market_insights: null });
     const [loading, setLoading] = useState(false);
     const [searched, setSearched] = useState(false);
@@ -27,34 +28,71 @@ const CustomerSearch = () => {
     const handleSearch = async (e) => {
         e.preventDefault();
         console.log("Searching for:", query);
-        if (!query.trim()) return;
+        const hasFilters = Object.values(filters).some(value => value !== '');
+        if (!query.trim() && !hasFilters) return;
 
         setLoading(true);
         showToast("Initiating Search...", "info");
 
+        // Sections stream in as NDJSON lines; each one is appended as soon as it arrives
+        const sectionKeys = { internal_results: 'internal', web_products: 'web_products', web_vendors: 'web_vendors' };
+
         try {
-            const res = await axios.post(`${API_BASE_URL}/search-gifts`, { query });
-            console.log("Search API Response:", res.data);
+            const res = await fetch(`${API_BASE_URL}/search-gifts/stream`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    query,
+                    min_price: filters.min_price === '' ? null : Number(filters.min_price),
+                    max_price: filters.max_price === '' ? null : Number(filters.max_price),
+                    currency: filters.currency || null,
+                    categories: filters.category ? [filters.category] : []
+                })
+            });
+            if (!res.ok) {
+                const body = await res.json().catch(() => ({}));
+                throw new Error(body.detail || "Unknown server error");
+            }
 
-            const count = (res.data.internal_results?.length || 0) + (res.data.web_products?.length || 0) + (res.data.web_vendors?.length || 0);
-            showToast(`Search completed. Found ${count} items.`, "success");
+            setResults({ internal: [], web_products: [], web_vendors: [], market_insights: null });
+            setSearched(true);
 
-            if (res.data.internal_results?.length === 0 && res.data.web_products?.length === 0 && res.data.web_vendors?.length === 0) {
-                console.warn("No results found in any category.");
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let count = 0;
+
+            const handleEvent = (event) => {
+                console.log("Search stream event:", event.section);
+                const key = sectionKeys[event.section];
+                if (key) {
+                    count += event.items.length;
+                    setResults(prev => ({ ...prev, [key]: [...prev[key], ...event.items] }));
+                } else if (event.section === 'market_insights') {
+                    setResults(prev => ({ ...prev, market_insights: event.data || null }));
+                } else if (event.section === 'error') {
+                    throw new Error(event.detail);
+                }
+            };
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                lines.filter(line => line.trim()).forEach(line => handleEvent(JSON.parse(line)));
             }
+            if (buffer.trim()) handleEvent(JSON.parse(buffer));
 
-            setResults({
-                internal: res.data.internal_results || [],
-                web_products: res.data.web_products || [],
-                web_vendors: res.data.web_vendors || [],
-                market_insights: res.data.market_insights || null
-            });
-            setSearched(true);
+            showToast(`Search completed. Found ${count} items.`, "success");
+            if (count === 0) {
+                console.warn("No results found in any category.");
+            }
         } catch (err) {
             console.error("Search Failed:", err);
-            if (err.response) {
-                console.error("Server Error Details:", err.response.data);
-                showToast(`Search failed: ${err.response.data.detail || "Unknown server error"}`, 'error');
+            if (err.message) {
+                showToast(`Search failed: ${err.message}`, 'error');
             } else {
                 showToast("Search failed. Please check your connection.", 'error');
             }
@@ -192,6 +230,42 @@ const CustomerSearch = () => {
                                 )}
                             </button>
                         </div>
+                        <div className="flex flex-wrap justify-center gap-3 mt-4 text-sm">
+                            <input
+                                type="number"
+                                min="0"
+                                placeholder="Min budget"
+                                className="w-32 px-3 py-2 rounded-xl bg-white/90 text-brand-800 placeholder-brand-300 outline-none"
+                                value={filters.min_price}
+                                onChange={(e) => setFilters(prev => ({ ...prev, min_price: e.target.value }))}
+                            />
+                            <input
+                                type="number"
+                                min="0"
+                                placeholder="Max budget"
+                                className="w-32 px-3 py-2 rounded-xl bg-white/90 text-brand-800 placeholder-brand-300 outline-none"
+                                value={filters.max_price}
+                                onChange={(e) => setFilters(prev => ({ ...prev, max_price: e.target.value }))}
+                            />
+                            <select
+                                className="px-3 py-2 rounded-xl bg-white/90 text-brand-800 outline-none"
+                                value={filters.currency}
+                                onChange={(e) => setFilters(prev => ({ ...prev, currency: e.target.value }))}
+                            >
+                                <option value="">Any currency</option>
+                                <option value="INR">₹ INR</option>
+                                <option value="USD">$ USD</option>
+                                <option value="EUR">€ EUR</option>
+                                <option value="GBP">£ GBP</option>
+                            </select>
+                            <input
+                                type="text"
+                                placeholder="Category"
+                                className="w-40 px-3 py-2 rounded-xl bg-white/90 text-brand-800 placeholder-brand-300 outline-none"
+                                value={filters.category}
+                                onChange={(e) => setFilters(prev => ({ ...prev, category: e.target.value }))}
+                            />
+                        </div>
                     </form>
 
                     {/* Prompt Hints */}
@@ -83,6 +83,30 @@ const Dashboard = () => {
         setUploadStatus('');
     };
 
+    // The website scrape can outlast the analysis; fill its results in when they land
+    const pollPendingScrape = async (website) => {
+        for (let attempt = 0; attempt < 15; attempt++) {
+            await new Promise(resolve => setTimeout(resolve, 2000));
+            try {
+                const res = await axios.get(`${API_BASE_URL}/vendor-website`, { params: { url: website } });
+                if (res.data.status !== 'done') continue;
+                setFormData(prev => {
+                    if (prev.website !== website || prev.scrape_status !== 'pending') return prev;
+                    const scrapedPricing = normalizePricing(res.data.additional_info?.pricing_guide);
+                    return {
+                        ...prev,
+                        scrape_status: res.data.scrape_status,
+                        products: [prev.products, res.data.products].filter(Boolean).join(', '),
+                        pricing_guide: prev.pricing_guide.length ? prev.pricing_guide : scrapedPricing
+                    };
+                });
+                return;
+            } catch (e) {
+                return;
+            }
+        }
+    };
+
     const handleAnalyze = async () => {
         if (!frontFile) return;
         setLoading(true);
@@ -127,6 +151,8 @@ const Dashboard = () => {
 
         try {
             const res = await axios.post(`${API_BASE_URL}/analyze-card`, data);
+            // Stage breakdown (upload, merge, gemini, scrape, db) from the backend
+            console.log("Analyze timing:", res.headers['server-timing']);
 
             // Close stream on success
             eventSource.close();
@@ -163,6 +189,9 @@ const Dashboard = () => {
             setProcessingStep('reviewing');
             setShowReviewModal(true);
             setUploadStatus('Analysis Complete. Please review below.');
+            if (raw.scrape_status === 'pending' && raw.website) {
+                pollPendingScrape(raw.website);
+            }
         } catch (err) {
             console.error(err);
             setUploadStatus('Failed to process image.');
@@ -558,7 +587,7 @@ const Dashboard = () => {
                                         <div className="h-14 w-20 bg-brand-50 rounded-lg overflow-hidden border border-brand-100 relative items-center justify-center flex shadow-inner">
                                             {card.image_path && card.image_path !== 'None' && card.image_path !== 'null' ? (
                                                 <img
-                                                    src={`${API_BASE_URL}/${card.image_path}`}
+                                                    src={`${API_BASE_URL}/thumbnails/sm/${card.image_path}`}
                                                     alt="Scan"
                                                     className="h-full w-full object-cover transform group-hover:scale-110 transition-transform duration-500"
                                                     onError={(e) => { e.target.style.display = 'none'; e.target.parentElement.classList.add('bg-brand-50'); }}